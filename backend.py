@@ -1,31 +1,97 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 import asyncio
 import json
+import os
+import sys
 import time
+from contextlib import aclosing
+from typing import Optional
 
-# For PPG inlet
-from pylsl import StreamInlet, resolve_byprop
-
-from eeg.inference import EEGMoodDetector
+# eeg/ modules import their siblings by bare name (they also run as scripts from eeg/), so
+# import them the same way here; with an eeg.* prefix as well, each would be loaded twice
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eeg'))
+from acquisition import Acquisition, KINDS
+from inference import EEGMoodDetector
+from artifact_gate import ARTIFACT_LABEL
+from detector_manager import DetectorManager
+from model_runtime import ModelWatcher
+from spectrogram import RollingSpectrogram
+from summary_pyramid import SummaryPyramid
+from synthetic import synthetic_pair
 from fastapi import WebSocket, WebSocketDisconnect
+from stream_hub import StreamHub, parse_selection
+from history import PredictionHistory
+from prediction_log import PredictionSink
+from alarm import SmartAlarm, AlarmConfig
 
 app = FastAPI()
-detector = EEGMoodDetector(window_sec=6.0)
+# EEG_SOURCE=synthetic runs on generated EEG/PPG instead of a headset (see eeg/synthetic.py)
+synthetic_eeg, synthetic_ppg = synthetic_pair() if os.environ.get("EEG_SOURCE") == "synthetic" else (None, None)
+# One thread drains EEG, PPG, ACC and GYRO into ring buffers; the detector, hub and
+# handlers below read from it instead of opening inlets of their own (the multi-headset
+# DetectorManager is the exception: it resolves one inlet per extra headset itself)
+acquisition = Acquisition(kinds=('EEG', 'PPG') if synthetic_eeg else KINDS,
+                          sources={'EEG': synthetic_eeg, 'PPG': synthetic_ppg} if synthetic_eeg else None,
+                          launch_muselsl=synthetic_eeg is None)
+try:
+    acquisition.start()
+except Exception as e:
+    print(f"[WARN] Acquisition unavailable: {e}")
+
+# EEG_MODEL may point at a float or int8 checkpoint; EEG_QUANTIZE=1 quantizes a float one at load time
+detector = EEGMoodDetector(window_sec=6.0,
+                           model_path=os.environ.get("EEG_MODEL", "best_eeg_model.pth"),
+                           quantize=os.environ.get("EEG_QUANTIZE") == "1",
+                           # EEG_ARTIFACT_GATE=1 reports blink/motion windows as "artifact" instead of scoring them
+                           gate=os.environ.get("EEG_ARTIFACT_GATE") == "1",
+                           source=acquisition.reader('EEG') if acquisition.has('EEG') else None)
+detector.motion_provider = acquisition.motion_window
 detector.run()
 
-# Setup PPG inlet for heart rate streaming
-try:
-    ppg_streams = resolve_byprop('type', 'PPG', timeout=5)
-    ppg_inlet = StreamInlet(ppg_streams[0], max_chunklen=256) if ppg_streams else None
-except Exception:
-    ppg_inlet = None
+# EEG_MULTI_DEVICE=1: also track every EEG headset on the network by source id and score them together each hop
+devices = DetectorManager(window_sec=6.0, model_path=os.environ.get("EEG_MODEL", "best_eeg_model.pth"),
+                          quantize=os.environ.get("EEG_QUANTIZE") == "1") \
+    if os.environ.get("EEG_MULTI_DEVICE") == "1" else None
 
-# Determine PPG sampling rate if available
-try:
-    ppg_fs = int(ppg_inlet.info().nominal_srate()) if ppg_inlet else None  # <-- add
-except Exception:
-    ppg_fs = None  # <-- add
+# PPG for heart rate streaming, read from the acquisition buffers
+ppg_inlet = acquisition.reader('PPG') if acquisition.has('PPG') else None
+ppg_fs = int(acquisition.fs('PPG')) if acquisition.has('PPG') else None
+
+# Rolling spectrogram fed from the collector thread; computed once for all viewers
+spectrogram = RollingSpectrogram(fs=detector.fs or 256, n_channels=5)
+detector.add_listener(spectrogram.update)
+
+# Min/max/mean pyramid for long-range plots (last 30 minutes)
+eeg_summary = SummaryPyramid(fs=detector.fs or 256, n_channels=5, history_sec=1800)
+detector.add_listener(eeg_summary.update)
+
+# One shared producer for subscription-based streams
+hub = StreamHub(detector, ppg_inlet=ppg_inlet, ppg_fs=ppg_fs, tick_hz=1.0, spectrogram=spectrogram)
+
+# Prediction history with minute/hour rollups; set HISTORY_SPILL to keep evicted records on disk
+history = PredictionHistory(spill_path=os.environ.get("HISTORY_SPILL"))
+hub.add_recorder(history.record)
+
+# Durable log of every prediction and alarm transition, written in batches off the hot path
+prediction_sink = PredictionSink(os.environ.get("PREDICTION_LOG", "predictions.sqlite"))
+hub.add_recorder(prediction_sink.log_prediction)
+alarm = SmartAlarm(AlarmConfig(), alarm_callback=prediction_sink.log_alarm)
+
+def _alarm_recorder(label, probs, hr):
+    """Feed SmartAlarm: class 0 of the label map is focused (alarm state 0), every other class distracted."""
+    if label == ARTIFACT_LABEL:  # Artifact windows carry no focus information
+        return
+    distracted = label != detector.label_map.get(0)  # Read per call: a reload may swap the label map
+    alarm.update(1 if distracted else 0)
+
+hub.add_recorder(_alarm_recorder)
+
+def _selection_or_400(fields, rate, every, decimate):
+    try:
+        return parse_selection(fields, rate, every, decimate, tick_hz=hub.tick_hz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 async def event_generator():
     while not detector.available:
@@ -44,8 +110,24 @@ async def stream():
     return StreamingResponse(event_generator(),
                              media_type="text/event-stream")
 
+@app.get("/subscribe")
+async def subscribe(fields: Optional[str] = None, rate: Optional[float] = None,
+                    every: Optional[int] = None, decimate: int = 1):
+    """SSE stream of a field projection, e.g. /subscribe?fields=label,probs&rate=0.2"""
+    selection = _selection_or_400(fields, rate, every, decimate)
+
+    async def projection_generator():
+        async with aclosing(hub.subscribe(selection)) as frames:
+            async for text in frames:
+                yield f"data: {text}\n\n"
+    return StreamingResponse(projection_generator(), media_type="text/event-stream")
+
 @app.get("/unified_stream")
-async def unified_stream():
+async def unified_stream(fields: Optional[str] = None, rate: Optional[float] = None,
+                         every: Optional[int] = None, decimate: int = 1):
+    if fields is not None:
+        return await subscribe(fields, rate, every, decimate)
+
     async def unified_generator():
         while not detector.available:
             await asyncio.sleep(0.1)
@@ -62,10 +144,10 @@ async def unified_stream():
             
             # Get heart rate
             hr = None
-            if ppg_inlet:
-                chunk, _ = ppg_inlet.pull_chunk(timeout=0.1, max_samples=1)
-                if chunk:
-                    hr = float(chunk[0][0])
+            if acquisition.has('PPG'):
+                ppg, _ = acquisition.latest('PPG')
+                if len(ppg):
+                    hr = float(ppg[0][0])
             
             # Combined payload
             payload = {
@@ -99,55 +181,182 @@ async def raw_eeg():
 @app.get("/heart_rate")
 async def heart_rate():
     async def heart_rate_generator():
-        while ppg_inlet is None:
+        while not acquisition.has('PPG'):
             await asyncio.sleep(0.1)
+        pos = acquisition.streams['PPG'].ring.count
         while True:
-            chunk, _ = ppg_inlet.pull_chunk(timeout=1.0, max_samples=1)
-            if chunk:
-                hr = float(chunk[0][0])
-                yield f"data: {json.dumps({'hr': hr})}\n\n"
-            await asyncio.sleep(0)
+            chunk, _, pos = acquisition.read('PPG', pos)
+            for sample in chunk:
+                yield f"data: {json.dumps({'hr': float(sample[0])})}\n\n"
+            await asyncio.sleep(0.05)
     return StreamingResponse(heart_rate_generator(), media_type="text/event-stream")
 
 @app.websocket("/ws")
-async def ws_stream(ws: WebSocket):
+async def ws_stream(ws: WebSocket, fields: Optional[str] = None, rate: Optional[float] = None,
+                    every: Optional[int] = None, decimate: int = 1):
+    try:
+        selection = parse_selection(fields, rate, every, decimate, tick_hz=hub.tick_hz)
+    except ValueError:
+        await ws.close(code=1008)
+        return
     await ws.accept()
     while not detector.available:
         await asyncio.sleep(0.1)
 
-    while True:
-        t0 = time.perf_counter()
-        ppg_batch = []
-        while time.perf_counter() - t0 < 1.0:
-            if ppg_inlet is not None:
-                chunk, _ = ppg_inlet.pull_chunk(timeout=0.05, max_samples=64)
-                if chunk:
-                    for s in chunk:
-                        ppg_batch.append(float(s[0]))
-            await asyncio.sleep(0)
+    try:
+        async with aclosing(hub.subscribe(selection)) as frames:
+            async for text in frames:
+                await ws.send_text(text)
+    except WebSocketDisconnect:
+        pass
 
-        eeg_block = []
-        n_eeg = int(detector.fs or 0)
-        if n_eeg > 0:
-            with detector._lock:
-                if detector.buf:
-                    buf_list = list(detector.buf)
-                    eeg_block = [sample.tolist() for sample in buf_list[-n_eeg:]]
+@app.get("/spectrogram/meta")
+async def spectrogram_meta():
+    return spectrogram.meta()
 
-        label, probs = detector.infer_latest(verbose=False)
+@app.websocket("/ws/spectrogram")
+async def ws_spectrogram(ws: WebSocket, backlog: float = 0.0):
+    """Binary float32 spectrogram columns (layout in /spectrogram/meta), optionally with `backlog` seconds of history."""
+    await ws.accept()
+    hop_sec = spectrogram.hop_samps / spectrogram.fs
+    last = max(0, spectrogram.seq - int(backlog / hop_sec))
+    try:
+        while True:
+            for seq, payload in spectrogram.columns_since(last):
+                await ws.send_bytes(payload)
+                last = seq
+            await asyncio.sleep(hop_sec / 2)
+    except WebSocketDisconnect:
+        pass
 
-        payload = {
-            "label": label,
-            "probs": probs,
-            "eeg": eeg_block,
-            "ppg": ppg_batch,
-            "fs": {
-                "eeg": detector.fs,
-                "ppg": ppg_fs
-            }
-        }
-        await ws.send_json(payload)
+@app.get("/eeg_range")
+async def eeg_range(since: float = 300.0, until: float = 0.0, width: int = 800):
+    """Per-column min/max/mean EEG for the last `since`..`until` seconds at `width` columns."""
+    if width < 1 or width > 10000 or since <= until:
+        raise HTTPException(status_code=400, detail="Need since > until and 1 <= width <= 10000")
+    result = eeg_summary.query(since, until, width)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No EEG data in range")
+    return result
+
+@app.get("/history")
+async def history_range(since: float = 3600.0, until: float = 0.0, resolution: str = "auto"):
+    """Focus/HR aggregates for the window [now - since, now - until] from minute or hour rollups."""
+    if until < 0 or since <= until:
+        raise HTTPException(status_code=400, detail="Need since > until >= 0")
+    now = time.time()
+    try:
+        return history.query(now - since, now - until, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/history/recent")
+async def history_recent(since: float = 60.0):
+    return {"records": history.recent(time.time() - since)}
+
+@app.get("/subscriptions")
+async def subscriptions():
+    return {"tick_hz": hub.tick_hz, "subscribers": hub.subscriber_counts(), "stats": hub.stats,
+            "prediction_log": prediction_sink.stats, "history_spill": history.spill_stats,
+            "inference": detector.inference_stats,
+            "artifacts": detector.gate_stats(),
+            "acquisition": {"streams": acquisition.status(), "stats": acquisition.stats}}
+
+@app.get("/health")
+async def health():
+    """Acquisition and detector stream health, with the last measured gap / recovery times."""
+    return {"acquisition": acquisition.health(), "detector": detector.health}
+
+@app.get("/alarm")
+async def alarm_status():
+    return alarm.get_status()
+
+def _devices_or_404():
+    if devices is None:
+        raise HTTPException(status_code=404, detail="Multi-device scoring is off; set EEG_MULTI_DEVICE=1")
+    return devices
+
+@app.get("/devices")
+async def list_devices():
+    return {"devices": _devices_or_404().list_devices(), "stats": devices.stats}
+
+def _device_or_404(device_id: str):
+    collector = _devices_or_404().device(device_id)
+    if collector is None:
+        raise HTTPException(status_code=404, detail=f"Unknown device '{device_id}'")
+    return collector
+
+@app.get("/devices/{device_id}")
+async def device_status(device_id: str):
+    return _device_or_404(device_id).info(devices.stale_sec)
+
+@app.get("/devices/{device_id}/stream")
+async def device_stream(device_id: str):
+    """SSE of one headset's predictions, one event per scoring hop; ends when the device is dropped."""
+    collector = _device_or_404(device_id)
+
+    async def gen():
+        last = None
+        while devices.device(device_id) is collector:  # Evicted (or replaced on return): end the stream
+            latest = collector.latest
+            if latest is not None and latest is not last:
+                last = latest
+                yield f"data: {json.dumps({'device_id': device_id, **latest})}\n\n"
+            await asyncio.sleep(devices.hop_sec / 4)
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+def _reload_models(model_dir: Optional[str] = None, allow_label_change: bool = False) -> dict:
+    status = detector.reload(model_dir=model_dir, allow_label_change=allow_label_change)
+    if status["state"] == "ok" and devices:
+        device_status = devices.reload(model_dir=model_dir, allow_label_change=allow_label_change)
+        if device_status["state"] != "ok":
+            # The main detector already swapped; say so instead of reporting success
+            status = dict(status, state="partial",
+                          error=f"Device scorer kept its previous model: {device_status['error']}")
+            print(f"[WARN] {status['error']}")
+    return status
+
+# POST /reload is off unless ALLOW_RELOAD=1, and then only accepted from this machine. It always
+# reads MODEL_WATCH_DIR (or the startup paths): checkpoints are pickles, so clients never pick the files
+RELOAD_ENABLED = os.environ.get("ALLOW_RELOAD") == "1"
+RELOAD_DIR = os.environ.get("MODEL_WATCH_DIR")
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+@app.post("/reload")
+async def reload_model(request: Request, allow_label_change: bool = False):
+    """Load, warm up and swap in a retrained model; streams keep running on the old one until the swap."""
+    if not RELOAD_ENABLED:
+        raise HTTPException(status_code=403, detail="Reload is disabled; set ALLOW_RELOAD=1 to enable it")
+    if request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Reload is only accepted from localhost")
+    status = await asyncio.to_thread(_reload_models, RELOAD_DIR, allow_label_change)
+    if status["state"] != "ok":
+        raise HTTPException(status_code=409, detail=status)
+    return status
+
+@app.get("/reload")
+async def reload_status():
+    return {"detector": detector.reload_status, "devices": devices.scorer.reload_status if devices else None}
+
+# MODEL_WATCH_DIR: reload automatically when train.py writes new artifacts there
+model_watcher = ModelWatcher(RELOAD_DIR, _reload_models) if RELOAD_DIR else None
+
+@app.on_event("startup")
+async def startup():
+    hub.start()
+    if devices:
+        devices.start()
+    if model_watcher:
+        model_watcher.start()
 
 @app.on_event("shutdown")
 def shutdown():
+    if model_watcher:
+        model_watcher.stop()
+    hub.stop()
+    if devices:
+        devices.stop()
+    acquisition.stop()
+    history.close()
+    prediction_sink.close()
     detector.stop()
\ No newline at end of file
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+One acquisition thread for every Muse LSL stream (EEG, PPG, ACC, GYRO).
+
+Acquisition owns the inlets and drains all of them from a single loop into
+preallocated per-stream ring buffers, keeping each sample's LSL timestamp.
+Pulls are non-blocking; the loop sleeps poll_sec only when every inlet came
+back empty. For pylsl float32 streams, samples are pulled straight into a
+preallocated scratch array (pull_chunk dest_obj), so no per-sample Python
+lists are built.
+
+Consumers never touch LSL:
+  - reader(kind) returns an inlet-like object for EEGMoodDetector(source=...)
+    or StreamHub(ppg_inlet=...). Each reader keeps its own read position.
+  - latest / read / window query one stream; aligned() returns every
+    modality over the same LSL time span.
+  - motion_window plugs into EEGMoodDetector.motion_provider.
+
+A stream with no chunk for stall_sec is marked stalled. Streams opened here
+are then re-resolved by source id in the background (relaunching muselsl if
+the one we started died) and swapped in as soon as they reappear. health()
+reports per-stream state, gap length and recovery latency.
+
+Run directly to watch live stream rates and cross-modality alignment:
+    python acquisition.py --seconds 10
+    python acquisition.py --synthetic --seconds 10
+    python acquisition.py --synthetic --seconds 20 --outage 4   # drop EEG mid-run, time the recovery
+"""
+import argparse
+import bisect
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+from pylsl import StreamInlet, resolve_byprop, cf_float32
+
+KINDS = ('EEG', 'PPG', 'ACC', 'GYRO')
+DEFAULT_BUFFER_SEC = 60.0
+MAX_CHUNK = 256
+
+
+def start_muselsl_if_needed(timeout=20.0):
+    """Launch `muselsl stream --ppg --acc --gyro` when no EEG stream is up. Returns the process or None."""
+    if resolve_byprop('type', 'EEG', timeout=3):
+        return None
+    print("EEG: No EEG stream found.")
+    flags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS if os.name == 'nt' else 0
+    try:
+        proc = subprocess.Popen([sys.executable, "-m", "muselsl", "stream", "--ppg", "--acc", "--gyro"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, creationflags=flags)
+    except Exception as e:
+        raise RuntimeError(f"Failed to launch muselsl subprocess: {e}")
+    for _ in range(int(timeout * 2)):
+        if resolve_byprop('type', 'EEG', timeout=0.5):
+            print("EEG: EEG stream is up.")
+            return proc
+        time.sleep(0.5)
+    try:
+        if proc.poll() is None:
+            proc.terminate()
+    except Exception:
+        pass
+    raise RuntimeError("Failed to start EEG stream via muselsl (timeout).")
+
+
+class RingBuffer:
+    """Preallocated (capacity, channels) float32 samples with float64 timestamps.
+
+    Samples are addressed by their running index (0 = first sample ever written);
+    only the last `capacity` of them are kept.
+    """
+
+    def __init__(self, capacity, n_channels):
+        self.capacity = int(capacity)
+        self.data = np.zeros((self.capacity, n_channels), dtype=np.float32)
+        self.stamps = np.zeros(self.capacity, dtype=np.float64)
+        self.count = 0
+
+    @property
+    def first(self):
+        return max(0, self.count - self.capacity)
+
+    def extend(self, block, stamps):
+        n = len(block)
+        if n > self.capacity:
+            block, stamps = block[-self.capacity:], stamps[-self.capacity:]
+            self.count += n - self.capacity
+            n = self.capacity
+        start = self.count % self.capacity
+        head = min(n, self.capacity - start)
+        self.data[start:start + head] = block[:head]
+        self.stamps[start:start + head] = stamps[:head]
+        if head < n:
+            self.data[:n - head] = block[head:]
+            self.stamps[:n - head] = stamps[head:]
+        self.count += n
+
+    def slice(self, lo, hi):
+        """Copies of samples lo..hi (running indices, clipped to what is still held)."""
+        lo, hi = max(lo, self.first), min(hi, self.count)
+        if hi <= lo:
+            return self.data[:0].copy(), self.stamps[:0].copy()
+        idx = np.arange(lo, hi) % self.capacity
+        return self.data[idx], self.stamps[idx]
+
+    def index_at(self, t):
+        """Running index of the first held sample with timestamp >= t."""
+        return bisect.bisect_left(range(self.first, self.count), t,
+                                  key=lambda i: self.stamps[i % self.capacity]) + self.first
+
+    def last_stamp(self):
+        return self.stamps[(self.count - 1) % self.capacity] if self.count else None
+
+
+class StreamState:
+    """Inlet, ring buffer, counters and health for one modality."""
+
+    def __init__(self, kind, inlet, buffer_sec, resolved=True):
+        self.kind = kind
+        info = inlet.info()
+        self.name = info.name()
+        self.source_id = info.source_id()
+        self.fs = float(info.nominal_srate()) or 256.0
+        self.n_channels = info.channel_count()
+        self.resolved = resolved  # Opened from LSL here, so it can be re-resolved after a stall
+        self.ring = RingBuffer(int(buffer_sec * self.fs), self.n_channels)
+        self.cond = threading.Condition()
+        self.set_inlet(inlet)
+        self.chunks = 0
+        self.last_data = None
+        # Health: live -> stalled (no chunk for stall_sec) -> reconnecting -> stalled ... -> live
+        self.state = 'live'
+        self.stalls = 0
+        self.stalled_at = None
+        self.last_gap_sec = None       # Last chunk before the stall -> first chunk after it
+        self.last_recovery_sec = None  # Stall detected -> first chunk after it
+        self.reconnector = None
+
+    def health(self):
+        return {'state': self.state, 'stalls': self.stalls, 'last_gap_sec': self.last_gap_sec,
+                'last_recovery_sec': self.last_recovery_sec}
+
+    def set_inlet(self, inlet):
+        # pylsl fills `scratch` in place; other inlets (synthetic sources) return lists
+        scratch = None
+        if isinstance(inlet, StreamInlet) and inlet.info().channel_format() == cf_float32:
+            scratch = np.zeros((MAX_CHUNK, self.n_channels), dtype=np.float32)
+        offset = 0.0  # LSL clock offset to this machine, added to every timestamp
+        if hasattr(inlet, 'time_correction'):
+            try:
+                offset = inlet.time_correction(timeout=1.0)
+            except Exception:
+                pass
+        with self.cond:
+            self.inlet, self.scratch, self.offset = inlet, scratch, offset
+            self.opened_at = time.time()
+
+
+class StreamReader:
+    """Inlet-like view of one buffered stream (info(), pull_chunk()) with its own read position."""
+
+    def __init__(self, acquisition, kind):
+        self.acquisition = acquisition
+        self.kind = kind
+        self.state = acquisition.streams[kind]
+        self.pos = self.state.ring.count
+        self.dropped = 0  # Samples overwritten before this reader got to them
+
+    def info(self):
+        return self.state.inlet.info()
+
+    def pull_chunk(self, timeout=0.0, max_samples=1024):
+        st = self.state
+        with st.cond:
+            if st.ring.count <= self.pos and timeout:
+                st.cond.wait_for(lambda: st.ring.count > self.pos or self.acquisition.stopped, timeout)
+            first = max(self.pos, st.ring.first)
+            self.dropped += first - self.pos
+            last = min(st.ring.count, first + max_samples)
+            data, stamps = st.ring.slice(first, last)
+        self.pos = last
+        return data.tolist(), stamps.tolist()
+
+
+class Acquisition:
+    """Opens the Muse streams and keeps all of them buffered from one thread."""
+
+    def __init__(self, kinds=KINDS, buffer_sec=DEFAULT_BUFFER_SEC, sources=None, poll_sec=0.005,
+                 required=('EEG',), launch_muselsl=False, stall_sec=2.0):
+        self.kinds = tuple(kinds)
+        self.buffer_sec = float(buffer_sec)
+        self.sources = sources or {}  # kind -> already-open inlet (e.g. synthetic.SyntheticInlet)
+        self.poll_sec = float(poll_sec)
+        self.stall_sec = float(stall_sec)  # No chunk for this long marks a stream stalled
+        self.required = tuple(required)
+        self.launch_muselsl = launch_muselsl
+        self.streams = {}
+        self.stopped = False
+        self.stats = {'loops': 0, 'idle_loops': 0, 'pulls': 0}
+        self._muselsl_proc = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # ---------- Lifecycle ----------
+    def open(self, timeout=5.0):
+        """Resolve every kind not given in `sources`. Missing required kinds raise RuntimeError."""
+        if self.launch_muselsl and not self.sources.get('EEG'):
+            self._muselsl_proc = start_muselsl_if_needed()
+        for kind in self.kinds:
+            if kind in self.streams:
+                continue
+            inlet = self.sources.get(kind)
+            if inlet is None:
+                found = resolve_byprop('type', kind, timeout=timeout)
+                inlet = StreamInlet(found[0], max_chunklen=MAX_CHUNK) if found else None
+            if inlet is None:
+                if kind in self.required:
+                    raise RuntimeError(f"No {kind} stream found.")
+                print(f"[WARN] No {kind} stream found; continuing without it.")
+                continue
+            st = StreamState(kind, inlet, self.buffer_sec, resolved=kind not in self.sources)
+            self.streams[kind] = st
+            print(f"[INFO] {kind}: {st.name} fs={st.fs:g}Hz channels={st.n_channels}")
+        return self
+
+    def start(self, timeout=5.0):
+        if self._thread and self._thread.is_alive():
+            return self
+        self.open(timeout)
+        self.stopped = False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self._stop_event.set()
+        for st in self.streams.values():
+            with st.cond:
+                st.cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+        try:
+            if self._muselsl_proc and self._muselsl_proc.poll() is None:
+                self._muselsl_proc.terminate()
+        except Exception:
+            pass
+
+    # ---------- Acquisition loop ----------
+    def _pull(self, st):
+        """One non-blocking pull into the ring. Returns the number of samples read."""
+        with st.cond:  # The reconnector may swap these; use one consistent set for the whole pull
+            inlet, scratch, offset = st.inlet, st.scratch, st.offset
+        if scratch is not None:
+            _, stamps = inlet.pull_chunk(timeout=0.0, max_samples=MAX_CHUNK, dest_obj=scratch)
+            block = scratch[:len(stamps)]
+        else:
+            chunk, stamps = inlet.pull_chunk(timeout=0.0, max_samples=MAX_CHUNK)
+            if len(chunk) == 0:
+                return 0
+            block = np.asarray(chunk, dtype=np.float32)
+        n = len(stamps)
+        if n:
+            now = time.time()
+            with st.cond:
+                st.ring.extend(block[:n], np.asarray(stamps, dtype=np.float64) + offset)
+                st.chunks += 1
+                if st.state != 'live':
+                    st.last_gap_sec = now - (st.last_data or st.opened_at)
+                    st.last_recovery_sec = now - st.stalled_at
+                    st.state = 'live'
+                    print(f"[INFO] {st.kind}: recovered after a {st.last_gap_sec:.1f}s gap "
+                          f"({st.last_recovery_sec:.1f}s after the stall was detected)")
+                st.last_data = now
+                st.cond.notify_all()
+        self.stats['pulls'] += 1
+        return n
+
+    def _loop(self):
+        streams = list(self.streams.values())
+        while not self._stop_event.is_set():
+            got = 0
+            for st in streams:
+                try:
+                    n = self._pull(st)
+                    while n == MAX_CHUNK:  # Drain a backlog before moving on
+                        got += n
+                        n = self._pull(st)
+                    got += n
+                except Exception as e:
+                    print(f"[WARN] {st.kind} pull failed: {e}")
+                    self._mark_stalled(st)
+                self._check_stall(st)
+            self.stats['loops'] += 1
+            if not got:
+                self.stats['idle_loops'] += 1
+                self._stop_event.wait(self.poll_sec)
+
+    # ---------- Stall detection / reconnection ----------
+    def _mark_stalled(self, st):
+        with st.cond:
+            if st.state != 'live':
+                return
+            st.state, st.stalled_at, st.stalls = 'stalled', time.time(), st.stalls + 1
+        print(f"[WARN] {st.kind}: no data for {time.time() - (st.last_data or st.opened_at):.1f}s, stalled")
+
+    def _check_stall(self, st):
+        now = time.time()
+        if st.state == 'live' and now - (st.last_data or st.opened_at) > self.stall_sec:
+            self._mark_stalled(st)
+        # Streams opened here are re-resolved; a reopened inlet gets stall_sec to deliver before the next try
+        if (st.state == 'stalled' and st.resolved and now - st.opened_at > self.stall_sec
+                and (st.reconnector is None or not st.reconnector.is_alive())):
+            st.state = 'reconnecting'
+            st.reconnector = threading.Thread(target=self._reconnect, args=(st,), daemon=True)
+            st.reconnector.start()
+
+    def _reconnect(self, st):
+        """Background re-resolution by source id (falling back to type) until the stream is back."""
+        while not self._stop_event.is_set() and st.state == 'reconnecting':
+            if st.kind == 'EEG' and self._muselsl_proc is not None and self._muselsl_proc.poll() is not None:
+                try:  # The muselsl we launched died; start another one
+                    self._muselsl_proc = start_muselsl_if_needed()
+                except Exception as e:
+                    print(f"[WARN] {e}")
+            prop, value = ('source_id', st.source_id) if st.source_id else ('type', st.kind)
+            found = resolve_byprop(prop, value, timeout=1.0)
+            if found and st.state == 'reconnecting':
+                st.set_inlet(StreamInlet(found[0], max_chunklen=MAX_CHUNK))
+                with st.cond:
+                    if st.state == 'reconnecting':
+                        st.state = 'stalled'
+                print(f"[INFO] {st.kind}: reopened {found[0].name()} "
+                      f"{time.time() - st.stalled_at:.1f}s after the stall")
+                return
+
+    # ---------- Queries ----------
+    def has(self, kind):
+        return kind in self.streams
+
+    def fs(self, kind):
+        return self.streams[kind].fs
+
+    def reader(self, kind):
+        return StreamReader(self, kind)
+
+    def read(self, kind, pos, max_samples=None):
+        """(data, stamps, next_pos) for samples after running index `pos`; never blocks."""
+        st = self.streams[kind]
+        with st.cond:
+            hi = st.ring.count if max_samples is None else min(st.ring.count, max(pos, st.ring.first) + max_samples)
+            data, stamps = st.ring.slice(pos, hi)
+        return data, stamps, hi
+
+    def latest(self, kind, n=1):
+        """Last n samples and timestamps of one stream."""
+        st = self.streams[kind]
+        with st.cond:
+            return st.ring.slice(st.ring.count - n, st.ring.count)
+
+    def window(self, kind, seconds, end=None):
+        """Samples with timestamps in (end - seconds, end]; end defaults to the stream's latest timestamp."""
+        st = self.streams[kind]
+        with st.cond:
+            if not st.ring.count:
+                return st.ring.slice(0, 0)
+            end = st.ring.last_stamp() if end is None else end
+            lo = st.ring.index_at(end - seconds + 1e-9)
+            hi = st.ring.index_at(end + 1e-9)
+            return st.ring.slice(lo, hi)
+
+    def aligned(self, seconds, kinds=None, end=None):
+        """{kind: (data, stamps)} over one shared LSL time span.
+
+        `end` defaults to the newest time every requested stream has reached, so
+        no modality is cut short by arriving a chunk later than the others.
+        """
+        kinds = [k for k in (kinds or self.kinds) if k in self.streams]
+        if end is None:
+            stamps = [self.streams[k].ring.last_stamp() for k in kinds]
+            if any(s is None for s in stamps):
+                return {}
+            end = min(stamps)
+        return {k: self.window(k, seconds, end) for k in kinds}
+
+    def motion_window(self, seconds):
+        """(acc, gyro) arrays covering the latest EEG window, for EEGMoodDetector.motion_provider."""
+        if 'EEG' not in self.streams or not self.streams['EEG'].ring.count:
+            return None, None
+        end = self.streams['EEG'].ring.last_stamp()
+        acc = self.window('ACC', seconds, end)[0] if 'ACC' in self.streams else None
+        gyro = self.window('GYRO', seconds, end)[0] if 'GYRO' in self.streams else None
+        return (acc if acc is not None and len(acc) else None), (gyro if gyro is not None and len(gyro) else None)
+
+    def status(self):
+        now = time.time()
+        return {kind: {'name': st.name, 'fs': st.fs, 'channels': st.n_channels, 'samples': st.ring.count,
+                       'chunks': st.chunks,
+                       'last_data_age': None if st.last_data is None else now - st.last_data, **st.health()}
+                for kind, st in self.streams.items()}
+
+    def health(self):
+        """'live' when every stream is live, else the worst stream state, plus per-stream details."""
+        states = [st.state for st in self.streams.values()]
+        overall = next((s for s in ('reconnecting', 'stalled') if s in states), 'live' if states else 'closed')
+        return {'state': overall, 'streams': {kind: st.health() for kind, st in self.streams.items()}}
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    parser = argparse.ArgumentParser(description="Unified EEG/PPG/ACC/GYRO acquisition monitor")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--window', type=float, default=6.0, help='Aligned window length to query')
+    parser.add_argument('--synthetic', action='store_true', help='Use synthetic.py EEG/PPG instead of LSL')
+    parser.add_argument('--outage', type=float, default=0.0, help='Synthetic only: drop EEG for this many seconds')
+    args = parser.parse_args()
+
+    sources, kinds = None, KINDS
+    if args.synthetic:
+        from synthetic import synthetic_pair
+        eeg, ppg = synthetic_pair()
+        sources, kinds = {'EEG': eeg, 'PPG': ppg}, ('EEG', 'PPG')
+    acq = Acquisition(kinds=kinds, sources=sources).start()
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    try:
+        if args.synthetic and args.outage:
+            time.sleep(args.seconds / 4)
+            sources['EEG'].outage(args.outage)
+            time.sleep(args.seconds * 3 / 4)
+        else:
+            time.sleep(args.seconds)
+    finally:
+        cpu = time.process_time() - cpu0
+        wall = time.perf_counter() - t0
+        acq.stop()
+    for kind, s in acq.status().items():
+        print(f"[INFO] {kind}: {s['samples']} samples ({s['samples'] / wall:.1f}/s, nominal {s['fs']:g}) "
+              f"in {s['chunks']} chunks | {s['state']}, {s['stalls']} stall(s)"
+              + (f", last gap {s['last_gap_sec']:.1f}s, recovered {s['last_recovery_sec']:.2f}s after detection"
+                 if s['last_recovery_sec'] is not None else ""))
+    for kind, (data, stamps) in acq.aligned(args.window).items():
+        span = f"{stamps[0]:.3f}..{stamps[-1]:.3f}" if len(stamps) else "empty"
+        print(f"[INFO] aligned {args.window:g}s {kind}: {data.shape} {span}")
+    st = acq.stats
+    print(f"[INFO] {st['loops']} loops ({st['idle_loops']} idle), {st['pulls']} pulls, "
+          f"CPU {cpu / wall:.1%} of one core")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Offline scoring of recorded sessions.
+
+Scores every hop of one or more recordings and writes a compact timeline per
+recording (<stem>.timeline.npz: hop end times, per-hop probabilities, label
+names). Each recording is filtered once, the way data_clean.py builds the
+training set. When the hop is a multiple of the Welch half-segment, every
+2 s periodogram is computed once and shared by all the windows that contain
+it; otherwise windows are processed as strided batches. The model then runs
+on large batches. Files are processed in parallel, one per worker.
+
+Inputs can be .npz recordings, .npy EEG arrays (memory-mapped) or sessions
+in a session_store.py directory (memory-mapped):
+    python batch_score.py recordings/*.npz --model best_eeg_model.pth
+    python batch_score.py --store sessions --model rf_eeg_model.joblib --csv
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.signal import spectrogram
+
+from signal_processing import BAND_LIMITS, filter_eeg_signal, extract_band_powers_batch
+
+BATCH_WINDOWS = 4096  # Windows per model call / per strided feature batch
+
+
+# -----------------------
+# Features
+# -----------------------
+def _band_means(freqs, log_psd, axis):
+    """Mean log PSD inside each band along `axis` (the frequency axis)."""
+    return np.stack([np.take(log_psd, np.flatnonzero((freqs >= lo) & (freqs < hi)), axis=axis).mean(axis=axis)
+                     for lo, hi in BAND_LIMITS.values()], axis=1)
+
+
+def hop_band_powers(sig, fs, window_samples, step_samples):
+    """(n_hops, bands, channels) band powers; equal to extract_band_powers on each window."""
+    n_hops = (sig.shape[0] - window_samples) // step_samples + 1
+    if n_hops <= 0:
+        return np.empty((0, len(BAND_LIMITS), sig.shape[1]))
+    nperseg = min(int(fs * 2), window_samples)
+    half = nperseg // 2
+    if half and step_samples % half == 0 and (window_samples - nperseg) % half == 0:
+        # Welch segments of every window sit on a shared half-segment grid
+        used = (n_hops - 1) * step_samples + window_samples
+        freqs, _, seg = spectrogram(sig[:used].T, fs, window='hann', nperseg=nperseg, noverlap=nperseg - half,
+                                    detrend='constant', scaling='density', mode='psd', axis=-1)
+        seg_per_win = (window_samples - nperseg) // half + 1
+        csum = np.concatenate([np.zeros(seg.shape[:2] + (1,)), np.cumsum(seg, axis=-1)], axis=-1)
+        first = np.arange(n_hops) * (step_samples // half)
+        psd = (csum[..., first + seg_per_win] - csum[..., first]) / seg_per_win  # (channels, freqs, hops)
+        log_psd = np.log10(psd + 1e-12).transpose(2, 1, 0)  # (hops, freqs, channels)
+        return _band_means(freqs, log_psd, axis=1)
+
+    views = np.lib.stride_tricks.sliding_window_view(sig, window_samples, axis=0)[::step_samples]
+    out = []
+    for start in range(0, n_hops, BATCH_WINDOWS):
+        out.append(extract_band_powers_batch(views[start:start + BATCH_WINDOWS].transpose(0, 2, 1), fs))
+    return np.concatenate(out)
+
+
+# -----------------------
+# Models
+# -----------------------
+class Scorer:
+    """LSTM-family checkpoint (any model_runtime format) or RandomForest .joblib."""
+
+    def __init__(self, model_path, scaler_path, label_map):
+        from joblib import load
+        self.label_map = label_map
+        self.kind = 'rf' if model_path.endswith('.joblib') else 'lstm'
+        if self.kind == 'rf':
+            self.model = load(model_path)  # Trained on unscaled features (randomforest.py)
+            self.scaler = None
+        else:
+            import torch
+            from model_runtime import load_model
+            torch.set_num_threads(1)
+            self.model, self.device = load_model(model_path, len(label_map), device=torch.device('cpu'))
+            self.scaler = load(scaler_path) if scaler_path and os.path.exists(scaler_path) else None
+
+    def predict_proba(self, feats):
+        feats = np.nan_to_num(feats, nan=0.0, neginf=-12.0, posinf=12.0)
+        if self.kind == 'rf':
+            return self.model.predict_proba(feats).astype(np.float32)
+        import torch
+        import torch.nn.functional as F
+        from train import to_model_input
+        if self.scaler is not None:
+            feats = self.scaler.transform(feats)
+        out = []
+        with torch.no_grad():
+            for start in range(0, len(feats), BATCH_WINDOWS):
+                x = torch.from_numpy(to_model_input(feats[start:start + BATCH_WINDOWS]).astype(np.float32))
+                out.append(F.softmax(self.model(x), dim=1).numpy())
+        return np.concatenate(out) if out else np.empty((0, len(self.label_map)), dtype=np.float32)
+
+
+_scorer = None
+
+
+def _init_worker(model_path, scaler_path, label_map):
+    global _scorer
+    _scorer = Scorer(model_path, scaler_path, label_map)
+
+
+# -----------------------
+# Recordings
+# -----------------------
+def open_eeg(source):
+    """(name, EEG array) for a .npz/.npy path or a ('store', root, session_id) tuple."""
+    if isinstance(source, tuple):
+        from session_store import SessionStore
+        _, root, sid = source
+        return sid, SessionStore(root).array(sid)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    if source.endswith('.npy'):
+        return stem, np.load(source, mmap_mode='r')
+    with np.load(source) as z:
+        return stem, z['eeg']
+
+
+def score_recording(source, out_dir, window_sec, step_sec, fs, write_csv):
+    t0 = time.perf_counter()
+    name, eeg = open_eeg(source)
+    if eeg.ndim != 2 or eeg.shape[0] == 0:
+        raise ValueError(f"{name}: no EEG data")
+    window_samples, step_samples = int(window_sec * fs), int(step_sec * fs)
+    sig = filter_eeg_signal(np.asarray(eeg[:, :5], dtype=np.float64), fs)
+    t_feat = time.perf_counter()
+    bp = hop_band_powers(sig, fs, window_samples, step_samples)
+    t_model = time.perf_counter()
+    probs = _scorer.predict_proba(bp.reshape(len(bp), -1))
+    t_end = (np.arange(len(probs)) * step_samples + window_samples) / fs
+    labels = [_scorer.label_map[i] for i in range(probs.shape[1])]
+
+    out_path = os.path.join(out_dir, f"{name}.timeline.npz")
+    np.savez_compressed(out_path, t=t_end.astype(np.float32), probs=probs.astype(np.float32),
+                        labels=np.array(labels), window_sec=window_sec, step_sec=step_sec, fs=fs)
+    if write_csv:
+        with open(os.path.join(out_dir, f"{name}.timeline.csv"), 'w') as f:
+            f.write("t," + ",".join(labels) + ",label\n")
+            for t, p in zip(t_end, probs):
+                f.write(f"{t:.3f}," + ",".join(f"{v:.4f}" for v in p) + f",{labels[int(p.argmax())]}\n")
+    done = time.perf_counter()
+    return {'name': name, 'out': out_path, 'hops': len(probs), 'duration_sec': eeg.shape[0] / fs,
+            'filter_sec': t_feat - t0, 'features_sec': t_model - t_feat, 'model_sec': done - t_model,
+            'total_sec': done - t0,
+            'label_fraction': {lab: float((probs.argmax(1) == i).mean()) if len(probs) else 0.0
+                               for i, lab in enumerate(labels)}}
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    parser = argparse.ArgumentParser(description="Score recorded sessions into prediction timelines")
+    parser.add_argument('inputs', nargs='*', help='.npz or .npy recordings')
+    parser.add_argument('--store', default=None, help='Also score every session in this session store')
+    parser.add_argument('--model', default='best_eeg_model.pth', help='LSTM-family checkpoint or RF .joblib')
+    parser.add_argument('--scaler', default='scaler.joblib', help='Used for LSTM-family models only')
+    parser.add_argument('--window', type=float, default=None, help='Seconds (default: inference_config.json)')
+    parser.add_argument('--step', type=float, default=None, help='Seconds (default: inference_config.json)')
+    parser.add_argument('--fs', type=int, default=None)
+    parser.add_argument('--out-dir', default='timelines')
+    parser.add_argument('--csv', action='store_true', help='Also write a CSV next to each timeline')
+    parser.add_argument('--workers', type=int, default=0, help='Parallel files (0 = one per core)')
+    args = parser.parse_args()
+
+    cfg = {'window_sec': 8.0, 'step_sec': 1.0, 'fs': 256}
+    try:
+        with open('inference_config.json', 'r') as f:
+            cfg.update(json.load(f))
+    except Exception:
+        pass
+    window_sec = args.window or cfg['window_sec']
+    step_sec = args.step or cfg['step_sec']
+    fs = args.fs or cfg['fs']
+    try:
+        with open('label_map.json', 'r') as f:
+            label_map = {int(k): v for k, v in json.load(f).items()}
+    except Exception:
+        label_map = {0: 'focused', 1: 'unfocused'}
+
+    sources = list(args.inputs)
+    if args.store:
+        from session_store import SessionStore
+        sources += [('store', args.store, sid) for sid in SessionStore(args.store).sessions()]
+    if not sources:
+        raise SystemExit("[ERROR] No inputs given")
+    os.makedirs(args.out_dir, exist_ok=True)
+    workers = min(len(sources), args.workers or os.cpu_count() or 1)
+
+    t0 = time.perf_counter()
+    total_sec = 0.0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(args.model, args.scaler, label_map)) as pool:
+        futures = [pool.submit(score_recording, src, args.out_dir, window_sec, step_sec, fs, args.csv)
+                   for src in sources]
+        for src, fut in zip(sources, futures):
+            try:
+                r = fut.result()
+            except Exception as e:
+                print(f"[WARN] {src}: {e}")
+                continue
+            total_sec += r['duration_sec']
+            mix = " ".join(f"{k}:{v:.2f}" for k, v in r['label_fraction'].items())
+            print(f"[INFO] {r['name']}: {r['duration_sec'] / 60:.1f} min, {r['hops']} hops in {r['total_sec']:.2f}s "
+                  f"(filter {r['filter_sec']:.2f}s, features {r['features_sec']:.2f}s, model {r['model_sec']:.2f}s) "
+                  f"| {mix} -> {r['out']}")
+    elapsed = time.perf_counter() - t0
+    print(f"[INFO] Scored {total_sec / 3600:.2f} h of EEG in {elapsed:.1f}s with {workers} worker(s) "
+          f"({total_sec / max(elapsed, 1e-9):.0f}x real time)")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,9 @@ import numpy as np
 from typing import List
 import os
 import sys
+import zipfile
+
+STREAM_CHUNK_ROWS = 1 << 16  # Rows written per step in streaming mode
 
 def load_npz(path: str):
     if not os.path.exists(path):
@@ -48,16 +51,102 @@ def concat_files(paths: List[str], out_path: str):
     print(f"  PPG shape: {ppg_all.shape}")
     print(f"  Source files: {len(sources)}")
 
+def read_npz_header(path: str, key: str):
+    """Shape and dtype of `key` in an .npz without decompressing its data. None if absent."""
+    with zipfile.ZipFile(path) as zf:
+        name = f"{key}.npy"
+        if name not in zf.namelist():
+            return None
+        with zf.open(name) as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+    return shape, dtype
+
+def _plan_key(paths: List[str], key: str):
+    """Validate shapes from headers; return per-file row counts, total shape and output dtype."""
+    headers = [read_npz_header(p, key) for p in paths]
+    rows, ref_shape, dtypes = [], None, []
+    for p, h in zip(paths, headers):
+        if h is None or int(np.prod(h[0])) == 0:
+            rows.append(0)
+            continue
+        shape, dtype = h
+        if ref_shape is None:
+            ref_shape = shape[1:]
+        elif shape[1:] != ref_shape:
+            raise ValueError(f"Incompatible shapes for concatenation in {p}: {shape} vs reference (*,{','.join(map(str, ref_shape))})")
+        if dtype.hasobject:
+            raise ValueError(f"{p}: '{key}' is an object array; streaming mode needs numeric data")
+        rows.append(shape[0])
+        dtypes.append(dtype)
+    if ref_shape is None:
+        return rows, (0,), np.dtype(np.float64)
+    return rows, (sum(rows),) + tuple(ref_shape), np.result_type(*dtypes)
+
+def _write_member(zf: zipfile.ZipFile, name: str, arr: np.ndarray):
+    with zf.open(name, 'w', force_zip64=True) as f:
+        np.lib.format.write_array(f, arr, allow_pickle=True)
+
+def concat_files_streaming(paths: List[str], out_path: str, compress: bool = True):
+    """Concatenate recordings one input at a time straight into the output .npz.
+
+    Shapes are checked from the .npy headers first, then each array is written
+    into its zip member in row chunks, so peak memory is one input array rather
+    than every input plus a concatenated copy. Per-file row offsets are stored
+    as eeg_offsets / ppg_offsets (length len(paths) + 1).
+    """
+    for p in paths:
+        if not os.path.exists(p):
+            raise FileNotFoundError(p)
+    if not out_path.endswith('.npz'):
+        out_path += '.npz'
+    plans = {key: _plan_key(paths, key) for key in ("eeg", "ppg")}
+    metas = []
+    for p in paths:
+        with np.load(p, allow_pickle=True) as z:
+            metas.append({k: z[k] for k in z.files if k not in ("eeg", "ppg")})
+    mode = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(out_path, 'w', compression=mode, allowZip64=True) as zf:
+        for key, (rows, total_shape, dtype) in plans.items():
+            with zf.open(f"{key}.npy", 'w', force_zip64=True) as f:
+                header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                          'shape': total_shape}
+                np.lib.format.write_array_header_2_0(f, header)
+                for p, n in zip(paths, rows):
+                    if n == 0:
+                        continue
+                    with np.load(p, allow_pickle=True) as z:
+                        arr = z[key]
+                    for start in range(0, n, STREAM_CHUNK_ROWS):
+                        f.write(np.ascontiguousarray(arr[start:start + STREAM_CHUNK_ROWS], dtype=dtype).tobytes())
+                    del arr
+            _write_member(zf, f"{key}_offsets.npy", np.concatenate([[0], np.cumsum(rows)]).astype(np.int64))
+        _write_member(zf, "sources.npy", np.array([os.path.abspath(p) for p in paths], dtype=object))
+        _write_member(zf, "file_meta.npy", np.array(metas, dtype=object))
+    print(f"Saved concatenated file (streaming): {out_path}")
+    print(f"  EEG shape: {plans['eeg'][1]}")
+    print(f"  PPG shape: {plans['ppg'][1]}")
+    print(f"  Source files: {len(paths)}")
+
 def parse_args():
     p = argparse.ArgumentParser(description="Concatenate multiple .npz EEG/PPG recordings into one file.")
     p.add_argument("inputs", nargs="+", help="Input .npz files to concatenate (order preserved).")
     p.add_argument("-o", "--output", required=True, help="Output .npz filename.")
+    p.add_argument("--streaming", action="store_true",
+                   help="Copy one input at a time (peak memory ~ largest input) and store per-file offsets.")
+    p.add_argument("--no-compress", action="store_true", help="Streaming mode: store arrays uncompressed.")
     return p.parse_args()
 
 def main():
     args = parse_args()
     try:
-        concat_files(args.inputs, args.output)
+        if args.streaming:
+            concat_files_streaming(args.inputs, args.output, compress=not args.no_compress)
+        else:
+            concat_files(args.inputs, args.output)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Leave-one-session-out cross-validation.
+
+A random train_test_split over overlapping windows puts neighbours of every
+validation window into training, which inflates accuracy. Here every window
+is tagged with the recording session it came from and each fold holds out one
+whole session. Sessions come from, in order of preference:
+    * eeg_offsets + sources stored by `catter.py --streaming`
+    * `sources` stored by catter.py, with row counts read from the source files
+    * the .npz file itself (one session per file)
+
+Each session is filtered on its own (filters never run across a session
+boundary), features are extracted in a process pool, and folds are trained
+in parallel. Per-fold accuracy and wall time are printed, plus pooled
+out-of-fold metrics and, with --compare-random, the random-split score on the
+same windows.
+
+Example:
+    python crossval.py --model rf --window 8 --step 1
+"""
+import argparse
+import json
+import ntpath
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.metrics import balanced_accuracy_score, f1_score, recall_score
+from sklearn.model_selection import train_test_split
+
+from catter import read_npz_header
+from signal_processing import filter_eeg_signal, extract_band_powers
+
+
+# -----------------------
+# Sessions
+# -----------------------
+def resolve_sessions(path):
+    """List of (session_name, start_row, stop_row) covering the EEG in `path`."""
+    header = read_npz_header(path, 'eeg')
+    if header is None:
+        raise ValueError(f"{path} has no 'eeg' array")
+    n_rows = header[0][0]
+    with np.load(path, allow_pickle=True) as z:
+        sources = [str(s) for s in z['sources']] if 'sources' in z.files else None
+        offsets = z['eeg_offsets'] if 'eeg_offsets' in z.files else None
+    if sources and offsets is not None:
+        return [(ntpath.basename(s), int(a), int(b)) for s, a, b in zip(sources, offsets[:-1], offsets[1:])]
+    if sources:
+        # catter.py without --streaming keeps only the paths; recover lengths from the
+        # source files (sources may be absolute paths from another machine, so match by name)
+        here = os.path.dirname(os.path.abspath(path))
+        lengths = []
+        for s in sources:
+            local = os.path.join(here, ntpath.basename(s))
+            h = read_npz_header(local, 'eeg') if os.path.exists(local) else None
+            lengths.append(h[0][0] if h is not None else None)
+        if None not in lengths and sum(lengths) == n_rows:
+            bounds = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+            return [(ntpath.basename(s), int(a), int(b)) for s, a, b in zip(sources, bounds[:-1], bounds[1:])]
+        print(f"[WARN] {path}: source files missing or sizes do not add up, treating as one session")
+    return [(os.path.basename(path), 0, int(n_rows))]
+
+
+def _session_features(path, start, stop, window_samples, step_samples, fs):
+    with np.load(path) as z:
+        raw = z['eeg'][start:stop]
+    sig = filter_eeg_signal(raw, fs)
+    rows = []
+    for s in range(0, sig.shape[0] - window_samples + 1, step_samples):
+        segment = sig[s:s + window_samples]
+        if not np.all(np.isfinite(segment)):
+            continue
+        powers = extract_band_powers(segment, fs)
+        rows.append(np.nan_to_num(powers, nan=0.0, neginf=-12.0, posinf=12.0).flatten())
+    return np.array(rows).reshape(-1, 25)
+
+
+def build_grouped_dataset(emotions, window_dur, step_dur, fs, workers=None):
+    """X, y, groups (session index per window), labels and session names."""
+    window_samples, step_samples = int(window_dur * fs), int(step_dur * fs)
+    jobs = []
+    labels = {}
+    for emo in emotions:
+        path = f"{emo}.npz"
+        if not os.path.exists(path):
+            print(f"[WARN] Missing file: {path}, skipping.")
+            continue
+        labels[emo] = len(labels)
+        for name, start, stop in resolve_sessions(path):
+            jobs.append((emo, name, path, start, stop))
+    if not jobs:
+        raise FileNotFoundError("No valid EEG data found.")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_session_features, path, start, stop, window_samples, step_samples, fs)
+                   for _, _, path, start, stop in jobs]
+        feats = [f.result() for f in futures]
+
+    X_list, y_list, g_list, names = [], [], [], []
+    for (emo, name, _, start, stop), X in zip(jobs, feats):
+        if len(X) == 0:
+            print(f"[WARN] {emo}/{name}: shorter than one window, skipping.")
+            continue
+        g = len(names)
+        names.append(f"{emo}/{name}")
+        X_list.append(X)
+        y_list.append(np.full(len(X), labels[emo]))
+        g_list.append(np.full(len(X), g))
+        print(f"[INFO] session {g}: {names[-1]} rows {start}-{stop}, {len(X)} windows")
+    return np.vstack(X_list), np.concatenate(y_list), np.concatenate(g_list), labels, names
+
+
+# -----------------------
+# Models (run in worker processes)
+# -----------------------
+def _fit_predict_rf(X_train, y_train, X_test, n_estimators):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.utils.class_weight import compute_class_weight
+    classes = np.unique(y_train)
+    cw = compute_class_weight(class_weight='balanced', classes=classes, y=y_train)
+    rf = RandomForestClassifier(n_estimators=n_estimators, max_features='sqrt', n_jobs=1,
+                                class_weight={int(c): float(w) for c, w in zip(classes, cw)},
+                                random_state=42)
+    rf.fit(X_train, y_train)
+    return rf.predict(X_test)
+
+
+def _fit_predict_lstm(X_train, y_train, X_test, num_classes, epochs, batch_size):
+    import torch
+    import torch.nn as nn
+    from torch import optim
+    from sklearn.preprocessing import StandardScaler
+    from model import HemiAttentionLSTM
+    from train import to_model_input, train_one_epoch, predict_labels
+
+    torch.set_num_threads(1)
+    torch.manual_seed(42)
+    scaler = StandardScaler().fit(X_train)
+    Xt = torch.from_numpy(to_model_input(scaler.transform(X_train)).astype(np.float32))
+    yt = torch.from_numpy(y_train.astype(np.int64))
+    Xs = torch.from_numpy(to_model_input(scaler.transform(X_test)).astype(np.float32))
+    counts = np.bincount(y_train, minlength=num_classes)
+    weights = torch.from_numpy((1. / np.clip(counts, 1, None))[y_train])
+
+    model = HemiAttentionLSTM(input_size=5, num_classes=num_classes)
+    optimizer = optim.Adam(model.parameters(), lr=5e-4, weight_decay=1e-5)
+    criterion = nn.CrossEntropyLoss()
+
+    def batches():
+        order = torch.multinomial(weights, len(weights), replacement=True)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            yield Xt[idx], yt[idx]
+
+    # Fixed epoch budget: the held-out session must not be used for model selection
+    for _ in range(epochs):
+        train_one_epoch(model, optimizer, criterion, batches(), torch.device('cpu'))
+    preds, _ = predict_labels(model, [(Xs, torch.zeros(len(Xs), dtype=torch.int64))], torch.device('cpu'))
+    return preds.numpy()
+
+
+_FOLD_DATA = {}  # X and y in each worker process, set once by _init_fold_worker
+
+
+def _init_fold_worker(X, y):
+    """Pool initializer: the feature matrix reaches each worker once, not once per fold task."""
+    _FOLD_DATA['X'], _FOLD_DATA['y'] = X, y
+
+
+def run_fold(fold, train_idx, test_idx, model, num_classes, epochs, batch_size, n_estimators):
+    t0 = time.perf_counter()
+    X, y = _FOLD_DATA['X'], _FOLD_DATA['y']
+    X_train, y_train, X_test = X[train_idx], y[train_idx], X[test_idx]
+    if model == 'rf':
+        preds = _fit_predict_rf(X_train, y_train, X_test, n_estimators)
+    else:
+        preds = _fit_predict_lstm(X_train, y_train, X_test, num_classes, epochs, batch_size)
+    return fold, preds, time.perf_counter() - t0
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    parser = argparse.ArgumentParser(description="Leave-one-session-out cross-validation")
+    parser.add_argument('--emotions', nargs='+', default=['focused', 'unfocused'])
+    parser.add_argument('--model', choices=['rf', 'lstm'], default='rf')
+    parser.add_argument('--window', type=float, default=8.0)
+    parser.add_argument('--step', type=float, default=1.0)
+    parser.add_argument('--fs', type=int, default=256)
+    parser.add_argument('--epochs', type=int, default=30, help='LSTM epochs per fold')
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--rf-trees', type=int, default=600)
+    parser.add_argument('--workers', type=int, default=0, help='Worker processes (0 = one per core)')
+    parser.add_argument('--compare-random', action='store_true',
+                        help='Also score a random 80/20 window split for comparison')
+    parser.add_argument('--out', default=None, help='Optional JSON file for the report')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    X, y, groups, labels, names = build_grouped_dataset(args.emotions, args.window, args.step, args.fs, workers)
+    num_classes = len(labels)
+    inv_labels = {v: k for k, v in labels.items()}
+    if len(names) < 2:
+        raise SystemExit("[ERROR] Need at least two sessions for leave-one-session-out")
+
+    folds = [(g, np.flatnonzero(groups != g), np.flatnonzero(groups == g)) for g in range(len(names))]
+    t_start = time.perf_counter()
+    oof = np.empty_like(y)
+    report = {'model': args.model, 'window': args.window, 'step': args.step, 'folds': []}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_fold_worker, initargs=(X, y)) as pool:
+        futures = [pool.submit(run_fold, g, tr, te, args.model, num_classes,
+                               args.epochs, args.batch_size, args.rf_trees) for g, tr, te in folds]
+        if args.compare_random:
+            tr, te = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+            futures.append(pool.submit(run_fold, 'random', tr, te, args.model, num_classes,
+                                       args.epochs, args.batch_size, args.rf_trees))
+        for f in futures:
+            fold, preds, wall = f.result()
+            if fold == 'random':
+                acc = float((preds == y[te]).mean())
+                report['random_split'] = {'accuracy': acc, 'wall_sec': wall}
+                continue
+            test_idx = folds[fold][2]
+            oof[test_idx] = preds
+            acc = float((preds == y[test_idx]).mean())
+            report['folds'].append({'session': names[fold], 'label': inv_labels[int(y[test_idx][0])],
+                                    'n_windows': len(test_idx), 'accuracy': acc, 'wall_sec': wall})
+            print(f"[INFO] fold {fold:2d} {names[fold]:40s} n={len(test_idx):5d} acc={acc:.4f} ({wall:.1f}s)")
+    total_wall = time.perf_counter() - t_start
+
+    fold_accs = np.array([f['accuracy'] for f in report['folds']])
+    report['aggregate'] = {
+        'fold_accuracy_mean': float(fold_accs.mean()),
+        'fold_accuracy_std': float(fold_accs.std()),
+        'pooled_accuracy': float((oof == y).mean()),
+        'balanced_accuracy': float(balanced_accuracy_score(y, oof)),
+        'macro_f1': float(f1_score(y, oof, average='macro')),
+        'recall': {inv_labels[i]: float(r) for i, r in
+                   enumerate(recall_score(y, oof, average=None, labels=list(range(num_classes))))},
+        'wall_sec': total_wall,
+        'fold_wall_sec_sum': float(sum(f['wall_sec'] for f in report['folds'])),
+    }
+    agg = report['aggregate']
+    print(f"[INFO] LOSO {args.model}: fold acc {agg['fold_accuracy_mean']:.4f} ± {agg['fold_accuracy_std']:.4f}, "
+          f"pooled {agg['pooled_accuracy']:.4f}, balanced {agg['balanced_accuracy']:.4f}, "
+          f"macro F1 {agg['macro_f1']:.4f}")
+    print(f"[INFO] {len(folds)} folds in {total_wall:.1f}s wall "
+          f"({agg['fold_wall_sec_sum']:.1f}s summed over folds, {workers} workers)")
+    if 'random_split' in report:
+        print(f"[INFO] Random 80/20 window split on the same data: acc {report['random_split']['accuracy']:.4f}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Wrote report to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
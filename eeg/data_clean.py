@@ -1,11 +1,17 @@
 import argparse
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import welch, butter, lfilter, iirnotch
 from sklearn.decomposition import PCA
 from signal_processing import design_bandpass, filter_eeg_signal, extract_band_powers
+from catter import read_npz_header
+
+N_FEATURES = 25  # 5 bands x 5 channels
+WINDOWS_PER_TASK = 256
 
 def load_and_filter(emotion_list, sampling_rate):
     results = {}
@@ -46,6 +52,101 @@ def create_feature_dataset(filtered_map, window_dur, step_dur, sampling_rate):
     y_arr = np.array(y_list)
     return X_arr, y_arr, labels
 
+# -----------------------
+# Parallel pipeline
+# -----------------------
+def _filter_worker(path, sampling_rate, shm_name, shape):
+    with np.load(path) as npz:
+        raw = npz['eeg']
+    shm = shared_memory.SharedMemory(name=shm_name)  # Owned (and unlinked) by the parent
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        out[:] = filter_eeg_signal(raw, sampling_rate)
+    finally:
+        shm.close()
+
+def _window_worker(sig_name, sig_shape, x_name, x_rows, row0, starts, window_samples, sampling_rate):
+    sig_shm, x_shm = shared_memory.SharedMemory(name=sig_name), shared_memory.SharedMemory(name=x_name)
+    try:
+        sig = np.ndarray(sig_shape, dtype=np.float64, buffer=sig_shm.buf)
+        X = np.ndarray((x_rows, N_FEATURES + 1), dtype=np.float64, buffer=x_shm.buf)
+        for i, start in enumerate(starts):
+            segment = sig[start:start+window_samples]
+            row = X[row0 + i]
+            if not np.all(np.isfinite(segment)):
+                row[-1] = 0.0
+                continue
+            powers = extract_band_powers(segment, sampling_rate)
+            row[:N_FEATURES] = np.nan_to_num(powers, nan=0.0, neginf=-12.0, posinf=12.0).flatten()
+            row[-1] = 1.0
+    finally:
+        sig_shm.close()
+        x_shm.close()
+
+def build_dataset_parallel(emotion_list, window_dur, step_dur, sampling_rate, workers=None):
+    """Same X, y, labels as load_and_filter + create_feature_dataset, computed in a process pool.
+
+    Recordings are filtered in parallel into shared memory, then window
+    feature extraction is split into fixed-size tasks that write straight into
+    a shared output matrix at precomputed rows, so ordering is deterministic
+    and no large array is pickled.
+    """
+    window_samples = int(window_dur * sampling_rate)
+    step_samples = int(step_dur * sampling_rate)
+    recs = []
+    for emo in emotion_list:
+        path = f"{emo}.npz"
+        if not os.path.exists(path):
+            print(f"[WARN] Missing file: {path}, skipping.")
+            continue
+        header = read_npz_header(path, 'eeg')
+        if header is None or len(header[0]) != 2 or header[0][0] == 0:
+            print(f"[WARN] Invalid data for {emo}, skipping.")
+            continue
+        print(f"[INFO] {emo}: found {header[0]}")
+        recs.append((emo, path, tuple(header[0])))
+    if not recs:
+        raise FileNotFoundError("No valid EEG data found.")
+
+    labels = {emo: idx for idx, (emo, _, _) in enumerate(recs)}
+    starts = [list(range(0, shape[0] - window_samples + 1, step_samples)) for _, _, shape in recs]
+    row0 = np.concatenate([[0], np.cumsum([len(s) for s in starts])]).astype(int)
+    n_rows = int(row0[-1])
+
+    blocks = []
+    try:
+        sig_shms = []
+        for _, _, shape in recs:
+            sig_shms.append(shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8))
+            blocks.append(sig_shms[-1])
+        x_shm = shared_memory.SharedMemory(create=True, size=max(1, n_rows) * (N_FEATURES + 1) * 8)
+        blocks.append(x_shm)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_filter_worker, [r[1] for r in recs], [sampling_rate] * len(recs),
+                          [s.name for s in sig_shms], [r[2] for r in recs]))
+            futures = []
+            for k, (_, _, shape) in enumerate(recs):
+                for i in range(0, len(starts[k]), WINDOWS_PER_TASK):
+                    futures.append(pool.submit(_window_worker, sig_shms[k].name, shape, x_shm.name, n_rows,
+                                               int(row0[k]) + i, starts[k][i:i+WINDOWS_PER_TASK],
+                                               window_samples, sampling_rate))
+            for f in futures:
+                f.result()
+
+        X_all = np.ndarray((n_rows, N_FEATURES + 1), dtype=np.float64, buffer=x_shm.buf)
+        valid = X_all[:, -1] == 1.0
+        X_arr = X_all[valid, :N_FEATURES].copy()
+        y_arr = np.concatenate([np.full(len(s), labels[emo]) for (emo, _, _), s in zip(recs, starts)])[valid]
+        for (emo, _, _), k0, k1 in zip(recs, row0[:-1], row0[1:]):
+            print(f"[INFO] {emo}: {int(valid[k0:k1].sum())} windows, label={labels[emo]}")
+        del X_all
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return X_arr, y_arr, labels
+
 def save_outputs(X, y, labels, window_dur, step_dur, sampling_rate):
     np.save('X.npy', X)
     np.save('y.npy', y)
@@ -62,11 +163,17 @@ def main():
     parser.add_argument('--window', type=float, default=8.0, help='Window length in sec')
     parser.add_argument('--step', type=float, default=1.0, help='Step length in sec')
     parser.add_argument('--fs', type=int, default=256, help='Sampling rate')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes (1 = serial, 0 = one per core)')
     args = parser.parse_args()
     all_emotions = ['focused', 'unfocused']
     selected = [e for e in all_emotions if e not in args.skip]
-    filtered = load_and_filter(selected, args.fs)
-    X, y, label_map = create_feature_dataset(filtered, args.window, args.step, args.fs)
+    if args.workers == 1:
+        filtered = load_and_filter(selected, args.fs)
+        X, y, label_map = create_feature_dataset(filtered, args.window, args.step, args.fs)
+    else:
+        X, y, label_map = build_dataset_parallel(selected, args.window, args.step, args.fs,
+                                                 workers=args.workers or os.cpu_count())
     print(f"[INFO] Dataset shapes: X={X.shape}, y={y.shape}, labels={label_map}")
     save_outputs(X, y, label_map, args.window, args.step, args.fs)
     pca = PCA(n_components=2)
@@ -7,6 +7,7 @@ import time
 import numpy as np
 from muselsl import stream as muse_stream, list_muses
 from pylsl import StreamInlet, resolve_byprop
+from session_store import SessionStore
 
 DEFAULT_DURATION = 600
 PPG_MAX_SAMPLES = 64
@@ -50,6 +51,10 @@ def parse_arguments():
         "--output", "-o", type=str,
         help="Output filename (default: <emotion>.npz)."
     )
+    parser.add_argument(
+        "--store", type=str, default=None,
+        help="Also add the recording to this session store directory."
+    )
     return parser.parse_args()
 
 def get_muse_address():
@@ -105,17 +110,23 @@ def save_data(filename, eeg_data, ppg_data):
     print(f"  EEG shape: {eeg_data.shape}")
     print(f"  PPG shape: {ppg_data.shape}")
 
-def record(duration, emotion_label, output_file=None):
+def record(duration, emotion_label, output_file=None, store_root=None):
     output_file = output_file or f"{emotion_label}.npz"
     # ensure EEG stream is available before opening inlets
     stream_thread = ensure_stream()
     eeg_inlet, ppg_inlet = open_inlets()
     eeg_data, ppg_data = collect_data(eeg_inlet, ppg_inlet, duration)
     save_data(output_file, eeg_data, ppg_data)
+    if store_root and eeg_data.size:
+        sid = SessionStore(store_root).add(
+            eeg_data, emotion_label, ppg=ppg_data if ppg_data.size else None,
+            fs=int(eeg_inlet.info().nominal_srate()), ppg_fs=int(ppg_inlet.info().nominal_srate()),
+            source=output_file)
+        print(f"Added session {sid} to store {store_root}")
 
 def main():
     args = parse_arguments()
-    record(duration=args.duration, emotion_label=args.emotion, output_file=args.output)
+    record(duration=args.duration, emotion_label=args.emotion, output_file=args.output, store_root=args.store)
 
 
 if __name__ == "__main__":
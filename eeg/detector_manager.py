@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Mood detection for many headsets in one process.
+
+DetectorManager discovers EEG LSL streams, keyed by source_id, and gives each
+one its own collector thread and ring buffer. One scoring thread wakes every
+hop, stacks the latest window of every ready device, and scores them all with
+a single EEGMoodDetector.infer_batch call per sampling rate, so the model and
+feature cost per hop grows with one batched call rather than one call per
+device. Devices that send nothing for evict_sec are dropped (and picked up
+again by discovery if they come back).
+
+Run directly to benchmark batched scoring against one call per device:
+    python detector_manager.py --devices 1 8 32 128
+"""
+import argparse
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from pylsl import StreamInlet, resolve_byprop
+
+from inference import EEGMoodDetector
+
+
+def stream_key(info):
+    """Stable id for an LSL stream: its source_id, or name@hostname when the source sets none."""
+    return info.source_id() or f"{info.name()}@{info.hostname()}"
+
+
+class DeviceCollector:
+    """Inlet, ring buffer and collector thread for one headset."""
+
+    def __init__(self, device_id, inlet, window_sec):
+        self.device_id = device_id
+        self.inlet = inlet
+        info = inlet.info()
+        self.name = info.name()
+        self.fs = int(info.nominal_srate()) or 256
+        self.win_samps = int(window_sec * self.fs)
+        self.buf = deque(maxlen=self.win_samps)
+        self.samples = 0
+        self.opened_at = time.time()
+        self.last_data = None
+        self.error = None
+        self.latest = None  # {'ts', 'label', 'probs'}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join(timeout=2)
+
+    def _loop(self):
+        try:
+            while not self._stop_event.is_set():
+                chunk, _ = self.inlet.pull_chunk(timeout=1.0, max_samples=256)
+                if not chunk:
+                    continue
+                block = np.asarray(chunk, dtype=np.float32)[:, :5]
+                with self._lock:
+                    self.buf.extend(block)
+                    self.samples += len(block)
+                    self.last_data = time.time()
+        except Exception as e:
+            self.error = str(e)
+            print(f"EEG[{self.device_id}]: Collector error: {e}")
+
+    def set_window(self, window_sec):
+        with self._lock:
+            self.win_samps = int(window_sec * self.fs)
+            self.buf = deque(self.buf, maxlen=self.win_samps)
+
+    def window(self):
+        """Copy of the latest full window, or None while the buffer is filling."""
+        with self._lock:
+            if len(self.buf) < self.win_samps:
+                return None
+            return np.asarray(self.buf)
+
+    def status(self, stale_sec):
+        if self.error:
+            return 'error'
+        if self.last_data is None or len(self.buf) < self.win_samps:
+            return 'filling'
+        return 'stale' if time.time() - self.last_data > stale_sec else 'live'
+
+    def info(self, stale_sec=3.0):
+        return {'device_id': self.device_id, 'name': self.name, 'fs': self.fs,
+                'status': self.status(stale_sec), 'samples': self.samples,
+                'last_data': self.last_data, 'latest': self.latest}
+
+
+class DetectorManager:
+    """Tracks every EEG stream on the network and scores them together each hop."""
+
+    def __init__(self, window_sec=6.0, hop_sec=1.0, model_path='best_eeg_model.pth',
+                 scaler_path='scaler.joblib', quantize=False, discover_every=10.0, stale_sec=3.0, evict_sec=30.0):
+        self.window_sec = float(window_sec)
+        self.hop_sec = float(hop_sec)
+        self.discover_every = float(discover_every)
+        self.stale_sec = float(stale_sec)
+        self.evict_sec = float(evict_sec)
+        # One shared model/scaler; the detector itself never opens a stream
+        self.scorer = EEGMoodDetector(window_sec=window_sec, model_path=model_path,
+                                      scaler_path=scaler_path, quantize=quantize, connect=False)
+        self.devices = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.stats = {'hops': 0, 'windows_scored': 0, 'last_batch': 0, 'last_batch_ms': 0.0, 'evicted': 0}
+
+    # ---------- Discovery ----------
+    def discover(self, timeout=2.0):
+        """Open inlets for EEG streams not tracked yet. Returns the new device ids."""
+        added = []
+        for info in resolve_byprop('type', 'EEG', timeout=timeout):
+            key = stream_key(info)
+            with self._lock:
+                if key in self.devices:
+                    continue
+            self.add_inlet(StreamInlet(info, max_chunklen=256), key)
+            added.append(key)
+        return added
+
+    def add_inlet(self, inlet, device_id=None):
+        """Track an already-open inlet (LSL or synthetic.SyntheticInlet). Returns its device id."""
+        key = device_id or stream_key(inlet.info())
+        collector = DeviceCollector(key, inlet, self.window_sec)
+        with self._lock:
+            if key in self.devices:
+                return key
+            self.devices[key] = collector
+        collector.start()
+        print(f"EEG: Tracking device {key} ({collector.name}, fs={collector.fs}Hz)")
+        return key
+
+    def evict_stale(self):
+        """Stop and forget devices with no data (or a dead collector) for evict_sec. Returns their ids."""
+        now = time.time()
+        with self._lock:
+            gone = [c for c in self.devices.values()
+                    if c.error or now - (c.last_data or c.opened_at) > self.evict_sec]
+            for c in gone:
+                del self.devices[c.device_id]
+        for c in gone:
+            c.stop()
+            print(f"EEG: Dropped device {c.device_id} ({c.error or 'no data'})")
+        self.stats['evicted'] += len(gone)
+        return [c.device_id for c in gone]
+
+    def _discover_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.evict_stale()
+                self.discover()
+            except Exception as e:
+                print(f"EEG: Discovery error: {e}")
+            self._stop_event.wait(self.discover_every)
+
+    def reload(self, **kwargs):
+        """scorer.reload(**kwargs), then resize every device buffer if the window length changed."""
+        status = self.scorer.reload(**kwargs)
+        if status['state'] == 'ok' and self.scorer.window_sec != self.window_sec:
+            self.window_sec = self.scorer.window_sec
+            with self._lock:
+                collectors = list(self.devices.values())
+            for c in collectors:
+                c.set_window(self.window_sec)
+        return status
+
+    # ---------- Scoring ----------
+    def add_listener(self, callback):
+        """Register callback(device_id, label, probs) called from the scoring thread."""
+        self._listeners.append(callback)
+
+    def score_once(self):
+        """Score the latest window of every ready device in one batched call per (fs, window length)."""
+        with self._lock:
+            collectors = list(self.devices.values())
+        groups = {}
+        for c in collectors:
+            if c.status(self.stale_sec) != 'live':  # Do not re-score a frozen window
+                continue
+            win = c.window()
+            if win is not None:
+                groups.setdefault((c.fs, win.shape[0]), []).append((c, win))
+        t0 = time.perf_counter()
+        n = 0
+        for (fs, _), members in groups.items():
+            results = self.scorer.infer_batch(np.stack([win for _, win in members]), fs=fs)
+            ts = time.time()
+            for (c, _), (label, probs) in zip(members, results):
+                c.latest = {'ts': ts, 'label': label, 'probs': probs}
+                for callback in self._listeners:
+                    try:
+                        callback(c.device_id, label, probs)
+                    except Exception as e:
+                        print(f"EEG: Listener error: {e}")
+            n += len(members)
+        self.stats['hops'] += 1
+        self.stats['windows_scored'] += n
+        self.stats['last_batch'] = n
+        self.stats['last_batch_ms'] = (time.perf_counter() - t0) * 1e3
+        return n
+
+    def _score_loop(self):
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.score_once()
+            except Exception as e:
+                print(f"EEG: Scoring error: {e}")
+            next_tick += self.hop_sec
+            self._stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+    # ---------- Lifecycle / queries ----------
+    def start(self):
+        if self._threads:
+            return
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self._discover_loop, daemon=True),
+                         threading.Thread(target=self._score_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+        with self._lock:
+            collectors = list(self.devices.values())
+        for c in collectors:
+            c.stop()
+
+    def device(self, device_id):
+        with self._lock:
+            return self.devices.get(device_id)
+
+    def list_devices(self):
+        with self._lock:
+            collectors = list(self.devices.values())
+        return [c.info(self.stale_sec) for c in collectors]
+
+
+# -----------------------
+# Benchmark
+# -----------------------
+def benchmark(device_counts, window_sec, fs, repeats):
+    scorer = EEGMoodDetector(window_sec=window_sec, connect=False)
+    if scorer.model is None:
+        raise SystemExit("[ERROR] No model loaded; run from a directory with best_eeg_model.pth")
+    rng = np.random.default_rng(0)
+    win = int(window_sec * fs)
+    print(f"{'devices':>8s} {'per-device calls':>18s} {'one batched call':>18s} {'speedup':>8s} {'max devices @1Hz':>17s}")
+    for n in device_counts:
+        windows = rng.normal(scale=20.0, size=(n, win, 5))
+        scorer.infer_batch(windows)  # Warm-up
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            for w in windows:
+                scorer.infer_batch(w[None])
+        loop = (time.perf_counter() - t0) / repeats
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            scorer.infer_batch(windows)
+        batched = (time.perf_counter() - t0) / repeats
+        print(f"{n:8d} {loop * 1e3:15.1f} ms {batched * 1e3:15.1f} ms {loop / batched:7.1f}x "
+              f"{int(n / batched):17d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-device batched scoring")
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--window', type=float, default=6.0)
+    parser.add_argument('--fs', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.devices, args.window, args.fs, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
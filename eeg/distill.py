@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Distil HemiAttentionLSTM into a small MLP (or logistic head) on the same
+25 band-power features.
+
+The student is trained on the teacher's temperature-softened probabilities
+(plus a small hard-label term) over the training split train.py uses, then
+checked on the validation split for agreement with the teacher, accuracy and
+single-window latency. The artifact loads through model_runtime.load_model,
+so the detector serves it with EEGMoodDetector(model_path='student_model.pth')
+or EEG_MODEL=student_model.pth for backend.py.
+
+    python distill.py --hidden 32 --out student_model.pth
+    python distill.py --hidden --out student_logreg.pth   # logistic head
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from joblib import load
+from sklearn.model_selection import train_test_split
+
+from feature_io import load_features, transform_chunked
+from model import StudentMLP
+from model_runtime import load_model, save_student
+from train import to_model_input
+
+
+def teacher_logits(teacher, X, batch_size=512):
+    with torch.no_grad():
+        return torch.cat([teacher(X[i:i + batch_size]) for i in range(0, len(X), batch_size)])
+
+
+def distill(student, X_train, t_logits, y_train, epochs, batch_size, lr, temperature, alpha):
+    """KD loss: alpha * T^2 * KL(student_T || teacher_T) + (1 - alpha) * CE(student, y)."""
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr, weight_decay=1e-5)
+    soft = F.softmax(t_logits / temperature, dim=1)
+    for _ in range(epochs):
+        student.train()
+        order = torch.randperm(len(X_train))
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            logits = student(X_train[idx])
+            kd = F.kl_div(F.log_softmax(logits / temperature, dim=1), soft[idx], reduction='batchmean')
+            loss = alpha * temperature ** 2 * kd + (1 - alpha) * F.cross_entropy(logits, y_train[idx])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    return student.eval()
+
+
+def single_row_ms(model, x, repeats=1000):
+    with torch.no_grad():
+        for _ in range(20):
+            model(x)
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil HemiAttentionLSTM into a compact student")
+    parser.add_argument('--teacher', default='best_eeg_model.pth')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--x', default='X.npy')
+    parser.add_argument('--y', default='y.npy')
+    parser.add_argument('--out', default='student_model.pth')
+    parser.add_argument('--hidden', type=int, nargs='*', default=[32],
+                        help='Hidden layer widths; pass no values for a logistic head')
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--alpha', type=float, default=0.8, help='Weight of the soft-target loss')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--lr', type=float, default=3e-3)
+    args = parser.parse_args()
+
+    torch.manual_seed(42)
+    torch.set_num_threads(1)  # Latency figures below are per core
+    try:
+        with open('label_map.json', 'r') as f:
+            label_map = {int(k): v for k, v in json.load(f).items()}
+    except Exception:
+        label_map = {0: 'focused', 1: 'unfocused'}
+    num_classes = len(label_map)
+
+    teacher, _ = load_model(args.teacher, num_classes, device=torch.device('cpu'))
+    scaler = load(args.scaler)
+    X, y = load_features(args.x, args.y, mmap=True)
+    train_idx, val_idx = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+
+    def inputs(idx):
+        return torch.from_numpy(to_model_input(transform_chunked(X, idx, scaler)))
+    X_train, X_val = inputs(train_idx), inputs(val_idx)
+    y_train, y_val = torch.from_numpy(y[train_idx].astype(np.int64)), y[val_idx]
+
+    t0 = time.perf_counter()
+    student = StudentMLP(hidden=tuple(args.hidden), num_classes=num_classes)
+    distill(student, X_train, teacher_logits(teacher, X_train), y_train,
+            args.epochs, args.batch_size, args.lr, args.temperature, args.alpha)
+    print(f"[INFO] Distilled student {args.hidden or 'logistic'} in {time.perf_counter() - t0:.1f}s")
+    save_student(student, args.out, num_classes, args.hidden, teacher=os.path.basename(args.teacher))
+
+    with torch.no_grad():
+        pred_t = teacher_logits(teacher, X_val).argmax(1).numpy()
+        pred_s = student(X_val).argmax(1).numpy()
+    x1 = X_val[:1]
+    ms_t, ms_s = single_row_ms(teacher, x1, repeats=200), single_row_ms(student, x1)
+    n_params = sum(p.numel() for p in student.parameters())
+    print(f"[INFO] Validation windows: {len(y_val)}")
+    print(f"[INFO] Accuracy  teacher: {(pred_t == y_val).mean():.4f}  student: {(pred_s == y_val).mean():.4f}")
+    print(f"[INFO] Agreement with teacher: {(pred_t == pred_s).mean():.4f}")
+    print(f"[INFO] Model latency (batch 1, 1 thread)  teacher: {ms_t:.3f} ms  student: {ms_s:.4f} ms "
+          f"({ms_t / ms_s:.0f}x)")
+    print(f"[INFO] Student: {n_params} parameters, artifact {os.path.getsize(args.out) / 1024:.1f} KB "
+          f"(teacher {os.path.getsize(args.teacher) / 1024:.0f} KB) -> {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,8 @@ class EEGWebSocketServer:
         self.detector = None
         self.ppg_inlet = None
         self.clients = set()
+        self.mock_eeg = None
+        self.mock_ppg = None
         
     async def initialize_eeg(self):
         """Initialize EEG detector and PPG inlet"""
@@ -116,24 +118,24 @@ class EEGWebSocketServer:
     
     def generate_mock_data(self):
         """Generate realistic mock EEG data when no device is connected"""
-        import random
-        
-        # Simulate focus state changes
+        from synthetic import SyntheticEEG, SyntheticPPG
+
+        # Synthetic headset alternating focused/unfocused every 30 s, advanced by wall clock
         current_time = time.time()
-        focus_cycle = (current_time % 60) / 60  # 1-minute cycle
-        is_focused = focus_cycle < 0.7  # 70% focused, 30% unfocused
-        
-        # Add some randomness
-        if random.random() < 0.1:  # 10% chance to flip
-            is_focused = not is_focused
-        
-        # Generate realistic EEG data (5 channels)
-        eeg_sample = [
-            random.uniform(-0.1, 0.1) for _ in range(5)
-        ]
-        
-        # Generate heart rate (60-80 BPM)
-        hr = random.uniform(60, 80)
+        if self.mock_eeg is None:
+            self.mock_eeg = SyntheticEEG(regime_sec=30.0)
+            self.mock_ppg = SyntheticPPG(eeg=self.mock_eeg)
+            self.mock_t0 = current_time
+        due = int((current_time - self.mock_t0) * self.mock_eeg.fs) - self.mock_eeg.n
+        eeg = self.mock_eeg.generate(max(1, min(due, self.mock_eeg.fs * 10)))
+        self.mock_ppg.generate(max(1, len(eeg) * self.mock_ppg.fs // self.mock_eeg.fs))
+        is_focused = self.mock_eeg.current_regime == 'focused'
+
+        # Latest generated EEG sample (5 channels, uV)
+        eeg_sample = eeg[-1].tolist()
+
+        # Heart rate follows the regime (~72 BPM focused, ~64 unfocused)
+        hr = self.mock_ppg.current_hr
         
         return {
             "timestamp": int(current_time * 1000),
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Export the trained model with a dynamic batch dimension and benchmark it
+against eager PyTorch.
+
+    python export_model.py --model best_eeg_model.pth              # TorchScript
+    python export_model.py --model best_eeg_model.pth --onnx       # + ONNX (needs onnx, onnxruntime)
+
+TorchScript output is scripted and frozen; ONNX output runs on onnxruntime's
+CPU provider. Both load through model_runtime.load_model, so the detector
+serves them via model_path / EEG_MODEL, and EEGMoodDetector.infer_batch
+scores many windows in one call with any of them.
+"""
+import argparse
+import importlib.util
+import json
+import time
+
+import numpy as np
+import torch
+
+from model_runtime import load_model
+
+
+def export_torchscript(model, path):
+    scripted = torch.jit.freeze(torch.jit.script(model.eval()))
+    scripted.save(path)
+    return path
+
+
+def export_onnx(model, path, opset=17):
+    example = torch.randn(2, 5, 5)
+    torch.onnx.export(model.eval(), (example,), path, input_names=['x'], output_names=['logits'],
+                      dynamic_axes={'x': {0: 'batch'}, 'logits': {0: 'batch'}}, opset_version=opset,
+                      dynamo=False)
+    return path
+
+
+def latency_ms(model, batch, repeats):
+    x = torch.randn(batch, 5, 5)
+    with torch.no_grad():
+        for _ in range(5):
+            model(x)
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TorchScript / ONNX export with dynamic batch size")
+    parser.add_argument('--model', default='best_eeg_model.pth')
+    parser.add_argument('--out', default='best_eeg_model.ts.pt', help='TorchScript output path')
+    parser.add_argument('--onnx', nargs='?', const='best_eeg_model.onnx', default=None,
+                        help='Also export ONNX (optional path, default best_eeg_model.onnx)')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 16, 256])
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    try:
+        with open('label_map.json', 'r') as f:
+            num_classes = len(json.load(f))
+    except Exception:
+        num_classes = 2
+
+    eager, _ = load_model(args.model, num_classes, device=torch.device('cpu'))
+    variants = {'eager': eager}
+    export_torchscript(eager, args.out)
+    variants['torchscript'] = load_model(args.out, num_classes, device=torch.device('cpu'))[0]
+    print(f"[INFO] TorchScript model saved to {args.out}")
+    if args.onnx:
+        missing = [m for m in ('onnx', 'onnxruntime') if importlib.util.find_spec(m) is None]
+        if missing:
+            print(f"[WARN] ONNX export skipped, install {' and '.join(missing)} to enable it.")
+        else:
+            export_onnx(eager, args.onnx)
+            variants['onnx'] = load_model(args.onnx, num_classes)[0]
+            print(f"[INFO] ONNX model saved to {args.onnx}")
+
+    # Exported graphs must match eager on a batch size they were not traced with
+    x = torch.randn(37, 5, 5)
+    with torch.no_grad():
+        ref = eager(x)
+        for name, model in variants.items():
+            if name != 'eager':
+                print(f"[INFO] {name}: max |logit diff| vs eager at batch 37 = {(model(x) - ref).abs().max().item():.2e}")
+
+    print(f"[INFO] Latency per call, ms (median, {args.threads} thread(s)); per-window cost in brackets")
+    print("  batch " + "".join(f"{name:>24s}" for name in variants))
+    for batch in args.batches:
+        repeats = max(20, 2000 // batch)
+        row = []
+        for model in variants.values():
+            ms = latency_ms(model, batch, repeats)
+            row.append(f"{ms:10.3f} [{ms / batch * 1e3:8.1f} us]")
+        print(f"  {batch:5d} " + "".join(f"{cell:>24s}" for cell in row))
+
+
+if __name__ == '__main__':
+    main()
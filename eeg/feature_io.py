@@ -0,0 +1,80 @@
+"""
+Out-of-core access to feature matrices (X.npy / y.npy).
+
+X is opened memory-mapped and only ever touched in row chunks: cleaning
+(nan_to_num), scaler fitting (StandardScaler.partial_fit) and batch
+construction all work on slices, so peak memory is set by the chunk and
+batch sizes rather than by the size of X.
+"""
+import sys
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+CHUNK_ROWS = 1 << 16
+
+
+def load_features(x_path='X.npy', y_path='y.npy', mmap=True):
+    """X memory-mapped read-only (or fully loaded), y loaded (it is small)."""
+    X = np.load(x_path, mmap_mode='r' if mmap else None)
+    y = np.load(y_path)
+    if X.shape[0] != y.shape[0]:
+        raise ValueError(f"X has {X.shape[0]} rows but y has {y.shape[0]}")
+    return X, y
+
+
+def clean(block):
+    return np.nan_to_num(block, nan=0.0, neginf=-12.0, posinf=12.0)
+
+
+def _rows(X, idx):
+    """Rows of X at `idx`, reading in sorted order for memmap locality."""
+    order = np.argsort(idx, kind='stable')
+    out = np.empty((len(idx),) + X.shape[1:], dtype=X.dtype)
+    out[order] = X[idx[order]]
+    return out
+
+
+def fit_scaler_chunked(X, indices=None, chunk_rows=CHUNK_ROWS):
+    """StandardScaler fitted with partial_fit over row chunks of X (optionally only `indices`)."""
+    scaler = StandardScaler()
+    n = X.shape[0] if indices is None else len(indices)
+    sorted_idx = None if indices is None else np.sort(indices)
+    for start in range(0, n, chunk_rows):
+        if sorted_idx is None:
+            block = X[start:start + chunk_rows]
+        else:
+            block = X[sorted_idx[start:start + chunk_rows]]
+        scaler.partial_fit(clean(np.asarray(block, dtype=np.float64)))
+    return scaler
+
+
+def transform_chunked(X, indices, scaler=None, dtype=np.float32, chunk_rows=CHUNK_ROWS):
+    """Cleaned (and scaled) copy of X[indices] as `dtype`, built chunk by chunk."""
+    out = np.empty((len(indices), X.shape[1]), dtype=dtype)
+    for start in range(0, len(indices), chunk_rows):
+        block = clean(np.asarray(_rows(X, indices[start:start + chunk_rows]), dtype=np.float64))
+        if scaler is not None:
+            block = scaler.transform(block)
+        out[start:start + chunk_rows] = block
+    return out
+
+
+def iter_batches(X, y, indices, batch_size, scaler=None, dtype=np.float32):
+    """Yield (xb, yb) numpy batches for `indices` in the given order, cleaned and scaled."""
+    for start in range(0, len(indices), batch_size):
+        idx = indices[start:start + batch_size]
+        xb = clean(np.asarray(_rows(X, idx), dtype=np.float64))
+        if scaler is not None:
+            xb = scaler.transform(xb)
+        yield xb.astype(dtype, copy=False), y[idx]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Golden-output fixtures for the signal, model and alarm paths.
+
+`record` runs the current implementations on the committed recordings and
+X.npy / y.npy and stores the outputs under golden/. `check` recomputes them
+and compares each against the fixtures with the tolerances in TOLERANCES.
+It exits non-zero on any mismatch, so performance work can prove it changes
+nothing. Fixtures:
+
+  filtered          filter_eeg_signal on the first 30 s of each recording
+                    (also checked: StreamingEEGFilter in 12-sample chunks)
+  window_bands      detector path: each raw 6 s window filtered, then Welch band powers
+                    (also checked: the batched filter + extract_band_powers_batch path)
+  hop_bands         offline path: whole recording filtered once, then windowed
+                    (also checked: batch_score.hop_band_powers)
+  scaled            scaler.joblib applied to X.npy
+  alarm             alarm_on / EMA per step for every alarm class, replayed at 1 Hz on
+                    a fake clock from a label sequence built from y.npy
+  probs             model softmax on scaled X.npy and detector probabilities on the
+                    recording windows; recorded only when the model file exists
+
+Check an alternative implementation without editing the tree by naming it:
+    python golden.py record
+    python golden.py check
+    python golden.py check --impl filter=fastdsp:filter_eeg band_powers=fastdsp:band_powers
+    python golden.py check --quantize --prob-atol 0.1 --min-agreement 0.99
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from joblib import load
+
+from signal_processing import StreamingEEGFilter, filter_eeg_signal, extract_band_powers, extract_band_powers_batch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # alarm.py lives in the repo root
+import alarm  # noqa: E402
+
+RECORDINGS = ('focusedmain.npz', 'unfocusedmain.npz')
+FS = 256
+WINDOW_SEC, STEP_SEC = 6.0, 1.0
+FILTER_SEC = 30.0
+ALARM_CLASSES = ('SlidingWindowAlarm', 'DebouncedAlarm', 'EMAAlarm', 'SmartAlarm')
+
+# (atol, rtol) per fixture; values are uV, log10 power, standardized features, probabilities
+TOLERANCES = {
+    'filtered': (1e-8, 1e-9),
+    'window_bands': (1e-9, 1e-9),
+    'hop_bands': (1e-9, 1e-9),
+    'scaled': (1e-10, 1e-10),
+    'alarm_ema': (1e-12, 0.0),
+    'probs': (1e-5, 0.0),
+}
+
+
+# -----------------------
+# Inputs
+# -----------------------
+def sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_recordings():
+    out = {}
+    for path in RECORDINGS:
+        with np.load(path) as z:
+            out[os.path.splitext(path)[0]] = np.asarray(z['eeg'][:, :5], dtype=np.float64)
+    return out
+
+
+def raw_windows(eeg):
+    win, step = int(WINDOW_SEC * FS), int(STEP_SEC * FS)
+    return np.lib.stride_tricks.sliding_window_view(eeg, win, axis=0)[::step].transpose(0, 2, 1)
+
+
+def alarm_states(y_path='y.npy', seed=0):
+    """0/1 distraction sequence: the y.npy session order plus alternating random runs, with 15% flips."""
+    rng = np.random.default_rng(seed)
+    y = np.load(y_path).astype(np.int64)
+    runs, state = [], 0
+    while sum(len(r) for r in runs) < 1500:
+        runs.append(np.full(int(rng.integers(5, 120)), state))
+        state ^= 1
+    seq = np.concatenate([y, np.concatenate(runs)])
+    return seq ^ (rng.random(len(seq)) < 0.15).astype(np.int64)
+
+
+def replay_alarm(cls, states, step_sec=1.0):
+    """alarm_on per update (and EMA where the class has one) with time advancing step_sec per update."""
+    clock = SimpleNamespace(now=1_000_000.0)
+    fake_time = SimpleNamespace(time=lambda: clock.now)
+    real_time, alarm.time = alarm.time, fake_time
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            a = cls(alarm.AlarmConfig())
+            on, ema = np.zeros(len(states), dtype=np.int8), np.full(len(states), np.nan)
+            for i, s in enumerate(states):
+                clock.now += step_sec
+                on[i] = a.update(int(s))
+                ema[i] = getattr(a, 'ema_score', np.nan)
+    finally:
+        alarm.time = real_time
+    return on, ema
+
+
+# -----------------------
+# Computations (reference = the functions in this tree unless overridden)
+# -----------------------
+def compute_filtered(recs, impl):
+    n = int(FILTER_SEC * FS)
+    return {name: impl['filter'](eeg[:n], FS) for name, eeg in recs.items()}
+
+
+def compute_window_bands(recs, impl):
+    out = {}
+    for name, eeg in recs.items():
+        out[name] = np.stack([impl['band_powers'](impl['filter'](w, FS), FS) for w in raw_windows(eeg)])
+    return out
+
+
+def compute_hop_bands(recs, impl):
+    out = {}
+    for name, eeg in recs.items():
+        sig = impl['filter'](eeg, FS)
+        out[name] = np.stack([impl['band_powers'](w, FS) for w in raw_windows(sig)])
+    return out
+
+
+def compute_alarm(states, impl):
+    out = {}
+    for cls_name in ALARM_CLASSES:
+        on, ema = replay_alarm(impl[cls_name], states)
+        out[f"{cls_name}_on"] = on
+        out[f"{cls_name}_ema"] = ema
+    return out
+
+
+def compute_probs(model_path, scaled, recs, quantize=False):
+    import torch
+    import torch.nn.functional as F
+    from model_runtime import load_model
+    from train import to_model_input
+    from inference import EEGMoodDetector
+    with open('label_map.json', 'r') as f:
+        n_classes = len(json.load(f))
+    torch.set_num_threads(1)
+    model, _ = load_model(model_path, n_classes, device=torch.device('cpu'), quantize=quantize)
+    with torch.no_grad():
+        x = torch.from_numpy(to_model_input(scaled).astype(np.float32))
+        out = {'X': F.softmax(model(x), dim=1).numpy()}
+    detector = EEGMoodDetector(model_path=model_path, quantize=quantize, connect=False, gate=False)
+    for name, eeg in recs.items():
+        out[name] = detector._predict_probs(np.ascontiguousarray(raw_windows(eeg)), detector.bundle)
+    return out
+
+
+# -----------------------
+# Record / check
+# -----------------------
+def record(args):
+    os.makedirs(args.dir, exist_ok=True)
+    ref = default_impl()
+    recs = load_recordings()
+    states = alarm_states(args.y)
+    t0 = time.perf_counter()
+    fixtures = {
+        'filtered': compute_filtered(recs, ref),
+        'window_bands': compute_window_bands(recs, ref),
+        'hop_bands': compute_hop_bands(recs, ref),
+        'scaled': {'X': load(args.scaler).transform(np.load(args.x))},
+        'alarm': {'states': states, **compute_alarm(states, ref)},
+    }
+    inputs = {p: sha256(p) for p in (*RECORDINGS, args.x, args.y, args.scaler)}
+    if os.path.exists(args.model):
+        fixtures['probs'] = compute_probs(args.model, fixtures['scaled']['X'], recs)
+        inputs[args.model] = sha256(args.model)
+    else:
+        print(f"[WARN] {args.model} not found; probability fixtures not recorded")
+    for name, arrays in fixtures.items():
+        np.savez_compressed(os.path.join(args.dir, f"{name}.npz"), **arrays)
+    manifest = {'inputs': inputs, 'fs': FS, 'window_sec': WINDOW_SEC, 'step_sec': STEP_SEC,
+                'filter_sec': FILTER_SEC, 'numpy': np.__version__,
+                'scipy': importlib.import_module('scipy').__version__,
+                'fixtures': {n: {k: list(v.shape) for k, v in a.items()} for n, a in fixtures.items()}}
+    with open(os.path.join(args.dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[INFO] Recorded {', '.join(fixtures)} to {args.dir}/ in {time.perf_counter() - t0:.1f}s")
+
+
+def default_impl():
+    impl = {'filter': filter_eeg_signal, 'band_powers': extract_band_powers}
+    impl.update({name: getattr(alarm, name) for name in ALARM_CLASSES})
+    return impl
+
+
+def resolve_impl(overrides):
+    """name=module:attr overrides on top of the tree's own implementations."""
+    impl = default_impl()
+    for item in overrides or []:
+        name, _, target = item.partition('=')
+        module, _, attr = target.partition(':')
+        if name not in impl or not attr:
+            raise SystemExit(f"[ERROR] Bad --impl '{item}'; names: {', '.join(impl)}; value module:attr")
+        impl[name] = getattr(importlib.import_module(module), attr)
+    return impl
+
+
+class Report:
+    def __init__(self):
+        self.rows = []
+
+    def close(self, fixture, variant, got, want, atol, rtol):
+        got, want = np.asarray(got), np.asarray(want)
+        if got.shape != want.shape:
+            self.rows.append((fixture, variant, f"shape {got.shape} != {want.shape}", False))
+            return
+        ok = np.allclose(got, want, atol=atol, rtol=rtol, equal_nan=True)
+        err = float(np.nanmax(np.abs(got - want))) if got.size else 0.0
+        self.rows.append((fixture, variant, f"max |diff| {err:.2e} (atol {atol:g}, rtol {rtol:g})", ok))
+
+    def exact(self, fixture, variant, got, want):
+        got, want = np.asarray(got), np.asarray(want)
+        mismatches = int((got != want).sum()) if got.shape == want.shape else -1
+        first = int(np.flatnonzero(got != want)[0]) if mismatches > 0 else None
+        detail = "identical" if mismatches == 0 else (f"{mismatches} mismatches, first at step {first}"
+                                                      if mismatches > 0 else f"shape {got.shape} != {want.shape}")
+        self.rows.append((fixture, variant, detail, mismatches == 0))
+
+    def agreement(self, fixture, variant, got, want, minimum):
+        rate = float((np.argmax(got, axis=1) == np.argmax(want, axis=1)).mean())
+        self.rows.append((fixture, variant, f"label agreement {rate:.4f} (min {minimum:g})", rate >= minimum))
+
+    def print(self):
+        for fixture, variant, detail, ok in self.rows:
+            print(f"{'PASS' if ok else 'FAIL'}  {fixture:13s} {variant:40s} {detail}")
+        failed = sum(not ok for *_, ok in self.rows)
+        print(f"[INFO] {len(self.rows) - failed}/{len(self.rows)} checks passed")
+        return failed
+
+
+def check(args):
+    from batch_score import hop_band_powers
+    with open(os.path.join(args.dir, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    for path, digest in manifest['inputs'].items():
+        if os.path.exists(path) and path != args.model and sha256(path) != digest:
+            print(f"[WARN] {path} changed since the fixtures were recorded; re-record if that was intended")
+
+    impl = resolve_impl(args.impl)
+    recs = load_recordings()
+    golden = {}
+    for name in ('filtered', 'window_bands', 'hop_bands', 'scaled', 'alarm', 'probs'):
+        path = os.path.join(args.dir, f"{name}.npz")
+        if os.path.exists(path):
+            with np.load(path) as z:
+                golden[name] = {k: z[k] for k in z.files}
+    report = Report()
+
+    # Filtering: whole-signal and chunked streaming
+    atol, rtol = TOLERANCES['filtered']
+    for name, got in compute_filtered(recs, impl).items():
+        report.close('filtered', f"{name} filter", got, golden['filtered'][name], atol, rtol)
+    n = int(FILTER_SEC * FS)
+    for name, eeg in recs.items():
+        f = StreamingEEGFilter(FS, eeg.shape[1])
+        got = np.concatenate([f.process(eeg[i:i + 12]) for i in range(0, n, 12)])
+        report.close('filtered', f"{name} StreamingEEGFilter", got, golden['filtered'][name], atol, rtol)
+
+    # Band powers: detector path (per window / batched) and offline path (per window / shared segments)
+    atol, rtol = TOLERANCES['window_bands']
+    for name, got in compute_window_bands(recs, impl).items():
+        report.close('window_bands', f"{name} per window", got, golden['window_bands'][name], atol, rtol)
+    for name, eeg in recs.items():
+        got = extract_band_powers_batch(impl['filter'](np.ascontiguousarray(raw_windows(eeg)), FS, axis=1), FS)
+        report.close('window_bands', f"{name} batched", got, golden['window_bands'][name], atol, rtol)
+    atol, rtol = TOLERANCES['hop_bands']
+    for name, got in compute_hop_bands(recs, impl).items():
+        report.close('hop_bands', f"{name} per window", got, golden['hop_bands'][name], atol, rtol)
+    for name, eeg in recs.items():
+        got = hop_band_powers(impl['filter'](eeg, FS), FS, int(WINDOW_SEC * FS), int(STEP_SEC * FS))
+        report.close('hop_bands', f"{name} batch_score.hop_band_powers", got, golden['hop_bands'][name], atol, rtol)
+
+    atol, rtol = TOLERANCES['scaled']
+    scaled = load(args.scaler).transform(np.load(args.x))
+    report.close('scaled', 'scaler.transform(X)', scaled, golden['scaled']['X'], atol, rtol)
+
+    # Alarms: identical on/off sequences, EMA within tolerance
+    got = compute_alarm(golden['alarm']['states'], impl)
+    for cls_name in ALARM_CLASSES:
+        report.exact('alarm', f"{cls_name} alarm_on", got[f"{cls_name}_on"], golden['alarm'][f"{cls_name}_on"])
+        if not np.all(np.isnan(golden['alarm'][f"{cls_name}_ema"])):
+            report.close('alarm', f"{cls_name} ema", got[f"{cls_name}_ema"], golden['alarm'][f"{cls_name}_ema"],
+                         *TOLERANCES['alarm_ema'])
+
+    # Model: same checkpoint must match closely; other formats get --prob-atol / --min-agreement
+    if 'probs' not in golden:
+        print("[WARN] No probability fixtures; run `record` with the model present")
+    elif not os.path.exists(args.model):
+        print(f"[WARN] {args.model} not found; probability checks skipped")
+    else:
+        recorded = next((d for p, d in manifest['inputs'].items() if p.endswith(('.pth', '.pt', '.onnx'))), None)
+        same = recorded is not None and sha256(args.model) == recorded and not args.quantize
+        atol = args.prob_atol if args.prob_atol is not None else TOLERANCES['probs'][0]
+        if not same:
+            print(f"[INFO] {args.model}{' (int8)' if args.quantize else ''} differs from the recorded model; "
+                  f"comparing as an alternative model")
+        got = compute_probs(args.model, scaled, recs, quantize=args.quantize)
+        for name, probs in got.items():
+            report.close('probs', f"{name} ({os.path.basename(args.model)})", probs, golden['probs'][name], atol, 0.0)
+            report.agreement('probs', f"{name} labels", probs, golden['probs'][name],
+                             1.0 if same and args.min_agreement is None else (args.min_agreement or 0.99))
+
+    if report.print():
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or check golden outputs of the signal/model/alarm paths")
+    parser.add_argument('command', choices=['record', 'check'])
+    parser.add_argument('--dir', default='golden', help='Fixture directory')
+    parser.add_argument('--model', default='best_eeg_model.pth')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--x', default='X.npy')
+    parser.add_argument('--y', default='y.npy')
+    parser.add_argument('--impl', nargs='*', default=None,
+                        help='Override implementations: filter=, band_powers=, or an alarm class name=module:attr')
+    parser.add_argument('--quantize', action='store_true', help='Check the int8 dynamic-quantized model')
+    parser.add_argument('--prob-atol', type=float, default=None, help='Probability tolerance for alternative models')
+    parser.add_argument('--min-agreement', type=float, default=None, help='Minimum argmax agreement (default 0.99)')
+    args = parser.parse_args()
+    record(args) if args.command == 'record' else check(args)
+
+
+if __name__ == '__main__':
+    main()
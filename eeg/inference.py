@@ -1,25 +1,31 @@
 import os
-import sys
 import time
 import json
 import threading
-import subprocess
 from collections import deque
 import numpy as np
 import torch
 import torch.nn.functional as F
 from joblib import load
 from pylsl import StreamInlet, resolve_byprop
-from model import HemiAttentionLSTM
-from signal_processing import design_bandpass, filter_eeg_signal, extract_band_powers
+from acquisition import start_muselsl_if_needed
+from model_runtime import ModelBundle, load_bundle, load_model
+from artifact_gate import ARTIFACT_LABEL, ArtifactGate
+from signal_processing import filter_eeg_signal, extract_band_powers_batch
+
+class IdentityScaler:
+    def transform(self, X): return X
 
 class EEGMoodDetector:
 
-    def __init__(self, window_sec=6.0, model_path='best_eeg_model.pth', scaler_path='scaler.joblib'):
+    def __init__(self, window_sec=6.0, model_path='best_eeg_model.pth', scaler_path='scaler.joblib',
+                 quantize=False, connect=True, min_new_samples=None, gate=False, source=None, stall_sec=2.0):
         self.window_sec = float(window_sec)
         self.model_path = model_path
         self.scaler_path = scaler_path
+        self.quantize = bool(quantize)  # int8 dynamic quantization of a float checkpoint at load time
 
+        self.source = source  # Inlet-like object (e.g. synthetic.SyntheticInlet) used instead of LSL
         self.inlet = None
         self.fs = None
         self.win_samps = None
@@ -28,96 +34,115 @@ class EEGMoodDetector:
         self._stop_event = threading.Event()
         self._lock = threading.Lock()
         self._muselsl_thread = None
+        self._muselsl_proc = None
+        self._listeners = []
         self.available = False
 
+        # Skip-if-unchanged: infer_latest recomputes only after min_new_samples new samples
+        # (default a quarter second at the stream rate) or a model reload
+        self.min_new_samples = min_new_samples
+        self.samples_seen = 0
+        self._memo = None  # (samples_seen, bundle, label, probs)
+        self.inference_stats = {'computed': 0, 'saved': 0, 'artifacts': 0, 'infer_ms': 0.0}
+
+        # Optional artifact gate ahead of feature extraction (gate=True for the default ArtifactGate,
+        # or pass one). Off by default: gated windows come back as ARTIFACT_LABEL with no probabilities.
+        # motion_provider, if set, returns (acc, gyro) arrays covering the latest window.
+        self.gate = ArtifactGate() if gate is True else (gate or None)
+        self.motion_provider = None
+
+        # Stall detection / recovery: no chunk for stall_sec marks the stream stalled, the
+        # collector re-resolves its inlet by source id, and the window is refilled with fresh data
+        self.stall_sec = float(stall_sec)
+        self.health = {'state': 'connecting', 'stalls': 0, 'reason': None, 'stalled_at': None,
+                       'last_gap_sec': None, 'last_recovery_sec': None, 'last_refill_sec': None}
+        self._source_id = None
+        self._last_chunk = None
+        self._resumed_at = None
+
+        self.reload_status = {'state': 'idle', 'version': 0, 'error': None}
+        self._reload_lock = threading.Lock()
+
         try:
             with open('label_map.json', 'r') as f:
                 lm = json.load(f)
-            self.label_map = {int(k): v for k, v in lm.items()}
+            label_map = {int(k): v for k, v in lm.items()}
         except Exception:
-            self.label_map = {0: 'focused', 1: 'unfocused'}
+            label_map = {0: 'focused', 1: 'unfocused'}
 
         # Load scaler
         try:
-            self.scaler = load(self.scaler_path)
+            scaler = load(self.scaler_path)
             print("EEG: Loaded scaler.joblib")
         except Exception:
             print("EEG: scaler.joblib not found. Using identity scaler.")
-            class IdentityScaler:
-                def transform(self, X): return X
-            self.scaler = IdentityScaler()
+            scaler = IdentityScaler()
 
-        # Model
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        # Model (float or int8 checkpoint; see model_runtime.py)
         try:
-            self.model = HemiAttentionLSTM(input_size=5, num_classes=len(self.label_map)).to(self.device)
-            state = torch.load(self.model_path, map_location=self.device)
-            self.model.load_state_dict(state)
-            self.model.eval()
+            model, device = load_model(self.model_path, len(label_map), quantize=self.quantize)
         except Exception as e:
             print(f"EEG: Failed to load model '{self.model_path}': {e}")
-            self.model = None
+            model, device = None, torch.device('cpu')
+        # Everything inference reads comes from one bundle, so reload() can swap it atomically
+        self.bundle = ModelBundle(model, device, scaler, label_map,
+                                  source={'model': model_path, 'scaler': scaler_path, 'label_map': 'label_map.json'})
 
-        # Establish LSL inlet and prefill buffer
+        # Establish LSL inlet and prefill buffer (connect=False: model only, for infer_batch)
+        if not connect:
+            return
         try:
             self._ensure_stream()
             self._prefill_buffer()
             self.available = (self.inlet is not None and self.model is not None)
+            if not self.available:
+                self.health.update(state='unavailable', reason='model not loaded' if self.model is None else 'no stream')
         except Exception as e:
             print(f"EEG: Initialization error: {e}")
             self.available = False
+            self.health.update(state='unavailable', reason=str(e))
 
-    # ---------- Stream setup ----------
-    def _start_muselsl_if_needed(self):
-        """Start muselsl streaming in a separate process if no EEG LSL stream is present."""
-        streams = resolve_byprop('type', 'EEG', timeout=3)
-        if streams:
-            return
+    @property
+    def model(self):
+        return self.bundle.model
 
-        print("EEG: No EEG stream found.")
-        flags = 0
-        if os.name == 'nt':
-            flags = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
-        try:
-            self._muselsl_proc = subprocess.Popen(
-                [sys.executable, "-m", "muselsl", "stream", "--ppg", "--acc", "--gyro"],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.STDOUT,
-                creationflags=flags if os.name == 'nt' else 0
-            )
-        except Exception as e:
-            raise RuntimeError(f"Failed to launch muselsl subprocess: {e}")
+    @property
+    def scaler(self):
+        return self.bundle.scaler
 
-        # Wait for EEG stream to appear
-        for _ in range(40):  # up to ~20s
-            streams = resolve_byprop('type', 'EEG', timeout=0.5)
-            if streams:
-                print("EEG: EEG stream is up.")
-                return
-            time.sleep(0.5)
+    @property
+    def label_map(self):
+        return self.bundle.label_map
 
-        # If not up, kill subprocess and error
-        try:
-            if self._muselsl_proc and self._muselsl_proc.poll() is None:
-                self._muselsl_proc.terminate()
-        except Exception:
-            pass
-        raise RuntimeError("Failed to start EEG stream via muselsl (timeout).")
+    @property
+    def device(self):
+        return self.bundle.device
+
+    # ---------- Stream setup ----------
+    def _start_muselsl_if_needed(self):
+        """Start muselsl streaming in a separate process if no EEG LSL stream is present."""
+        self._muselsl_proc = start_muselsl_if_needed()
 
     def _ensure_stream(self):
         """Ensure we have a pylsl inlet and sampling rate."""
-        # Start muselsl if needed
-        self._start_muselsl_if_needed()
+        if self.source is not None:
+            self.inlet = self.source
+        else:
+            # Start muselsl if needed
+            self._start_muselsl_if_needed()
 
-        print("EEG: Resolving EEG LSL stream...")
-        streams = resolve_byprop('type', 'EEG', timeout=20)
-        if not streams:
-            raise RuntimeError("No EEG stream found.")
+            print("EEG: Resolving EEG LSL stream...")
+            streams = resolve_byprop('type', 'EEG', timeout=20)
+            if not streams:
+                raise RuntimeError("No EEG stream found.")
 
-        self.inlet = StreamInlet(streams[0], max_chunklen=256)
+            self.inlet = StreamInlet(streams[0], max_chunklen=256)
+            self._source_id = streams[0].source_id()
         self.fs = int(self.inlet.info().nominal_srate()) or 256
         self.win_samps = int(self.window_sec * self.fs)
         self.buf = deque(maxlen=self.win_samps)
+        if self.min_new_samples is None:
+            self.min_new_samples = max(1, self.fs // 4)
         print(f"EEG: Connected (fs={self.fs}Hz), window={self.window_sec}s")
 
     def _prefill_buffer(self):
@@ -132,6 +157,9 @@ class EEGMoodDetector:
                     for s in chunk:
                         # First 5 channels: TP9, AF7, AF8, TP10, AUX
                         self.buf.append(np.array(s[:5], dtype=np.float32))
+                    self.samples_seen += len(chunk)
+        self._last_chunk = time.time()
+        self.health['state'] = 'live'
         print("EEG: Buffer ready.")
 
     # ---------- Background collector ----------
@@ -162,47 +190,259 @@ class EEGMoodDetector:
             pass
         print("EEG: Collector stopped.")
 
+    def add_listener(self, callback):
+        """Register callback(block) called from the collector thread with each new (n, 5) float32 chunk."""
+        self._listeners.append(callback)
+
     def _collector_loop(self):
+        self._last_chunk = self._last_chunk or time.time()
+        while not self._stop_event.is_set():
+            try:
+                chunk, _ = self.inlet.pull_chunk(timeout=0.5, max_samples=256)
+            except Exception as e:
+                print(f"EEG: Collector error: {e}")
+                self._mark_stalled(str(e))
+                chunk = None
+                self._stop_event.wait(0.1)  # A raising inlet returns at once; do not spin on it
+            if not chunk:
+                if time.time() - self._last_chunk > self.stall_sec:
+                    self._mark_stalled('no data')
+                    if self.source is None:  # Shared sources reconnect on their own (acquisition.py)
+                        self._reconnect()
+                continue
+            block = np.asarray(chunk, dtype=np.float32)[:, :5]
+            now = time.time()
+            with self._lock:
+                if self.health['state'] in ('stalled', 'reconnecting'):
+                    # Pre-gap samples must not share a window with new ones: refill from scratch
+                    self.buf.clear()
+                    self._resumed_at = now
+                    self.health.update(state='filling', last_gap_sec=now - self._last_chunk,
+                                       last_recovery_sec=now - self.health['stalled_at'])
+                    print(f"EEG: Data resumed after {now - self._last_chunk:.1f}s; refilling buffer.")
+                self.buf.extend(block)
+                self.samples_seen += len(block)
+                if self.health['state'] == 'filling' and len(self.buf) >= self.win_samps:
+                    self.health.update(state='live', last_refill_sec=now - self._resumed_at)
+            self._last_chunk = now
+            for callback in self._listeners:
+                try:
+                    callback(block)
+                except Exception as e:
+                    print(f"EEG: Listener error: {e}")
+
+    def _mark_stalled(self, reason):
+        if self.health['state'] in ('stalled', 'reconnecting'):
+            return
+        self.health.update(state='stalled', reason=reason, stalled_at=time.time(), stalls=self.health['stalls'] + 1)
+        print(f"EEG: Stream stalled ({reason}).")
+
+    def _reconnect(self):
+        """Re-resolve the stream (by source id when known) and swap in a fresh inlet."""
+        self.health['state'] = 'reconnecting'
+        while not self._stop_event.is_set():
+            if self._muselsl_proc is not None and self._muselsl_proc.poll() is not None:
+                try:  # Our muselsl died; start another one
+                    self._start_muselsl_if_needed()
+                except Exception as e:
+                    print(f"EEG: {e}")
+            prop, value = ('source_id', self._source_id) if self._source_id else ('type', 'EEG')
+            streams = resolve_byprop(prop, value, timeout=1.0)
+            if streams:
+                self.inlet = StreamInlet(streams[0], max_chunklen=256)
+                print(f"EEG: Reconnected to {streams[0].name()} "
+                      f"({time.time() - self.health['stalled_at']:.1f}s after stall).")
+                return
+
+    def _predict_probs(self, windows, bundle, fs=256):
+        """(n, samples, 5) raw EEG windows sampled at fs -> (n, classes) probabilities with one model call."""
+        eeg_filt = filter_eeg_signal(windows, fs, axis=1)
+        bp = extract_band_powers_batch(eeg_filt, fs)
+        feat = bundle.scaler.transform(bp.reshape(len(bp), -1))
+
+        x = feat.reshape(-1, 5, 5).transpose(0, 2, 1)
+        x_t = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32)).to(bundle.device)
+
+        with torch.no_grad():
+            logits = bundle.model(x_t)
+            return F.softmax(logits, dim=1).cpu().numpy()
+
+    @staticmethod
+    def _labelled(probs, label_map):
+        pred_idx = int(probs.argmax())
+        return (label_map.get(pred_idx, str(pred_idx)),
+                {label_map[i]: float(probs[i]) for i in range(len(probs))})
+
+    def infer_batch(self, windows, batch_size=256, acc=None, gyro=None, fs=256):
+        """Score many windows at once (backfill, several streams).
+
+        `windows` is (n, samples, 5) raw EEG sampled at `fs`, or a list of (samples, 5)
+        windows of equal length; optional `acc`/`gyro` are matching (n, samples, 3) motion windows.
+        Returns a list of (label, probs) in input order; artifact windows come back
+        as (ARTIFACT_LABEL, {}) without being featurized.
+        """
+        bundle = self.bundle
+        if bundle.model is None:
+            return []
+        windows = np.asarray(windows, dtype=np.float64)
+        if windows.ndim != 3 or windows.shape[0] == 0:
+            return []
+        results = [(ARTIFACT_LABEL, {})] * len(windows)
+        keep = np.arange(len(windows))
+        if self.gate is not None:
+            ok, _ = self.gate.check(windows, acc=acc, gyro=gyro)
+            keep = np.flatnonzero(ok)
+            self.inference_stats['artifacts'] += len(windows) - len(keep)
+        t0 = time.perf_counter()
+        for start in range(0, len(keep), batch_size):
+            idx = keep[start:start + batch_size]
+            for i, probs in zip(idx, self._predict_probs(windows[idx], bundle, fs)):
+                results[i] = self._labelled(probs, bundle.label_map)
+        self.inference_stats['computed'] += len(keep)
+        self.inference_stats['infer_ms'] += (time.perf_counter() - t0) * 1e3
+        return results
+
+    def gate_stats(self):
+        """Artifact rejection counts and the inference time they avoided (estimated)."""
+        if self.gate is None:
+            return None
+        out = self.gate.summary()
+        computed = self.inference_stats['computed']
+        per_window = self.inference_stats['infer_ms'] / computed if computed else 0.0
+        out['infer_ms_per_window'] = per_window
+        out['est_saved_ms'] = max(0.0, self.gate.stats['rejected'] * per_window - self.gate.stats['gate_ms'])
+        return out
+
+    # ---------- Hot reload ----------
+    def reload(self, model_dir=None, allow_label_change=False, warmup_runs=3):
+        """Load a retrained artifact set, warm it up, validate it and swap it in.
+
+        Files are looked up in `model_dir` under the current file names. Until the
+        swap, the old bundle keeps serving; every inference call reads self.bundle
+        once, so callers see either the old or the new model, never a gap or a
+        mix. An inference_config.json next to the model sets the window length
+        (applied with the swap) and must match the stream's sampling rate.
+        Returns reload_status; raises nothing.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return dict(self.reload_status, error='reload already in progress')
         try:
-            while not self._stop_event.is_set():
-                chunk, _ = self.inlet.pull_chunk(timeout=1.0, max_samples=256)
-                if not chunk:
-                    continue
+            self.reload_status.update(state='loading', error=None, started_at=time.time())
+            current = self.bundle
+            paths = {k: os.path.join(model_dir, os.path.basename(v)) if model_dir else v
+                     for k, v in current.source.items()}
+            t0 = time.perf_counter()
+            candidate = load_bundle(paths['model'], paths['scaler'], paths['label_map'], quantize=self.quantize)
+            config = self._inference_config(paths['model'])
+            window_sec = config['window_sec'] if config else self.window_sec
+
+            old_labels = sorted(current.label_map.values())
+            new_labels = sorted(candidate.label_map.values())
+            if current.model is not None and new_labels != old_labels and not allow_label_change:
+                raise ValueError(f"Labels changed {old_labels} -> {new_labels}; pass allow_label_change to accept")
+
+            # Warm up on the live buffer when there is one, so first real calls are not slow
+            window = None
+            if self.buf is not None and self.win_samps:
                 with self._lock:
-                    for s in chunk:
-                        self.buf.append(np.array(s[:5], dtype=np.float32))
+                    if len(self.buf) >= self.win_samps:
+                        window = np.vstack(self.buf)[-self.win_samps:, :]
+            if window is None or window_sec != self.window_sec:
+                window = np.random.default_rng(0).normal(scale=20.0, size=(int(window_sec * (self.fs or 256)), 5))
+            for _ in range(max(1, warmup_runs)):
+                probs = self._predict_probs(window[None, :, :].astype(np.float64), candidate, self.fs or 256)
+            if probs.shape != (1, len(candidate.label_map)) or not np.all(np.isfinite(probs)):
+                raise ValueError(f"Warm-up produced {probs.shape} output (finite={np.all(np.isfinite(probs))}), "
+                                 f"expected (1, {len(candidate.label_map)})")
+
+            self.bundle = candidate  # Atomic swap
+            if window_sec != self.window_sec:
+                self._set_window(window_sec)
+            if self.inlet is not None and not self.available:
+                # First working model: start collecting now, refilling past the stale prefill
+                with self._lock:
+                    self.buf.clear()
+                    self._resumed_at = self._last_chunk = time.time()
+                    self.health.update(state='filling', reason=None)
+                self.available = True
+                self.run()
+            self.reload_status.update(state='ok', version=self.reload_status['version'] + 1,
+                                      loaded_at=candidate.loaded_at, source=candidate.source,
+                                      labels=new_labels, window_sec=self.window_sec,
+                                      load_ms=(time.perf_counter() - t0) * 1e3)
+            print(f"EEG: Reloaded model v{self.reload_status['version']} from {candidate.source['model']}")
         except Exception as e:
-            print(f"EEG: Collector error: {e}")
+            self.reload_status.update(state='failed', error=str(e))
+            print(f"EEG: Reload failed, keeping current model: {e}")
+        finally:
+            self._reload_lock.release()
+        return dict(self.reload_status)
+
+    def _inference_config(self, model_path):
+        """Validated {'window_sec', 'fs'} from the inference_config.json beside model_path, or None."""
+        path = os.path.join(os.path.dirname(model_path), 'inference_config.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            cfg = json.load(f)
+        window_sec = float(cfg.get('window_sec', self.window_sec))
+        fs = int(cfg.get('fs', self.fs or 256))
+        if not 1.0 <= window_sec <= 60.0:
+            raise ValueError(f"{path}: window_sec={window_sec} is outside 1..60 s")
+        if self.fs and fs != self.fs:
+            raise ValueError(f"{path}: model was trained on {fs} Hz data but the stream is {self.fs} Hz")
+        return {'window_sec': window_sec, 'fs': fs}
+
+    def _set_window(self, window_sec):
+        """Change the scoring window; a longer window waits for the buffer to fill before scoring again."""
+        with self._lock:
+            self.window_sec = float(window_sec)
+            if self.fs:
+                self.win_samps = int(self.window_sec * self.fs)
+                self.buf = deque(self.buf, maxlen=self.win_samps)
+        print(f"EEG: Window set to {self.window_sec}s")
+
+    def reload_async(self, **kwargs):
+        """reload() on a background thread; poll reload_status for the outcome."""
+        threading.Thread(target=self.reload, kwargs=kwargs, daemon=True).start()
 
     def infer_latest(self, verbose=True):
         """Run inference on the latest window. Returns (label:str|None, probs:dict|None)."""
         if not self.available or self.model is None or self.buf is None:
             return None, None
 
-        # Snapshot window
+        bundle = self.bundle
+        memo = self._memo
+        # Snapshot window, unless it has not moved enough since the last result
         with self._lock:
-            if len(self.buf) < self.win_samps:
+            if len(self.buf) < self.win_samps or self.health['state'] != 'live':
                 return None, None
+            seq = self.samples_seen
+            if memo is not None and memo[1] is bundle and seq - memo[0] < (self.min_new_samples or 1):
+                self.inference_stats['saved'] += 1
+                return memo[2], dict(memo[3])
             eeg_win = np.vstack(self.buf)[-self.win_samps:, :]
 
-        eeg_filt = filter_eeg_signal(eeg_win, 256)
-        bp = extract_band_powers(eeg_filt, 256)
-        feat = bp.flatten()[None, :]
-        feat = self.scaler.transform(feat)
-
-        x = feat.reshape(1, 5, 5).transpose(0, 2, 1)
-        x_t = torch.from_numpy(x.astype(np.float32)).to(self.device)
-
-        with torch.no_grad():
-            logits = self.model(x_t)
-            probs = F.softmax(logits, dim=1).cpu().numpy()[0]
-            pred_idx = int(probs.argmax())
-            label = self.label_map.get(pred_idx, str(pred_idx))
-
-        probs_dict = {self.label_map[i]: float(probs[i]) for i in range(len(probs))}
+        motion = {}
+        if self.gate is not None and self.motion_provider is not None:
+            try:
+                acc, gyro = self.motion_provider(self.window_sec)
+                motion = {'acc': None if acc is None else acc[None], 'gyro': None if gyro is None else gyro[None]}
+            except Exception as e:
+                print(f"EEG: Motion provider error: {e}")
+        if self.gate is not None and not self.gate.check(eeg_win[None, :, :], **motion)[0][0]:
+            label, probs_dict = ARTIFACT_LABEL, {}
+            self.inference_stats['artifacts'] += 1
+        else:
+            t0 = time.perf_counter()
+            probs = self._predict_probs(eeg_win[None, :, :], bundle, self.fs or 256)[0]
+            label, probs_dict = self._labelled(probs, bundle.label_map)
+            self.inference_stats['computed'] += 1
+            self.inference_stats['infer_ms'] += (time.perf_counter() - t0) * 1e3
+        self._memo = (seq, bundle, label, probs_dict)
         if verbose:
             ts = time.strftime("%H:%M:%S")
-            prob_text = " ".join([f"{k}:{probs_dict[k]:.2f}" for k in self.label_map.values()])
+            prob_text = " ".join([f"{k}:{v:.2f}" for k, v in probs_dict.items()])
             print(f"[EEG {ts}] mood={label} | {prob_text}")
         return label, probs_dict
     
@@ -212,6 +452,10 @@ if __name__ == '__main__':
     eeg.run()
     while True:
         label, probs = eeg.infer_latest(verbose=False)
+        if probs is None:  # Stalled, reconnecting or refilling: no fresh window yet
+            print(f"EEG: waiting ({eeg.health['state']})")
+            time.sleep(2)
+            continue
         print(f"EEG: {label} | {probs}")
         probs_text = " ".join([f"{k}:{probs[k]:.2f}" for k in probs])
         print(f"EEG Mood: {label} | {probs_text}")
@@ -48,4 +48,20 @@ class HemiAttentionLSTM(nn.Module):
         attended_right = self.right_attends_left(right_out, left_out) # (batch, hidden_size*2)
         combined = torch.cat((attended_left, attended_right), dim=1) # (batch, hidden_size*4)
         return self.classifier(combined)
-    
\ No newline at end of file
+    
+class StudentMLP(nn.Module):
+    """Small MLP distilled from HemiAttentionLSTM (see distill.py). hidden=() is a logistic head.
+
+    Takes the same (batch, 5, 5) input as the teacher so it can be swapped in directly.
+    """
+    def __init__(self, in_features=25, hidden=(32,), num_classes=2):
+        super().__init__()
+        layers, width = [], in_features
+        for h in hidden:
+            layers += [nn.Linear(width, h), nn.ReLU()]
+            width = h
+        layers.append(nn.Linear(width, num_classes))
+        self.net = nn.Sequential(*layers)
+
+    def forward(self, x):
+        return self.net(x.transpose(1, 2).reshape(x.shape[0], -1))
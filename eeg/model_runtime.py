@@ -0,0 +1,220 @@
+"""
+Loading mood-model checkpoints for inference.
+
+Supported files:
+    float    plain HemiAttentionLSTM state_dict written by train.py (best_eeg_model.pth)
+    int8     dict {'format': 'int8-dynamic', ...} written by quantize.py; the LSTM
+             and Linear weights are int8 with activations quantized on the fly.
+             Stored as plain tensors so it loads with weights_only=True.
+             Dynamic quantization only has CPU kernels, so these run on CPU.
+    student  dict {'format': 'student-mlp', ...} written by distill.py; a small
+             MLP distilled from the LSTM, same input layout, run on CPU.
+    script   frozen TorchScript module written by export_model.py
+    onnx     *.onnx graph written by export_model.py, run with onnxruntime on CPU
+
+All of them take a (batch, 5, 5) float32 tensor with any batch size and
+return (batch, num_classes) logits.
+
+A float checkpoint can also be quantized at load time with quantize=True.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+import warnings
+import zipfile
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from model import HemiAttentionLSTM, StudentMLP
+
+QUANTIZED_FORMAT = 'int8-dynamic'
+STUDENT_FORMAT = 'student-mlp'
+
+
+def quantize_dynamic(model):
+    """int8 dynamic quantization of every LSTM and Linear layer (returns a new module)."""
+    model.eval()
+    with warnings.catch_warnings():
+        # torch.ao.quantization is deprecated in favour of torchao, which is not a dependency here
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return torch.ao.quantization.quantize_dynamic(model.cpu(), {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+
+
+def _quantized_tensors(qmodel):
+    """state_dict of a dynamic-quantized model with the LSTM packed params (ScriptObjects)
+    replaced by their int8 weight / float bias tensors, so torch.load(weights_only=True) can read it."""
+    tensors = {k: v for k, v in qmodel.state_dict().items() if '._all_weight_values.' not in k}
+    for name, module in qmodel.named_modules():
+        if isinstance(module, torch.ao.nn.quantized.dynamic.LSTM):
+            for group in module._weight_bias().values():  # {'weight': {...}, 'bias': {...}}
+                tensors.update({f"{name}.{k}": v.detach() for k, v in group.items()})
+    return tensors
+
+
+def _load_quantized_tensors(qmodel, tensors):
+    lstms = {name: module for name, module in qmodel.named_modules()
+             if isinstance(module, torch.ao.nn.quantized.dynamic.LSTM)}
+    # Start from the model's own state_dict (keeps its version metadata and the LSTM packed
+    # params, which are set from their tensors below) and overwrite everything else
+    state = qmodel.state_dict()
+    rest = {k: v for k, v in tensors.items() if k.rsplit('.', 1)[0] not in lstms}
+    unexpected = sorted(set(rest) - set(state))
+    if unexpected:
+        raise RuntimeError(f"int8 checkpoint does not match the model: unexpected keys {unexpected}")
+    state.update(rest)
+    qmodel.load_state_dict(state)
+    for name, module in lstms.items():
+        module.set_weight_bias({k.rsplit('.', 1)[1]: v for k, v in tensors.items() if k.rsplit('.', 1)[0] == name})
+
+
+def save_quantized(qmodel, path, num_classes, hidden_size=128):
+    torch.save({'format': QUANTIZED_FORMAT, 'num_classes': num_classes, 'hidden_size': hidden_size,
+                'tensors': _quantized_tensors(qmodel)}, path)
+
+
+def save_student(student, path, num_classes, hidden, teacher=None):
+    torch.save({'format': STUDENT_FORMAT, 'num_classes': num_classes, 'hidden': list(hidden),
+                'teacher': teacher, 'state_dict': student.state_dict()}, path)
+
+
+class OnnxModel:
+    """onnxruntime session behind the same call interface as a torch module."""
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort  # Optional dependency, only needed for .onnx models
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, opts, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        x = x.detach().cpu().numpy() if isinstance(x, torch.Tensor) else x
+        logits = self.session.run(None, {self.input_name: np.ascontiguousarray(x, dtype=np.float32)})[0]
+        return torch.from_numpy(logits)
+
+    def eval(self):
+        return self
+
+
+def is_torchscript(path):
+    try:
+        with zipfile.ZipFile(path) as zf:
+            return any('/code/' in name for name in zf.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+
+def load_model(path, num_classes, device=None, quantize=False):
+    """(model in eval mode, device it runs on) for any of the formats above."""
+    if str(path).endswith('.onnx'):
+        return OnnxModel(path), torch.device('cpu')
+    if is_torchscript(path):
+        device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        return torch.jit.load(path, map_location=device).eval(), device
+
+    # Every checkpoint format here is tensors only, so nothing is unpickled beyond torch's allowlist
+    try:
+        ckpt = torch.load(path, map_location='cpu', weights_only=True)
+    except pickle.UnpicklingError as e:
+        raise ValueError(f"{path} holds objects other than tensors and will not be unpickled; int8 "
+                         f"checkpoints from before the tensor-only layout must be re-made with quantize.py") from e
+    if isinstance(ckpt, dict) and ckpt.get('format') == QUANTIZED_FORMAT:
+        model = quantize_dynamic(HemiAttentionLSTM(input_size=5, hidden_size=ckpt['hidden_size'],
+                                                   num_classes=ckpt['num_classes']))
+        _load_quantized_tensors(model, ckpt['tensors'])
+        return model.eval(), torch.device('cpu')
+    if isinstance(ckpt, dict) and ckpt.get('format') == STUDENT_FORMAT:
+        model = StudentMLP(hidden=tuple(ckpt['hidden']), num_classes=ckpt['num_classes'])
+        model.load_state_dict(ckpt['state_dict'])
+        return model.eval(), torch.device('cpu')
+
+    model = HemiAttentionLSTM(input_size=5, num_classes=num_classes)
+    model.load_state_dict(ckpt)
+    if quantize:
+        return quantize_dynamic(model).eval(), torch.device('cpu')
+    device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    return model.to(device).eval(), device
+
+
+class ModelBundle:
+    """Model, scaler and label map that are used (and swapped on reload) together."""
+
+    def __init__(self, model, device, scaler, label_map, source=None):
+        self.model = model
+        self.device = device
+        self.scaler = scaler
+        self.label_map = label_map
+        self.source = source or {}
+        self.loaded_at = time.time()
+
+
+def load_bundle(model_path, scaler_path, label_map_path, quantize=False):
+    """Strict loader for a retrained artifact set; raises instead of falling back."""
+    from joblib import load
+    with open(label_map_path, 'r') as f:
+        label_map = {int(k): v for k, v in json.load(f).items()}
+    if sorted(label_map) != list(range(len(label_map))):
+        raise ValueError(f"label_map keys must be 0..{len(label_map) - 1}, got {sorted(label_map)}")
+    scaler = load(scaler_path)
+    n_features = getattr(scaler, 'n_features_in_', 25)
+    if n_features != 25:
+        raise ValueError(f"Scaler expects {n_features} features, the detector produces 25")
+    model, device = load_model(model_path, len(label_map), quantize=quantize)
+    return ModelBundle(model, device, scaler, label_map,
+                       source={'model': model_path, 'scaler': scaler_path, 'label_map': label_map_path})
+
+
+class ModelWatcher:
+    """Polls a directory of training outputs and calls on_change(model_dir) when they change.
+
+    A change fires only after the files have stayed the same for one extra poll,
+    so a reload never starts on a half-written checkpoint.
+    """
+
+    FILES = ('best_eeg_model.pth', 'scaler.joblib', 'label_map.json', 'inference_config.json')
+
+    def __init__(self, model_dir, on_change, interval=2.0, files=FILES):
+        self.model_dir = model_dir
+        self.on_change = on_change
+        self.interval = float(interval)
+        self.files = files
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _signature(self):
+        sig = []
+        for name in self.files:
+            try:
+                st = os.stat(os.path.join(self.model_dir, name))
+                sig.append((name, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append((name, None, None))
+        return tuple(sig)
+
+    def _loop(self):
+        applied = pending = self._signature()
+        while not self._stop_event.wait(self.interval):
+            current = self._signature()
+            if current != pending:
+                pending = current  # Still being written; wait for it to settle
+            elif current != applied:
+                applied = current
+                try:
+                    self.on_change(self.model_dir)
+                except Exception as e:
+                    print(f"ModelWatcher: reload callback failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Export an int8 dynamically quantized copy of the trained HemiAttentionLSTM,
+compare it with the float model on the validation split train.py uses, and
+benchmark CPU latency and memory at batch 1 and batch 64.
+
+    python quantize.py --model best_eeg_model.pth --out best_eeg_model_int8.pth
+
+Serve the result with EEGMoodDetector(model_path='best_eeg_model_int8.pth')
+(or EEG_MODEL=... for backend.py), or quantize at load time with quantize=True.
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from joblib import load
+from sklearn.model_selection import train_test_split
+
+from feature_io import load_features, clean, peak_rss_mb
+from model_runtime import load_model, quantize_dynamic, save_quantized
+from train import to_model_input
+
+
+def validation_inputs(x_path, y_path, scaler_path):
+    """Scaled validation tensors from the same split train.py uses."""
+    X, y = load_features(x_path, y_path, mmap=True)
+    _, val_idx = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+    val_idx = np.sort(val_idx)
+    X_val = load(scaler_path).transform(clean(np.asarray(X[val_idx], dtype=np.float64)))
+    return torch.from_numpy(to_model_input(X_val).astype(np.float32)), y[val_idx]
+
+
+def predict_probs(model, X, batch_size=256):
+    with torch.no_grad():
+        return torch.cat([F.softmax(model(X[i:i + batch_size]), dim=1) for i in range(0, len(X), batch_size)])
+
+
+def serialized_bytes(model):
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell()
+
+
+def latency_ms(model, x, repeats):
+    with torch.no_grad():
+        for _ in range(10):
+            model(x)
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - t0)
+    times = np.array(times) * 1e3
+    return float(np.median(times)), float(np.percentile(times, 99))
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux /proc); falls back to the peak elsewhere."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb() or 0.0
+
+
+def _bench_worker(path, num_classes, threads, queue):
+    """Runs in a fresh process so RSS growth reflects only this model."""
+    torch.set_num_threads(threads)
+    torch.zeros(1) @ torch.zeros(1)  # Initialise the torch runtime before the baseline
+    rss_base = current_rss_mb()
+    model, _ = load_model(path, num_classes, device=torch.device('cpu'))
+    out = {'rss_model_mb': current_rss_mb() - rss_base}
+    for batch in (1, 64):
+        x = torch.randn(batch, 5, 5)
+        out[f'b{batch}'] = latency_ms(model, x, repeats=500 if batch == 1 else 100)
+    out['rss_run_mb'] = current_rss_mb() - rss_base
+    queue.put(out)
+
+
+def benchmark(path, num_classes, threads):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_bench_worker, args=(path, num_classes, threads, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8 dynamic quantization of HemiAttentionLSTM")
+    parser.add_argument('--model', default='best_eeg_model.pth')
+    parser.add_argument('--out', default='best_eeg_model_int8.pth')
+    parser.add_argument('--x', default='X.npy')
+    parser.add_argument('--y', default='y.npy')
+    parser.add_argument('--scaler', default='scaler.joblib')
+    parser.add_argument('--threads', type=int, default=1, help='CPU threads for the latency benchmark')
+    parser.add_argument('--no-bench', action='store_true', help='Skip the latency/memory benchmark')
+    args = parser.parse_args()
+
+    try:
+        with open('label_map.json', 'r') as f:
+            label_map = {int(k): v for k, v in json.load(f).items()}
+    except Exception:
+        label_map = {0: 'focused', 1: 'unfocused'}
+    num_classes = len(label_map)
+
+    fmodel, _ = load_model(args.model, num_classes, device=torch.device('cpu'))
+    qmodel = quantize_dynamic(load_model(args.model, num_classes, device=torch.device('cpu'))[0])
+    save_quantized(qmodel, args.out, num_classes)
+    print(f"[INFO] Saved int8 model to {args.out}")
+
+    if os.path.exists(args.x) and os.path.exists(args.y):
+        X_val, y_val = validation_inputs(args.x, args.y, args.scaler)
+        p_float, p_int8 = predict_probs(fmodel, X_val), predict_probs(qmodel, X_val)
+        pred_float, pred_int8 = p_float.argmax(1).numpy(), p_int8.argmax(1).numpy()
+        print(f"[INFO] Validation windows: {len(y_val)}")
+        print(f"[INFO] Accuracy  float32: {(pred_float == y_val).mean():.4f}  int8: {(pred_int8 == y_val).mean():.4f}")
+        print(f"[INFO] Agreement {(pred_float == pred_int8).mean():.4f}, "
+              f"max |dprob| {(p_float - p_int8).abs().max().item():.4f}")
+    else:
+        print(f"[WARN] {args.x}/{args.y} not found, skipping accuracy comparison.")
+
+    print(f"[INFO] Serialized weights  float32: {serialized_bytes(fmodel) / 1024:.0f} KB  "
+          f"int8: {serialized_bytes(qmodel) / 1024:.0f} KB")
+    if args.no_bench:
+        return
+    print(f"[INFO] Latency (ms, median / p99, {args.threads} thread(s)) and process memory:")
+    for name, path in (('float32', args.model), ('int8', args.out)):
+        r = benchmark(path, num_classes, args.threads)
+        print(f"  {name:8s} batch 1: {r['b1'][0]:.3f} / {r['b1'][1]:.3f}   "
+              f"batch 64: {r['b64'][0]:.3f} / {r['b64'][1]:.3f}   "
+              f"RSS +{r['rss_model_mb']:.1f} MB loaded, +{r['rss_run_mb']:.1f} MB after runs")
+
+
+if __name__ == '__main__':
+    main()
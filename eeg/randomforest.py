@@ -17,6 +17,7 @@ import threading
 from muselsl import stream as muse_stream, list_muses
 
 from signal_processing import filter_eeg_signal, extract_band_powers
+from feature_io import load_features, transform_chunked, peak_rss_mb
 
 
 # -----------------------
@@ -55,12 +56,12 @@ def ensure_stream():
 # -----------------------
 # Training
 # -----------------------
-def train_rf(x_path='X.npy', y_path='y.npy', out_model='rf_eeg_model.joblib'):
-    X = np.load(x_path)
-    y = np.load(y_path)
-
-    # Clean NaNs/Infs just in case
-    X = np.nan_to_num(X, nan=0.0, neginf=-12.0, posinf=12.0)
+def train_rf(x_path='X.npy', y_path='y.npy', out_model='rf_eeg_model.joblib', mmap=False):
+    # With mmap, X stays on disk and only the float32 train/val copies the forest needs are built
+    X, y = load_features(x_path, y_path, mmap=mmap)
+    if not mmap:
+        # Clean NaNs/Infs just in case
+        X = np.nan_to_num(X, nan=0.0, neginf=-12.0, posinf=12.0)
 
     # If label_map.json exists, respect its class order, else create it
     try:
@@ -72,9 +73,17 @@ def train_rf(x_path='X.npy', y_path='y.npy', out_model='rf_eeg_model.joblib'):
         with open('label_map.json', 'w') as f:
             json.dump({int(k): v for k, v in label_map.items()}, f)
 
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42
-    )
+    if mmap:
+        train_idx, val_idx = train_test_split(
+            np.arange(len(y)), test_size=0.2, stratify=y, random_state=42
+        )
+        # float32 is what the trees use internally, so fit() makes no further copy
+        X_train, X_val = transform_chunked(X, train_idx), transform_chunked(X, val_idx)
+        y_train, y_val = y[train_idx], y[val_idx]
+    else:
+        X_train, X_val, y_train, y_val = train_test_split(
+            X, y, test_size=0.2, stratify=y, random_state=42
+        )
 
     # Class weights (balanced) help with imbalance
     classes = np.unique(y_train)
@@ -103,6 +112,9 @@ def train_rf(x_path='X.npy', y_path='y.npy', out_model='rf_eeg_model.joblib'):
 
     dump(rf, out_model)
     print(f"[INFO] Saved model -> {out_model}")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"[INFO] Peak RSS: {rss:.0f} MB")
 
     # Mirror inference config to match your feature extraction windowing
     try:
@@ -214,13 +226,14 @@ def main():
     tr.add_argument("--x", default="X.npy")
     tr.add_argument("--y", default="y.npy")
     tr.add_argument("--out", default="rf_eeg_model.joblib")
+    tr.add_argument("--mmap", action="store_true", help="Memory-map X instead of loading it")
 
     inf = sub.add_parser("infer", help="Run live inference with RF model")
     inf.add_argument("--model", default="rf_eeg_model.joblib")
 
     args = parser.parse_args()
     if args.cmd == "train":
-        train_rf(args.x, args.y, args.out)
+        train_rf(args.x, args.y, args.out, mmap=args.mmap)
     elif args.cmd == "infer":
         infer_live(args.model)
 
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Memory-mappable store for EEG/PPG recording sessions.
+
+Layout of a store directory:
+    index.json            sessions, labels, sample counts, sampling rates, timestamps
+    <id>.eeg.npy          float32 (samples, channels), uncompressed
+    <id>.ppg.npy          float32 (samples, channels), uncompressed (optional)
+
+Arrays are opened with np.load(mmap_mode='r'), so reading a window only
+touches the pages it covers instead of decompressing the whole recording.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+DEFAULT_EEG_FS = 256
+DEFAULT_PPG_FS = 64
+COPY_CHUNK = 1 << 16  # Rows copied per step when writing a session
+
+
+def label_from_filename(path, labels):
+    """Longest known label that prefixes the file stem, e.g. 'unfocusedscrolling2.npz' -> 'unfocused'."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    matches = [lab for lab in labels if stem.startswith(lab)]
+    return max(matches, key=len) if matches else stem
+
+
+class SessionStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._mmaps = {}
+        try:
+            with open(os.path.join(root, INDEX_FILE), 'r') as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {'version': 1, 'sessions': {}}
+
+    # ---------- Writing ----------
+    def _save_index(self):
+        tmp = os.path.join(self.root, INDEX_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, os.path.join(self.root, INDEX_FILE))
+
+    def _write_array(self, name, data):
+        out = np.lib.format.open_memmap(os.path.join(self.root, name), mode='w+',
+                                        dtype=np.float32, shape=data.shape)
+        for start in range(0, data.shape[0], COPY_CHUNK):
+            out[start:start + COPY_CHUNK] = data[start:start + COPY_CHUNK]
+        out.flush()
+        del out
+
+    def add(self, eeg, label, ppg=None, fs=DEFAULT_EEG_FS, ppg_fs=DEFAULT_PPG_FS,
+            session_id=None, source=None, recorded_at=None, extra=None):
+        """Store one session and return its id. `eeg`/`ppg` may themselves be memory-mapped."""
+        if eeg.ndim != 2 or eeg.shape[0] == 0:
+            raise ValueError(f"EEG must be a non-empty (samples, channels) array, got {eeg.shape}")
+        session_id = session_id or f"{label}-{len(self.index['sessions']):04d}"
+        if session_id in self.index['sessions']:
+            raise ValueError(f"Session '{session_id}' already exists")
+
+        entry = {
+            'label': label,
+            'source': source,
+            'recorded_at': recorded_at if recorded_at is not None else time.time(),
+            'eeg': {'file': f"{session_id}.eeg.npy", 'n_samples': int(eeg.shape[0]),
+                    'n_channels': int(eeg.shape[1]), 'fs': int(fs)},
+            'ppg': None,
+        }
+        self._write_array(entry['eeg']['file'], eeg)
+        if ppg is not None and ppg.ndim == 2 and ppg.shape[0] > 0:
+            entry['ppg'] = {'file': f"{session_id}.ppg.npy", 'n_samples': int(ppg.shape[0]),
+                            'n_channels': int(ppg.shape[1]), 'fs': int(ppg_fs)}
+            self._write_array(entry['ppg']['file'], ppg)
+        if extra:
+            entry.update(extra)
+        self.index['sessions'][session_id] = entry
+        self._save_index()
+        return session_id
+
+    def import_npz(self, path, label=None, labels=('focused', 'unfocused'), **kwargs):
+        """Import a savez recording. Label defaults to the known label prefixing the file name."""
+        label = label or label_from_filename(path, labels)
+        with np.load(path, allow_pickle=True) as z:
+            eeg = z['eeg'] if 'eeg' in z else np.array([])
+            ppg = z['ppg'] if 'ppg' in z else None
+            extra = {'sources': [str(s) for s in z['sources']]} if 'sources' in z else None
+        return self.add(eeg, label, ppg=ppg, source=os.path.abspath(path),
+                        recorded_at=os.path.getmtime(path), extra=extra, **kwargs)
+
+    # ---------- Reading ----------
+    def sessions(self, label=None):
+        """Session ids, optionally restricted to one label, in index order."""
+        return [sid for sid, s in self.index['sessions'].items() if label is None or s['label'] == label]
+
+    def labels(self):
+        return sorted({s['label'] for s in self.index['sessions'].values()})
+
+    def info(self, session_id):
+        return self.index['sessions'][session_id]
+
+    def array(self, session_id, modality='eeg'):
+        """Read-only memory map of a session's EEG or PPG."""
+        key = (session_id, modality)
+        if key not in self._mmaps:
+            meta = self.index['sessions'][session_id][modality]
+            if meta is None:
+                raise KeyError(f"Session '{session_id}' has no {modality}")
+            self._mmaps[key] = np.load(os.path.join(self.root, meta['file']), mmap_mode='r')
+        return self._mmaps[key]
+
+    def read(self, session_id, start, stop, modality='eeg'):
+        """Copy of samples [start, stop); only those pages are read from disk."""
+        return np.array(self.array(session_id, modality)[start:stop])
+
+    def iter_windows(self, window_samps, step_samps, label=None, sessions=None):
+        """Yield (session_id, start, window view) for every hop of the selected sessions."""
+        for sid in sessions or self.sessions(label):
+            eeg = self.array(sid)
+            for start in range(0, eeg.shape[0] - window_samps + 1, step_samps):
+                yield sid, start, eeg[start:start + window_samps]
+
+    def sample_windows(self, n, window_samps, label=None, rng=None):
+        """`n` random windows (n, window_samps, channels) drawn across sessions of `label`."""
+        rng = rng or np.random.default_rng()
+        sids = [sid for sid in self.sessions(label)
+                if self.info(sid)['eeg']['n_samples'] >= window_samps]
+        if not sids:
+            raise ValueError(f"No sessions with at least {window_samps} samples for label={label}")
+        weights = np.array([self.info(sid)['eeg']['n_samples'] - window_samps + 1 for sid in sids], dtype=float)
+        picks = rng.choice(len(sids), size=n, p=weights / weights.sum())
+        out = np.empty((n, window_samps, self.info(sids[0])['eeg']['n_channels']), dtype=np.float32)
+        for i, k in enumerate(picks):
+            start = int(rng.integers(0, weights[k]))
+            out[i] = self.array(sids[k])[start:start + window_samps]
+        return out
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    parser = argparse.ArgumentParser(description="Manage a memory-mapped EEG session store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    imp = sub.add_parser("import", help="Import .npz recordings")
+    imp.add_argument("inputs", nargs="+")
+    imp.add_argument("--root", default="sessions")
+    imp.add_argument("--label", default=None, help="Label for all inputs (default: from file name)")
+    imp.add_argument("--labels", nargs="*", default=None, help="Known labels (default: label_map.json values)")
+
+    ls = sub.add_parser("list", help="List stored sessions")
+    ls.add_argument("--root", default="sessions")
+
+    args = parser.parse_args()
+    store = SessionStore(args.root)
+    if args.cmd == "import":
+        labels = args.labels
+        if labels is None:
+            try:
+                with open('label_map.json', 'r') as f:
+                    labels = list(json.load(f).values())
+            except Exception:
+                labels = ['focused', 'unfocused']
+        for path in args.inputs:
+            try:
+                sid = store.import_npz(path, label=args.label, labels=labels)
+                s = store.info(sid)
+                print(f"[INFO] {path} -> {sid} (label={s['label']}, eeg={s['eeg']['n_samples']} samples)")
+            except Exception as e:
+                print(f"[WARN] {path}: {e}", file=sys.stderr)
+    elif args.cmd == "list":
+        for sid, s in store.index['sessions'].items():
+            dur = s['eeg']['n_samples'] / s['eeg']['fs']
+            print(f"{sid:24s} {s['label']:12s} {dur:8.1f}s  {s['eeg']['n_channels']}ch  {s.get('source') or ''}")
+
+
+if __name__ == "__main__":
+    main()
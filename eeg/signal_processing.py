@@ -1,6 +1,14 @@
-from scipy.signal import welch, butter, lfilter, iirnotch
+from scipy.signal import welch, butter, lfilter, lfilter_zi, iirnotch
 import numpy as np
 
+BAND_LIMITS = {
+    'delta': (1, 4),
+    'theta': (4, 8),
+    'alpha': (8, 13),
+    'beta': (13, 30),
+    'gamma': (30, 50)
+}
+
 def design_bandpass(lowcut_hz, highcut_hz, sampling_rate, order=4):
     nyquist = 0.5 * sampling_rate
     low = lowcut_hz / nyquist
@@ -8,26 +16,51 @@ def design_bandpass(lowcut_hz, highcut_hz, sampling_rate, order=4):
     b, a = butter(order, [low, high], btype='band')
     return b, a
 
-def filter_eeg_signal(signal, sampling_rate):
-    b_notch, a_notch = iirnotch(60.0, 30.0, sampling_rate)
-    cleaned = lfilter(b_notch, a_notch, signal, axis=0)
-    b_bp, a_bp = design_bandpass(1.0, 50.0, sampling_rate)
-    filtered = lfilter(b_bp, a_bp, cleaned, axis=0)
+def design_eeg_filters(sampling_rate):
+    """Notch (60 Hz) and band-pass (1-50 Hz) coefficients used by filter_eeg_signal."""
+    return iirnotch(60.0, 30.0, sampling_rate), design_bandpass(1.0, 50.0, sampling_rate)
+
+def filter_eeg_signal(signal, sampling_rate, axis=0):
+    (b_notch, a_notch), (b_bp, a_bp) = design_eeg_filters(sampling_rate)
+    cleaned = lfilter(b_notch, a_notch, signal, axis=axis)
+    filtered = lfilter(b_bp, a_bp, cleaned, axis=axis)
     return filtered
 
-def extract_band_powers(window, sampling_rate):
-    band_limits = {
-        'delta': (1, 4),
-        'theta': (4, 8),
-        'alpha': (8, 13),
-        'beta': (13, 30),
-        'gamma': (30, 50)
-    }
+class StreamingEEGFilter:
+    """Chunk-by-chunk equivalent of filter_eeg_signal that carries filter state between calls."""
+
+    def __init__(self, sampling_rate, n_channels):
+        (self.b_notch, self.a_notch), (self.b_bp, self.a_bp) = design_eeg_filters(sampling_rate)
+        # Zero initial state, matching lfilter's default in filter_eeg_signal
+        self.zi_notch = np.zeros((len(lfilter_zi(self.b_notch, self.a_notch)), n_channels))
+        self.zi_bp = np.zeros((len(lfilter_zi(self.b_bp, self.a_bp)), n_channels))
+
+    def process(self, chunk):
+        cleaned, self.zi_notch = lfilter(self.b_notch, self.a_notch, chunk, axis=0, zi=self.zi_notch)
+        filtered, self.zi_bp = lfilter(self.b_bp, self.a_bp, cleaned, axis=0, zi=self.zi_bp)
+        return filtered
+
+def compute_log_psd(window, sampling_rate):
+    """Welch log10 PSD of a (samples, channels) window. Returns (freqs, log_psd[freqs, channels])."""
     max_seg = min(int(sampling_rate * 2), window.shape[0])
     freqs, psd = welch(window, sampling_rate, nperseg=max_seg, axis=0)
-    log_psd = np.log10(psd + 1e-12)
+    return freqs, np.log10(psd + 1e-12)
+
+def band_powers_from_log_psd(freqs, log_psd):
     powers = []
-    for low_hz, high_hz in band_limits.values():
+    for low_hz, high_hz in BAND_LIMITS.values():
         mask = np.logical_and(freqs >= low_hz, freqs < high_hz)
         powers.append(np.mean(log_psd[mask, :], axis=0))
-    return np.vstack(powers)
\ No newline at end of file
+    return np.vstack(powers)
+
+def extract_band_powers(window, sampling_rate):
+    freqs, log_psd = compute_log_psd(window, sampling_rate)
+    return band_powers_from_log_psd(freqs, log_psd)
+
+def extract_band_powers_batch(windows, sampling_rate):
+    """extract_band_powers over a stack of windows (n, samples, channels) -> (n, bands, channels)."""
+    max_seg = min(int(sampling_rate * 2), windows.shape[1])
+    freqs, psd = welch(windows, sampling_rate, nperseg=max_seg, axis=1)
+    log_psd = np.log10(psd + 1e-12)
+    return np.stack([log_psd[:, (freqs >= low_hz) & (freqs < high_hz), :].mean(axis=1)
+                     for low_hz, high_hz in BAND_LIMITS.values()], axis=1)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import struct
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+from signal_processing import StreamingEEGFilter, compute_log_psd, band_powers_from_log_psd, BAND_LIMITS
+
+# Binary column layout (little-endian):
+#   header  <dII : timestamp (unix seconds), n_freqs, n_channels
+#   bands   float32[len(BAND_LIMITS), n_channels]  band powers (same as extract_band_powers)
+#   log_psd float32[n_freqs, n_channels]           log10 PSD for freqs in [fmin, fmax]
+COLUMN_HEADER = struct.Struct('<dII')
+
+
+class RollingSpectrogram:
+    """Incremental STFT / band-power history fed with raw EEG chunks.
+
+    Samples are filtered with carried state, so each column costs one
+    periodogram over the newest `segment_sec` of filtered signal. Columns are
+    serialized once when produced and shared by every subscriber.
+    """
+
+    def __init__(self, fs=256, n_channels=5, segment_sec=2.0, hop_sec=0.25,
+                 history_sec=300.0, fmin=1.0, fmax=50.0):
+        self.fs = int(fs)
+        self.n_channels = int(n_channels)
+        self.seg_samps = int(segment_sec * self.fs)
+        self.hop_samps = max(1, int(hop_sec * self.fs))
+        self.filter = StreamingEEGFilter(self.fs, self.n_channels)
+
+        self._ring = np.zeros((self.seg_samps, self.n_channels), dtype=np.float64)
+        self._filled = 0
+        self._since_col = 0
+        self._lock = threading.Lock()
+
+        # Same grid _emit gets from compute_log_psd (Welch caps nperseg at 2 s, so not rfftfreq(seg_samps))
+        freqs, _ = compute_log_psd(np.zeros((self.seg_samps, 1)), self.fs)
+        self._freq_mask = (freqs >= fmin) & (freqs <= fmax)
+        self.freqs = freqs[self._freq_mask]
+
+        self.seq = 0
+        self.columns = deque(maxlen=max(1, int(history_sec * self.fs / self.hop_samps)))
+        self.latest_bands = None
+
+    def meta(self):
+        return {
+            'fs': self.fs,
+            'n_channels': self.n_channels,
+            'segment_samples': self.seg_samps,
+            'hop_samples': self.hop_samps,
+            'bands': list(BAND_LIMITS),
+            'freqs': self.freqs.tolist(),
+            'header': '<dII (timestamp, n_freqs, n_channels)',
+            'column_bytes': self.column_bytes(),
+        }
+
+    def column_bytes(self):
+        return COLUMN_HEADER.size + 4 * self.n_channels * (len(BAND_LIMITS) + len(self.freqs))
+
+    def update(self, chunk):
+        """Feed raw (samples, channels) EEG. Emits a column every hop once a segment is filled."""
+        chunk = np.asarray(chunk, dtype=np.float64)[:, :self.n_channels]
+        if chunk.shape[0] == 0:
+            return
+        filtered = self.filter.process(chunk)
+        pos = 0
+        while pos < filtered.shape[0]:
+            take = min(self.hop_samps - self._since_col, filtered.shape[0] - pos)
+            self._push(filtered[pos:pos + take])
+            pos += take
+            self._since_col += take
+            if self._since_col >= self.hop_samps:
+                self._since_col = 0
+                if self._filled >= self.seg_samps:
+                    self._emit()
+
+    def _push(self, block):
+        n = block.shape[0]
+        if n >= self.seg_samps:
+            self._ring[:] = block[-self.seg_samps:]
+        else:
+            self._ring = np.roll(self._ring, -n, axis=0)
+            self._ring[-n:] = block
+        self._filled = min(self.seg_samps, self._filled + n)
+
+    def _emit(self):
+        freqs, log_psd = compute_log_psd(self._ring, self.fs)
+        bands = band_powers_from_log_psd(freqs, log_psd).astype(np.float32)
+        cut = log_psd[self._freq_mask].astype(np.float32)
+        payload = (COLUMN_HEADER.pack(time.time(), cut.shape[0], self.n_channels)
+                   + bands.tobytes() + cut.tobytes())
+        with self._lock:
+            self.seq += 1
+            self.columns.append((self.seq, payload))
+            self.latest_bands = bands
+
+    def columns_since(self, seq):
+        """Serialized columns newer than `seq`, oldest first."""
+        with self._lock:
+            if not self.columns or self.columns[-1][0] <= seq:
+                return []
+            newer = min(len(self.columns), self.columns[-1][0] - seq)
+            return list(islice(self.columns, len(self.columns) - newer, None))
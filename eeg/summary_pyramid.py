@@ -0,0 +1,188 @@
+import threading
+import time
+
+import numpy as np
+
+
+class _Level:
+    """Ring of completed buckets (min/max/sum per channel) of a fixed size in samples."""
+
+    def __init__(self, bucket, capacity, n_channels):
+        self.bucket = bucket
+        self.capacity = capacity
+        self.mins = np.zeros((capacity, n_channels), dtype=np.float32)
+        self.maxs = np.zeros((capacity, n_channels), dtype=np.float32)
+        self.sums = np.zeros((capacity, n_channels), dtype=np.float64)
+        self.count = 0  # Buckets completed since start (absolute index of the next bucket)
+
+    def append(self, mins, maxs, sums):
+        n = mins.shape[0]
+        if n > self.capacity:
+            mins, maxs, sums = mins[-self.capacity:], maxs[-self.capacity:], sums[-self.capacity:]
+            self.count += n - self.capacity
+            n = self.capacity
+        idx = (self.count + np.arange(n)) % self.capacity
+        self.mins[idx] = mins
+        self.maxs[idx] = maxs
+        self.sums[idx] = sums
+        self.count += n
+
+    def oldest(self):
+        return max(0, self.count - self.capacity)
+
+    def take(self, first, last):
+        """Buckets with absolute index in [first, last)."""
+        idx = np.arange(first, last) % self.capacity
+        return self.mins[idx], self.maxs[idx], self.sums[idx]
+
+
+class SummaryPyramid:
+    """Multi-resolution min/max/mean summary of a multichannel stream.
+
+    Level k buckets hold `base * factor**k` samples and are built from level
+    k-1 as samples arrive, so a range query reads at most `factor` buckets per
+    output pixel. Raw samples are only read when the requested resolution is
+    finer than one level-0 bucket.
+    """
+
+    def __init__(self, fs=256, n_channels=5, history_sec=1800.0, raw_sec=120.0, base=8, factor=4):
+        self.fs = int(fs)
+        self.n_channels = int(n_channels)
+        self.base = int(base)
+        self.factor = int(factor)
+        self._lock = threading.Lock()
+
+        history = int(history_sec * self.fs)
+        self.levels = []
+        bucket = self.base
+        while True:
+            self.levels.append(_Level(bucket, history // bucket + 1, self.n_channels))
+            if bucket * self.factor > history:
+                break
+            bucket *= self.factor
+
+        self.raw_capacity = int(raw_sec * self.fs)
+        self._raw = np.zeros((self.raw_capacity, self.n_channels), dtype=np.float32)
+        self.n_samples = 0
+        self.last_time = None
+
+    # ---------- Ingest ----------
+    def update(self, chunk):
+        """Append (samples, channels) data and fold completed buckets upward."""
+        chunk = np.asarray(chunk, dtype=np.float32)[:, :self.n_channels]
+        n = chunk.shape[0]
+        if n == 0:
+            return
+        with self._lock:
+            keep = chunk[-self.raw_capacity:]
+            idx = (self.n_samples + n - keep.shape[0] + np.arange(keep.shape[0])) % self.raw_capacity
+            self._raw[idx] = keep
+            self.n_samples += n
+            self.last_time = time.time()
+
+            # Level 0 buckets completed by this chunk (only those still fully in the raw ring)
+            lvl0 = self.levels[0]
+            first = max(lvl0.count, -(-(self.n_samples - self.raw_capacity) // self.base))
+            complete = self.n_samples // self.base
+            if complete > first:
+                lvl0.count = first
+                span = np.arange(first * self.base, complete * self.base) % self.raw_capacity
+                blocks = self._raw[span].reshape(-1, self.base, self.n_channels)
+                lvl0.append(blocks.min(axis=1), blocks.max(axis=1), blocks.sum(axis=1, dtype=np.float64))
+                self._fold(0)
+
+    def _fold(self, k):
+        """Merge each completed group of `factor` level-k buckets into one level-(k+1) bucket."""
+        if k + 1 >= len(self.levels):
+            return
+        child, parent = self.levels[k], self.levels[k + 1]
+        first = max(parent.count, -(-child.oldest() // self.factor))
+        groups = child.count // self.factor - first
+        if groups <= 0:
+            return
+        mins, maxs, sums = child.take(first * self.factor, (first + groups) * self.factor)
+        shape = (groups, self.factor, self.n_channels)
+        parent.count = first
+        parent.append(mins.reshape(shape).min(axis=1), maxs.reshape(shape).max(axis=1),
+                      sums.reshape(shape).sum(axis=1))
+        self._fold(k + 1)
+
+    # ---------- Query ----------
+    def _partial(self, k, lo, end):
+        """(min, max, sum, n) over samples [lo, end) that no completed level-k bucket covers yet,
+        built from the finer levels and the raw ring; `lo` is a level-k bucket boundary."""
+        parts, n = [], 0
+        for j in range(k - 1, -1, -1):
+            lvl = self.levels[j]
+            a, b = lo // lvl.bucket, min(end // lvl.bucket, lvl.count)
+            if b > a:
+                mins, maxs, sums = lvl.take(a, b)
+                parts.append((mins.min(axis=0), maxs.max(axis=0), sums.sum(axis=0)))
+                n += (b - a) * lvl.bucket
+                lo = b * lvl.bucket
+        lo = max(lo, self.n_samples - self.raw_capacity)
+        if end > lo:
+            data = self._raw[np.arange(lo, end) % self.raw_capacity]
+            parts.append((data.min(axis=0), data.max(axis=0), data.sum(axis=0, dtype=np.float64)))
+            n += end - lo
+        if not parts:
+            return None
+        mins, maxs, sums = zip(*parts)
+        return np.min(mins, axis=0), np.max(maxs, axis=0), np.sum(sums, axis=0), n
+
+    def query(self, since_sec, until_sec=0.0, width=800):
+        """Summarize [now - since_sec, now - until_sec] into `width` columns of min/max/mean per channel.
+
+        Completed buckets of the chosen level are followed by one partial bucket for the newest
+        samples not folded into that level yet, so the right edge is always current."""
+        width = max(1, int(width))
+        with self._lock:
+            end = self.n_samples - int(until_sec * self.fs)
+            start = max(0, self.n_samples - int(since_sec * self.fs))
+            if end <= start:
+                return None
+            per_pixel = (end - start) / width
+
+            if per_pixel < self.base and start >= self.n_samples - self.raw_capacity:
+                idx = np.arange(start, end) % self.raw_capacity
+                data = self._raw[idx]
+                mins, maxs, sums = data, data, data.astype(np.float64)
+                weights = np.ones(len(data), dtype=np.int64)
+                first = start
+                source = 'raw'
+            else:
+                k = 0
+                for i, candidate in enumerate(self.levels):
+                    if candidate.bucket <= per_pixel and candidate.count > 0:
+                        k = i
+                level = self.levels[k]
+                first = max(start // level.bucket, level.oldest())
+                last = max(first, min(-(-end // level.bucket), level.count))
+                mins, maxs, sums = level.take(first, last)
+                weights = np.full(last - first, level.bucket, dtype=np.int64)
+                if last >= level.count and end > last * level.bucket:
+                    tail = self._partial(k, max(last, first) * level.bucket, end)
+                    if tail is not None:
+                        mins = np.vstack([mins, tail[0][None]])
+                        maxs = np.vstack([maxs, tail[1][None]])
+                        sums = np.vstack([sums, tail[2][None]])
+                        weights = np.append(weights, tail[3])
+                if len(weights) == 0:
+                    return None
+                first *= level.bucket
+                source = f"level{k}"
+
+            n = mins.shape[0]
+            cols = min(width, n)
+            edges = (np.arange(cols) * n) // cols
+            counts = np.add.reduceat(weights, edges)[:, None]
+            result = {
+                'start_sec': (first - self.n_samples) / self.fs,
+                'end_sec': (first + int(weights.sum()) - self.n_samples) / self.fs,
+                'samples_per_column': float(weights.sum()) / cols,
+                'min': np.minimum.reduceat(mins, edges, axis=0).tolist(),
+                'max': np.maximum.reduceat(maxs, edges, axis=0).tolist(),
+                'mean': (np.add.reduceat(sums, edges, axis=0) / counts).tolist(),
+                'source': source,
+            }
+        return result
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Parallel hyperparameter / windowing sweep.
+
+Features are computed once per distinct (window_sec, step_sec) and cached,
+keyed also on the emotions, fs and recording files; every model config that
+uses that windowing trains from the cached matrix in a process pool. Results
+(accuracy, model size, feature and model latency) go to a CSV table sorted by
+accuracy.
+
+Example grid file:
+    {"window_sec": [6, 8], "step_sec": [1], "model": ["lstm", "rf"],
+     "hidden_size": [64, 128], "dropout": [0.5], "rf_max_depth": [null, 20]}
+"""
+import argparse
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_GRID = {
+    'window_sec': [6.0, 8.0],
+    'step_sec': [1.0],
+    'model': ['lstm', 'rf'],
+    'hidden_size': [64, 128],
+    'dropout': [0.5],
+    'rf_max_depth': [None, 20],
+}
+FIELDS = ['window_sec', 'step_sec', 'model', 'hidden_size', 'dropout', 'rf_max_depth',
+          'n_train', 'n_val', 'val_acc', 'model_bytes', 'feature_ms', 'model_ms', 'total_ms', 'train_sec']
+
+
+def expand_grid(grid):
+    """One dict per config; LSTM-only and RF-only keys are not crossed with the other model."""
+    grid = {**DEFAULT_GRID, **grid}
+    configs = []
+    for window, step in itertools.product(grid['window_sec'], grid['step_sec']):
+        for model in grid['model']:
+            if model == 'lstm':
+                for hidden, dropout in itertools.product(grid['hidden_size'], grid['dropout']):
+                    configs.append({'window_sec': float(window), 'step_sec': float(step), 'model': 'lstm',
+                                    'hidden_size': int(hidden), 'dropout': float(dropout), 'rf_max_depth': None})
+            elif model == 'rf':
+                for depth in grid['rf_max_depth']:
+                    configs.append({'window_sec': float(window), 'step_sec': float(step), 'model': 'rf',
+                                    'hidden_size': None, 'dropout': None, 'rf_max_depth': depth})
+            else:
+                raise ValueError(f"Unknown model '{model}' (expected 'lstm' or 'rf')")
+    return configs
+
+
+# -----------------------
+# Features (shared per windowing)
+# -----------------------
+def feature_cache_path(cache_dir, window_sec, step_sec, emotions, fs):
+    """Cache file keyed by windowing plus everything else the features depend on: the emotion
+    list, fs, and each recording's size and mtime (so re-recording invalidates the cache)."""
+    inputs = []
+    for emo in emotions:
+        try:
+            st = os.stat(f"{emo}.npz")
+            inputs.append((emo, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            inputs.append((emo, None, None))
+    digest = hashlib.sha1(json.dumps([fs, inputs]).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"features_w{window_sec:g}_s{step_sec:g}_{digest}.npz")
+
+
+def build_features(emotions, window_sec, step_sec, fs, cache_dir, workers):
+    from data_clean import build_dataset_parallel, load_and_filter, create_feature_dataset
+    path = feature_cache_path(cache_dir, window_sec, step_sec, emotions, fs)
+    if os.path.exists(path):
+        print(f"[INFO] Using cached features {path}")
+        return path
+    if workers == 1:
+        X, y, labels = create_feature_dataset(load_and_filter(emotions, fs), window_sec, step_sec, fs)
+    else:
+        X, y, labels = build_dataset_parallel(emotions, window_sec, step_sec, fs, workers=workers)
+    np.savez(path, X=X, y=y, labels=json.dumps(labels))
+    return path
+
+
+def feature_latency_ms(window_sec, fs, repeats=50):
+    """Median filter + band-power time for one window of this length."""
+    from signal_processing import filter_eeg_signal, extract_band_powers
+    window = np.random.default_rng(0).normal(size=(int(window_sec * fs), 5))
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        extract_band_powers(filter_eeg_signal(window, fs), fs)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+# -----------------------
+# Model training (runs in worker processes)
+# -----------------------
+def _split(X, y):
+    from sklearn.model_selection import train_test_split
+    X = np.nan_to_num(X, nan=0.0, neginf=-12.0, posinf=12.0)
+    return train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+
+def _median_latency_ms(fn, repeats=200):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+def _train_lstm(X_train, X_val, y_train, y_val, cfg, epochs, batch_size):
+    import torch
+    import torch.nn as nn
+    from torch import optim
+    from sklearn.preprocessing import StandardScaler
+    from model import HemiAttentionLSTM
+    from train import to_model_input, train_one_epoch, predict_labels
+
+    torch.set_num_threads(1)  # One core per worker; the pool provides the parallelism
+    torch.manual_seed(42)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_val = scaler.transform(X_val)
+    num_classes = int(max(y_train.max(), y_val.max())) + 1
+    device = torch.device('cpu')
+
+    Xt = torch.from_numpy(to_model_input(X_train).astype(np.float32))
+    yt = torch.from_numpy(y_train.astype(np.int64))
+    Xv = torch.from_numpy(to_model_input(X_val).astype(np.float32))
+    yv = torch.from_numpy(y_val.astype(np.int64))
+    counts = np.bincount(y_train, minlength=num_classes)
+    weights = torch.from_numpy((1. / np.clip(counts, 1, None))[y_train])
+
+    model = HemiAttentionLSTM(input_size=5, hidden_size=cfg['hidden_size'], num_classes=num_classes,
+                              dropout=cfg['dropout'])
+    optimizer = optim.Adam(model.parameters(), lr=5e-4, weight_decay=1e-5)
+    criterion = nn.CrossEntropyLoss()
+
+    def train_batches():
+        order = torch.multinomial(weights, len(weights), replacement=True)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            yield Xt[idx], yt[idx]
+
+    best_acc, best_state = -1.0, None
+    for _ in range(epochs):
+        train_one_epoch(model, optimizer, criterion, train_batches(), device)
+        preds, labels = predict_labels(model, [(Xv, yv)], device)
+        acc = (preds == labels).float().mean().item()
+        if acc > best_acc:
+            best_acc = acc
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+
+    model.load_state_dict(best_state)
+    model.eval()
+    buf = io.BytesIO()
+    torch.save(best_state, buf)
+    x1 = Xv[:1]
+
+    def one():
+        with torch.no_grad():
+            model(x1)
+    return best_acc, buf.getbuffer().nbytes, _median_latency_ms(one)
+
+
+def _train_rf(X_train, X_val, y_train, y_val, cfg, n_estimators):
+    from joblib import dump
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.utils.class_weight import compute_class_weight
+
+    classes = np.unique(y_train)
+    cw = compute_class_weight(class_weight='balanced', classes=classes, y=y_train)
+    rf = RandomForestClassifier(
+        n_estimators=n_estimators,
+        max_depth=cfg['rf_max_depth'],
+        max_features='sqrt',
+        n_jobs=1,
+        class_weight={int(c): float(w) for c, w in zip(classes, cw)},
+        random_state=42,
+    )
+    rf.fit(X_train, y_train)
+    acc = float((rf.predict(X_val) == y_val).mean())
+    buf = io.BytesIO()
+    dump(rf, buf)
+    x1 = X_val[:1]
+    return acc, buf.getbuffer().nbytes, _median_latency_ms(lambda: rf.predict_proba(x1), repeats=50)
+
+
+def run_config(cfg, features_path, epochs, batch_size, n_estimators):
+    with np.load(features_path) as z:
+        X, y = z['X'], z['y']
+    X_train, X_val, y_train, y_val = _split(X, y)
+    t0 = time.perf_counter()
+    if cfg['model'] == 'lstm':
+        acc, size, model_ms = _train_lstm(X_train, X_val, y_train, y_val, cfg, epochs, batch_size)
+    else:
+        acc, size, model_ms = _train_rf(X_train, X_val, y_train, y_val, cfg, n_estimators)
+    return {**cfg, 'n_train': len(y_train), 'n_val': len(y_val), 'val_acc': acc,
+            'model_bytes': size, 'model_ms': model_ms, 'train_sec': time.perf_counter() - t0}
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    parser = argparse.ArgumentParser(description="Parallel window/hyperparameter sweep")
+    parser.add_argument('--grid', default=None, help='JSON file with parameter lists (see module docstring)')
+    parser.add_argument('--emotions', nargs='+', default=['focused', 'unfocused'])
+    parser.add_argument('--fs', type=int, default=256)
+    parser.add_argument('--epochs', type=int, default=30, help='LSTM epochs per config')
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--rf-trees', type=int, default=600)
+    parser.add_argument('--workers', type=int, default=0, help='Worker processes (0 = one per core)')
+    parser.add_argument('--cache', default='sweep_cache', help='Directory for per-windowing feature files')
+    parser.add_argument('--out', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            grid = json.load(f)
+    configs = expand_grid(grid)
+    workers = args.workers or os.cpu_count() or 1
+    os.makedirs(args.cache, exist_ok=True)
+
+    windowings = sorted({(c['window_sec'], c['step_sec']) for c in configs})
+    print(f"[INFO] {len(configs)} configs over {len(windowings)} windowings, {workers} workers")
+    features, feature_ms = {}, {}
+    for window, step in windowings:
+        features[(window, step)] = build_features(args.emotions, window, step, args.fs, args.cache, workers)
+        feature_ms[window] = feature_ms.get(window) or feature_latency_ms(window, args.fs)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_config, cfg, features[(cfg['window_sec'], cfg['step_sec'])],
+                               args.epochs, args.batch_size, args.rf_trees) for cfg in configs]
+        for cfg, fut in zip(configs, futures):
+            try:
+                row = fut.result()
+            except Exception as e:
+                print(f"[WARN] Config {cfg} failed: {e}")
+                continue
+            row['feature_ms'] = feature_ms[row['window_sec']]
+            row['total_ms'] = row['feature_ms'] + row['model_ms']
+            results.append(row)
+            print(f"[INFO] {row['model']:4s} w={row['window_sec']:g}s s={row['step_sec']:g}s "
+                  f"h={row['hidden_size']} d={row['dropout']} depth={row['rf_max_depth']} "
+                  f"-> acc={row['val_acc']:.4f} size={row['model_bytes'] / 1024:.0f}KB "
+                  f"latency={row['total_ms']:.2f}ms")
+
+    results.sort(key=lambda r: (-r['val_acc'], r['total_ms']))
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in results:
+            writer.writerow({k: row.get(k) for k in FIELDS})
+    print(f"[INFO] Wrote {len(results)} results to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
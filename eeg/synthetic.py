@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Synthetic EEG / PPG sources that stand in for muselsl LSL inlets.
+
+SyntheticEEG produces multichannel EEG at any rate and channel count:
+  - band oscillators (delta..gamma) whose amplitudes follow a focused or
+    unfocused regime (focused: more beta/gamma, less alpha/theta),
+  - 1/f-like background noise (first-order IIR on white noise),
+  - 60 Hz line noise,
+  - random blink, jaw-clench and motion artifacts.
+SyntheticPPG produces a matching pulse waveform (systolic peak plus dicrotic
+wave, baseline wander) whose heart rate drifts with the regime.
+
+SyntheticInlet wraps either generator behind the parts of pylsl.StreamInlet
+the code uses (info(), pull_chunk()). It paces samples by wall clock, or
+returns them as fast as they are asked for with realtime=False. Pass one as
+EEGMoodDetector(source=...) or DetectorManager.add_inlet(...), or set
+EEG_SOURCE=synthetic for backend.py.
+
+    python synthetic.py --streams 1000 --seconds 10          # bulk generation throughput
+    python synthetic.py --seconds 600 --save synthetic.npz   # recording for offline tools
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+from signal_processing import BAND_LIMITS
+
+# Band amplitudes in uV per regime, in BAND_LIMITS order (delta, theta, alpha, beta, gamma)
+REGIME_AMPLITUDES = {
+    'focused': np.array([10.0, 5.0, 3.0, 9.0, 3.0]),
+    'unfocused': np.array([12.0, 9.0, 12.0, 2.5, 1.0]),
+}
+FRONTAL = (1, 2)  # AF7, AF8 in Muse channel order; blinks show up here
+_ids = itertools.count()
+
+
+class SyntheticStreamInfo:
+    """Just enough of pylsl.StreamInfo for the detectors and the hub."""
+
+    def __init__(self, name, stream_type, channel_count, nominal_srate, source_id):
+        self._name, self._type = name, stream_type
+        self._channel_count, self._srate, self._source_id = channel_count, nominal_srate, source_id
+
+    def name(self): return self._name
+    def type(self): return self._type
+    def channel_count(self): return self._channel_count
+    def nominal_srate(self): return self._srate
+    def source_id(self): return self._source_id
+    def hostname(self): return 'synthetic'
+
+
+class SyntheticEEG:
+    """Vectorized EEG generator; generate(n) returns the next n samples (n, channels) in uV.
+
+    With n_streams set, every call advances that many independent headsets at once
+    and returns (n_streams, n, channels).
+    """
+
+    def __init__(self, fs=256, n_channels=5, regime='focused', regime_sec=None, line_noise_uv=3.0,
+                 noise_uv=6.0, artifact_rate=0.05, aux_channels=1, oscillators_per_band=4, n_streams=None,
+                 seed=None):
+        self.fs = fs
+        self.n_channels = n_channels
+        self.n_streams = n_streams
+        self.regimes = ['focused', 'unfocused']
+        self.regime = regime
+        self.regime_sec = regime_sec  # Alternate regimes every regime_sec seconds when set
+        self.line_noise_uv = line_noise_uv
+        self.noise_uv = noise_uv
+        self.artifact_rate = artifact_rate  # Artifacts per second per stream
+        self.aux_channels = aux_channels    # Trailing channels left at zero, like Muse's unconnected AUX
+        self.rng = np.random.default_rng(seed)
+        self.n = 0
+
+        # Oscillators spread across each band, with per-stream/channel frequency jitter,
+        # phase and gain so channels and headsets are not identical
+        S, k = n_streams or 1, oscillators_per_band
+        lo = np.array([b[0] for b in BAND_LIMITS.values()], dtype=float)
+        hi = np.array([b[1] for b in BAND_LIMITS.values()], dtype=float)
+        self.band_of = np.repeat(np.arange(len(lo)), k)  # Band index of each oscillator
+        slot = (hi - lo)[self.band_of] / k
+        base = lo[self.band_of] + slot * (np.tile(np.arange(k), len(lo)) + 0.5)
+        self.freqs = base[None, :, None] + self.rng.uniform(-0.4, 0.4, (S, len(base), n_channels)) * slot[None, :, None]
+        self.phases = self.rng.uniform(0, 2 * np.pi, self.freqs.shape)
+        # Amplitudes are split across a band's oscillators so band power matches REGIME_AMPLITUDES
+        self.gains = self.rng.uniform(0.8, 1.2, self.freqs.shape) / np.sqrt(k)
+        self.line_phase = self.rng.uniform(0, 2 * np.pi, (S, 1, n_channels))
+        self._noise_zi = np.zeros((S, 1, n_channels))
+        self._artifacts = []  # [stream, kind, start_sample, length, amplitude]
+
+    def regime_at(self, sample):
+        if not self.regime_sec:
+            return self.regime
+        return self.regimes[int(sample / (self.regime_sec * self.fs)) % 2]
+
+    @property
+    def current_regime(self):
+        return self.regime_at(self.n)
+
+    def _schedule_artifacts(self, n, S):
+        for stream in np.flatnonzero(self.rng.poisson(self.artifact_rate * n / self.fs, S)):
+            kind = self.rng.choice(['blink', 'clench', 'motion'], p=[0.6, 0.25, 0.15])
+            length = int(self.fs * {'blink': 0.3, 'clench': 0.8, 'motion': 1.5}[kind])
+            amp = {'blink': 150.0, 'clench': 60.0, 'motion': 200.0}[kind] * self.rng.uniform(0.7, 1.5)
+            self._artifacts.append([stream, kind, self.n + int(self.rng.integers(0, n)), length, amp])
+
+    def _add_artifacts(self, x):
+        n = x.shape[1]
+        frontal = [c for c in FRONTAL if c < self.n_channels]
+        keep = []
+        for art in self._artifacts:
+            stream, kind, start, length, amp = art
+            lo, hi = max(start, self.n), min(start + length, self.n + n)
+            if hi > lo:
+                s = np.arange(lo, hi) - start
+                rows = slice(lo - self.n, hi - self.n)
+                if kind == 'blink':
+                    x[stream][rows, frontal] += (amp * np.sin(np.pi * s / length))[:, None]
+                elif kind == 'clench':
+                    x[stream, rows] += amp * self.rng.standard_normal((hi - lo, self.n_channels))
+                else:
+                    x[stream, rows] += (amp * np.sin(2 * np.pi * 0.8 * s / self.fs))[:, None]
+            if start + length > self.n + n:
+                keep.append(art)
+        self._artifacts = keep
+
+    def generate(self, n):
+        S = self.n_streams or 1
+        idx = self.n + np.arange(n)
+        t = idx / self.fs
+        table = np.stack([REGIME_AMPLITUDES[r] for r in self.regimes])
+        if self.regime_sec:
+            amps = table[(idx // int(self.regime_sec * self.fs)) % 2]  # (n, bands)
+        else:
+            amps = np.broadcast_to(REGIME_AMPLITUDES[self.regime], (n, len(BAND_LIMITS)))
+        # (streams, n, oscillators, channels) sinusoids weighted by regime amplitude and gain
+        osc = np.sin(2 * np.pi * self.freqs[:, None] * t[None, :, None, None] + self.phases[:, None])
+        x = np.einsum('snoc,soc,no->snc', osc, self.gains, amps[:, self.band_of])
+
+        white = self.rng.standard_normal((S, n, self.n_channels)) * self.noise_uv
+        pink, self._noise_zi = lfilter([1.0], [1.0, -0.95], white, axis=1, zi=self._noise_zi)
+        x += pink * np.sqrt(1 - 0.95 ** 2) * 3
+        x += self.line_noise_uv * np.sin(2 * np.pi * 60.0 * t[None, :, None] + self.line_phase)
+
+        if self.artifact_rate:
+            self._schedule_artifacts(n, S)
+            self._add_artifacts(x)
+        if self.aux_channels:
+            x[:, :, self.n_channels - self.aux_channels:] = 0.0
+        self.n += n
+        x = x.astype(np.float32)
+        return x if self.n_streams else x[0]
+
+
+class SyntheticPPG:
+    """Pulse waveform (n, channels) whose heart rate follows an EEG generator's regime.
+
+    n_streams works as in SyntheticEEG; each stream gets its own heart rate.
+    """
+
+    def __init__(self, fs=64, n_channels=3, eeg=None, hr_bpm=None, n_streams=None, seed=None):
+        self.fs = fs
+        self.n_channels = n_channels
+        self.eeg = eeg
+        self.hr_bpm = hr_bpm  # Fixed rate; otherwise focused ~72, unfocused ~64 bpm with drift
+        self.n_streams = n_streams
+        self.rng = np.random.default_rng(seed)
+        self.n = 0
+        S = n_streams or 1
+        self._beat_phase = self.rng.uniform(0, 1, S)
+        self._hr = np.full(S, float(hr_bpm or 68.0)) + self.rng.normal(0, 3, S)
+        self.offsets = np.linspace(1000.0, 3000.0, n_channels)
+        self.gains = np.linspace(1.0, 0.6, n_channels)
+
+    @property
+    def current_hr(self):
+        return self._hr if self.n_streams else float(self._hr[0])
+
+    def _target_hr(self):
+        if self.hr_bpm:
+            return self.hr_bpm
+        regime = self.eeg.regime_at(int(self.n / self.fs * self.eeg.fs)) if self.eeg else 'focused'
+        return 72.0 if regime == 'focused' else 64.0
+
+    def generate(self, n):
+        S = len(self._hr)
+        # Heart rate relaxes toward the regime target with a little jitter
+        self._hr += (self._target_hr() - self._hr) * min(1.0, n / (5.0 * self.fs)) + self.rng.normal(0, 0.2, S)
+        phase = self._beat_phase[:, None] + np.arange(1, n + 1)[None] * (self._hr / 60.0 / self.fs)[:, None]
+        self._beat_phase = phase[:, -1] % 1.0
+        p = phase % 1.0
+        pulse = np.exp(-((p - 0.15) / 0.06) ** 2) + 0.35 * np.exp(-((p - 0.45) / 0.08) ** 2)
+        t = (self.n + np.arange(n)) / self.fs
+        wander = 0.2 * np.sin(2 * np.pi * 0.25 * t)
+        x = self.offsets + 100.0 * self.gains * (pulse + wander[None])[:, :, None]
+        x += self.rng.standard_normal((S, n, self.n_channels)) * 2.0
+        self.n += n
+        x = x.astype(np.float32)
+        return x if self.n_streams else x[0]
+
+
+class SyntheticInlet:
+    """pylsl.StreamInlet stand-in backed by a SyntheticEEG / SyntheticPPG generator."""
+
+    def __init__(self, generator, stream_type='EEG', name=None, source_id=None, realtime=True, as_list=True):
+        self.generator = generator
+        self.realtime = realtime
+        self.as_list = as_list  # Lists of lists like pylsl; False returns numpy arrays (faster)
+        uid = next(_ids)
+        self._info = SyntheticStreamInfo(name or f"Synthetic{stream_type}-{uid}", stream_type,
+                                         generator.n_channels, generator.fs,
+                                         source_id or f"synthetic-{stream_type.lower()}-{uid}")
+        self._t0 = time.time()
+        self._down_until = None
+
+    def info(self):
+        return self._info
+
+    def outage(self, seconds):
+        """Simulate a dropped headset: no samples for `seconds`, and those samples are lost."""
+        self._down_until = time.time() + seconds
+
+    def pull_chunk(self, timeout=0.0, max_samples=1024):
+        fs = self.generator.fs
+        if self._down_until is not None:
+            if time.time() < self._down_until:
+                time.sleep(max(0.0, min(timeout or 0.0, self._down_until - time.time())))
+                return ([], []) if self.as_list else (np.empty((0, self.generator.n_channels), np.float32), [])
+            self._t0 = time.time() - self.generator.n / fs  # Resume now; the outage's samples are gone
+            self._down_until = None
+        if self.realtime:
+            deadline = time.time() + (timeout or 0.0)
+            while True:
+                due = int((time.time() - self._t0) * fs) - self.generator.n
+                if due > 0 or time.time() >= deadline:
+                    break
+                time.sleep(min(1.0 / fs * 4, max(0.0, deadline - time.time())))
+            n = min(max(due, 0), max_samples)
+        else:
+            n = max_samples
+        if n <= 0:
+            return ([], []) if self.as_list else (np.empty((0, self.generator.n_channels), np.float32), [])
+        start = self.generator.n
+        chunk = self.generator.generate(n)
+        stamps = self._t0 + (start + np.arange(n)) / fs
+        if self.as_list:
+            return chunk.tolist(), stamps.tolist()
+        return chunk, stamps
+
+
+def synthetic_pair(fs=256, ppg_fs=64, realtime=True, seed=None, **eeg_kwargs):
+    """(eeg_inlet, ppg_inlet) sharing one regime, like one simulated headset."""
+    eeg = SyntheticEEG(fs=fs, seed=seed, **eeg_kwargs)
+    ppg = SyntheticPPG(fs=ppg_fs, eeg=eeg, seed=None if seed is None else seed + 1)
+    eeg_inlet = SyntheticInlet(eeg, 'EEG', realtime=realtime)
+    ppg_inlet = SyntheticInlet(ppg, 'PPG', source_id=eeg_inlet.info().source_id() + '-ppg', realtime=realtime)
+    return eeg_inlet, ppg_inlet
+
+
+# -----------------------
+# CLI
+# -----------------------
+def main():
+    from signal_processing import filter_eeg_signal, extract_band_powers
+    parser = argparse.ArgumentParser(description="Synthetic EEG/PPG generator")
+    parser.add_argument('--streams', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fs', type=int, default=256)
+    parser.add_argument('--channels', type=int, default=5)
+    parser.add_argument('--chunk', type=int, default=12, help='Samples per pull, like a live inlet')
+    parser.add_argument('--regime-sec', type=float, default=30.0)
+    parser.add_argument('--save', default=None, help='Write stream 0 as an .npz recording (eeg, ppg)')
+    args = parser.parse_args()
+
+    eeg = SyntheticEEG(fs=args.fs, n_channels=args.channels, regime_sec=args.regime_sec,
+                       n_streams=args.streams, seed=0)
+    ppg = SyntheticPPG(eeg=eeg, n_streams=args.streams, seed=1)
+    n_total = int(args.seconds * args.fs)
+    eeg0, ppg0 = [], []
+    t0 = time.perf_counter()
+    for _ in range(0, n_total, args.chunk):
+        block = eeg.generate(args.chunk)
+        eeg0.append(block[0])
+        ppg0.append(ppg.generate(max(1, args.chunk * ppg.fs // args.fs))[0])
+    elapsed = time.perf_counter() - t0
+    rate = args.streams * args.seconds / elapsed
+    print(f"[INFO] {args.streams} streams x {args.seconds:g}s ({args.chunk}-sample chunks) in {elapsed:.2f}s: "
+          f"{rate:.0f} stream-seconds/s, enough for ~{int(rate)} live streams on one core")
+
+    eeg0 = np.concatenate(eeg0)
+    win = int(6 * args.fs)
+    for regime in ('focused', 'unfocused'):
+        starts = [s for s in range(0, len(eeg0) - win, args.fs) if eeg.regime_at(s) == regime
+                  and eeg.regime_at(s + win - 1) == regime]
+        if starts:
+            bp = np.mean([extract_band_powers(filter_eeg_signal(eeg0[s:s + win], args.fs), args.fs)[:, :4]
+                          for s in starts[:50]], axis=(0, 2))
+            print(f"[INFO] {regime:9s} mean log band power " +
+                  " ".join(f"{b}:{v:.2f}" for b, v in zip(BAND_LIMITS, bp)))
+    if args.save:
+        np.savez(args.save, eeg=eeg0, ppg=np.concatenate(ppg0))
+        print(f"[INFO] Saved stream 0 to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
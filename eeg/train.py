@@ -1,15 +1,17 @@
 import argparse
+import os
+import time
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import torch
-from torch.utils.data import Dataset, DataLoader, WeightedRandomSampler
 from torch import optim
 from model import HemiAttentionLSTM
 from sklearn.preprocessing import StandardScaler
 import json
 from joblib import dump
 import torch.nn as nn
+from feature_io import load_features, fit_scaler_chunked, iter_batches, peak_rss_mb
 
 class FocalLoss(nn.Module):
     def __init__(self, alpha=None, gamma=2.0, reduction='mean'):
@@ -28,20 +30,53 @@ class FocalLoss(nn.Module):
             return loss.sum()
         return loss
 
-class EEGFeatureDataset(Dataset):
-    def __init__(self, X, y):
-        self.X = X.reshape(-1, 5, 5).transpose(0, 2, 1).astype(np.float32)
-        self.y = y.astype(np.int64)
-
-    def __len__(self):
-        return len(self.y)
-
-    def __getitem__(self, i):
-        return self.X[i], self.y[i]
-
-def run_training():
-    X = np.load('X.npy')
-    y = np.load('y.npy')
+def to_model_input(xb):
+    """(batch, 25) band powers -> (batch, channels, bands) as the model expects."""
+    return np.ascontiguousarray(xb.reshape(-1, 5, 5).transpose(0, 2, 1))
+
+def train_one_epoch(model, optimizer, criterion, batches, device):
+    model.train()
+    for xb, yb in batches:
+        xb, yb = xb.to(device), yb.to(device)
+        preds = model(xb)
+        loss = criterion(preds, yb)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+def predict_labels(model, batches, device):
+    """Predicted and true labels for all batches, concatenated on the device."""
+    model.eval()
+    all_preds, all_labels = [], []
+    with torch.no_grad():
+        for xb, yb in batches:
+            xb, yb = xb.to(device), yb.to(device)
+            all_preds.append(model(xb).argmax(dim=1))
+            all_labels.append(yb)
+    # Metrics stay on the device; callers read back only what they need
+    return torch.cat(all_preds), torch.cat(all_labels)
+
+def select_device(name='auto'):
+    if name == 'auto':
+        name = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.device(name)
+
+def run_training(x_path='X.npy', y_path='y.npy', mmap=False, batch_size=128, device='auto',
+                 epochs=149, threads=None):
+    """Train HemiAttentionLSTM.
+
+    In memory, the scaled training and validation sets live on the device as
+    pre-shaped tensors; each epoch draws class-balanced indices with
+    torch.multinomial and slices batches from them. With mmap=True X stays on
+    disk: the scaler is fitted with partial_fit over chunks and every batch is
+    read, cleaned and scaled on demand.
+    """
+    device = select_device(device)
+    if device.type == 'cpu':
+        torch.set_num_threads(threads or os.cpu_count() or 1)
+    print(f"[INFO] Device: {device} (intra-op threads: {torch.get_num_threads()})")
+
+    X, y = load_features(x_path, y_path, mmap=mmap)
 
     feat_params = {'window_sec': 8.0, 'step_sec': 1.0, 'fs': 256}
     try:
@@ -59,30 +94,53 @@ def run_training():
 
     num_classes = len(emotion_map)
     
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42)
-
-    X_train = np.nan_to_num(X_train, nan=0.0, neginf=-12.0, posinf=12.0)
-    X_val = np.nan_to_num(X_val, nan=0.0, neginf=-12.0, posinf=12.0)
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)
-    X_val = scaler.transform(X_val)
-
-    train_ds = EEGFeatureDataset(X_train, y_train)
-    val_ds   = EEGFeatureDataset(X_val, y_val)
+    # Split indices (same partition as splitting X itself) so X is never copied whole
+    train_idx, val_idx = train_test_split(
+        np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+    y_train = y[train_idx]
 
     class_counts   = np.bincount(y_train, minlength=num_classes)
     class_weights  = 1. / np.clip(class_counts, 1, None)
-    sample_weights = np.array([class_weights[t] for t in y_train])
-        
-    sampler = WeightedRandomSampler(
-        weights=torch.from_numpy(sample_weights),
-        num_samples=len(sample_weights),
-        replacement=True)
-    train_loader = DataLoader(train_ds, batch_size=128, sampler=sampler)
-    val_loader   = DataLoader(val_ds, batch_size=128)
-
-    device = torch.device('cuda')
+    sample_weights = class_weights[y_train]
+
+    weights_t = torch.from_numpy(sample_weights).to(device)
+
+    def balanced_order():
+        return torch.multinomial(weights_t, len(weights_t), replacement=True)
+
+    if mmap:
+        scaler = fit_scaler_chunked(X, train_idx)
+
+        def train_loader():
+            order = train_idx[balanced_order().cpu().numpy()]
+            for xb, yb in iter_batches(X, y, order, batch_size, scaler):
+                yield torch.from_numpy(to_model_input(xb)), torch.from_numpy(yb.astype(np.int64))
+
+        def val_loader():
+            for xb, yb in iter_batches(X, y, val_idx, batch_size, scaler):
+                yield torch.from_numpy(to_model_input(xb)), torch.from_numpy(yb.astype(np.int64))
+    else:
+        X_train = np.nan_to_num(X[train_idx], nan=0.0, neginf=-12.0, posinf=12.0)
+        X_val = np.nan_to_num(X[val_idx], nan=0.0, neginf=-12.0, posinf=12.0)
+        scaler = StandardScaler()
+        X_train = scaler.fit_transform(X_train)
+        X_val = scaler.transform(X_val)
+
+        X_train_t = torch.from_numpy(to_model_input(X_train).astype(np.float32)).to(device)
+        y_train_t = torch.from_numpy(y_train.astype(np.int64)).to(device)
+        X_val_t = torch.from_numpy(to_model_input(X_val).astype(np.float32)).to(device)
+        y_val_t = torch.from_numpy(y[val_idx].astype(np.int64)).to(device)
+
+        def train_loader():
+            order = balanced_order()
+            for start in range(0, len(order), batch_size):
+                idx = order[start:start + batch_size]
+                yield X_train_t[idx], y_train_t[idx]
+
+        def val_loader():
+            for start in range(0, len(y_val_t), batch_size):
+                yield X_val_t[start:start + batch_size], y_val_t[start:start + batch_size]
+
     model = HemiAttentionLSTM(input_size=5, num_classes=num_classes).to(device)
     optimizer = optim.Adam(model.parameters(), lr=5e-4, weight_decay=1e-5)
 
@@ -91,30 +149,11 @@ def run_training():
     criterion = nn.CrossEntropyLoss(weight=ce_weights.to(device))
 
     best_acc = 0.0
-    for epoch in range(1, 150):
-        model.train()
-        for xb, yb in train_loader:
-            xb, yb = xb.to(device), yb.to(device)
-            preds = model(xb)
-            loss = criterion(preds, yb)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-
-        model.eval()
-        correct, total = 0, 0
-        all_preds, all_labels = [], []
-        with torch.no_grad():
-            for xb, yb in val_loader:
-                xb, yb = xb.to(device), yb.to(device)
-                preds = model(xb)
-                pred_labels = preds.argmax(dim=1)
-                correct += (pred_labels == yb).sum().item()
-                total += yb.size(0)
-                all_preds.extend(pred_labels.cpu().numpy())
-                all_labels.extend(yb.cpu().numpy())
-
-        acc = correct / total
+    t_start = time.perf_counter()
+    for epoch in range(1, epochs + 1):
+        train_one_epoch(model, optimizer, criterion, train_loader(), device)
+        all_preds, all_labels = predict_labels(model, val_loader(), device)
+        acc = (all_preds == all_labels).float().mean().item()
         print(f"[INFO] Epoch {epoch:02d} | Val Acc: {acc:.4f}")
         if acc > best_acc:
             best_acc = acc
@@ -130,9 +169,28 @@ def run_training():
                     'fs': feat_params.get('fs', 256)
                 }, f)
             target_names = [emotion_map[i] for i in sorted(emotion_map.keys())]
-            print(classification_report(all_labels, all_preds, target_names=target_names, zero_division=0))
+            print(classification_report(all_labels.cpu().numpy(), all_preds.cpu().numpy(),
+                                        target_names=target_names, zero_division=0))
 
+    elapsed = time.perf_counter() - t_start
     print(f"[INFO] Finished training. Best validation accuracy: {best_acc:.4f}")
+    print(f"[INFO] {epochs} epochs in {elapsed:.1f}s ({epochs / elapsed:.2f} epochs/s)")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"[INFO] Peak RSS: {rss:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train HemiAttentionLSTM on band-power features")
+    parser.add_argument('--x', default='X.npy')
+    parser.add_argument('--y', default='y.npy')
+    parser.add_argument('--mmap', action='store_true', help='Stream X from disk instead of loading it')
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--device', default='auto', help="'auto', 'cpu' or 'cuda'")
+    parser.add_argument('--epochs', type=int, default=149)
+    parser.add_argument('--threads', type=int, default=None, help='CPU intra-op threads (default: all cores)')
+    args = parser.parse_args()
+    run_training(args.x, args.y, mmap=args.mmap, batch_size=args.batch_size, device=args.device,
+                 epochs=args.epochs, threads=args.threads)
 
 if __name__ == '__main__':
-    run_training()
\ No newline at end of file
+    main()
\ No newline at end of file
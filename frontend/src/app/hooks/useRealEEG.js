@@ -46,6 +46,9 @@ export function useRealEEG() {
         websocket.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data);
+            // Artifact windows (and frames before the detector is live) carry no focus reading,
+            // so they update the graphs but never count as focused or unfocused
+            const scored = Boolean(data.focus?.label) && data.focus.label !== 'artifact';
             
             // Update latest sample
             const sample = {
@@ -56,7 +59,9 @@ export function useRealEEG() {
               heartRate: data.heart_rate
             };
             
-            setLatestSample(sample);
+            if (scored) {
+              setLatestSample(sample);
+            }
             
             // Update EEG data for graphs (keep last 60 points)
             if (data.eeg) {
@@ -75,6 +80,8 @@ export function useRealEEG() {
               setHeartRate(data.heart_rate);
             }
             
+            if (!scored) return;
+
             // Update focus history for timeline
             setFocusHistory(prev => {
               const newHistory = [...prev, {
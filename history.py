@@ -0,0 +1,207 @@
+"""
+Bounded prediction history with rolling per-minute and per-hour aggregates
+
+Raw records (label, probabilities, heart rate) are kept in a fixed-size ring;
+records that fall off the ring can optionally be appended to a JSONL spill
+file by a background writer thread (bounded queue; a stalled disk drops spill
+records instead of blocking the caller). Every record also updates its minute
+and hour rollup in O(1), so range queries cost one step per bucket regardless
+of how many predictions it holds.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+RESOLUTIONS = {'minute': 60, 'hour': 3600}
+
+
+@dataclass
+class Rollup:
+    """Running aggregate of the predictions inside one time bucket"""
+    count: int = 0
+    labels: Dict[str, int] = field(default_factory=dict)
+    prob_sums: Dict[str, float] = field(default_factory=dict)
+    prob_count: int = 0  # Records with probabilities (artifact windows have none)
+    hr_count: int = 0
+    hr_sum: float = 0.0
+    hr_min: Optional[float] = None
+    hr_max: Optional[float] = None
+
+    def add(self, label: Optional[str], probs: Optional[dict], hr: Optional[float]):
+        self.count += 1
+        if label is not None:
+            self.labels[label] = self.labels.get(label, 0) + 1
+        if probs:
+            self.prob_count += 1
+        for k, v in (probs or {}).items():
+            self.prob_sums[k] = self.prob_sums.get(k, 0.0) + v
+        if hr is not None:
+            self.hr_count += 1
+            self.hr_sum += hr
+            self.hr_min = hr if self.hr_min is None else min(self.hr_min, hr)
+            self.hr_max = hr if self.hr_max is None else max(self.hr_max, hr)
+
+    def merge(self, other: 'Rollup'):
+        self.count += other.count
+        for k, v in other.labels.items():
+            self.labels[k] = self.labels.get(k, 0) + v
+        self.prob_count += other.prob_count
+        for k, v in other.prob_sums.items():
+            self.prob_sums[k] = self.prob_sums.get(k, 0.0) + v
+        if other.hr_count:
+            self.hr_count += other.hr_count
+            self.hr_sum += other.hr_sum
+            self.hr_min = other.hr_min if self.hr_min is None else min(self.hr_min, other.hr_min)
+            self.hr_max = other.hr_max if self.hr_max is None else max(self.hr_max, other.hr_max)
+
+    def summary(self) -> dict:
+        n = max(1, self.count)
+        return {
+            'count': self.count,
+            'label_fraction': {k: v / n for k, v in self.labels.items()},
+            'mean_probs': {k: v / self.prob_count for k, v in self.prob_sums.items()},
+            'hr_mean': self.hr_sum / self.hr_count if self.hr_count else None,
+            'hr_min': self.hr_min,
+            'hr_max': self.hr_max,
+        }
+
+
+class PredictionHistory:
+    """Ring of recent predictions plus minute/hour rollups"""
+
+    def __init__(self, capacity: int = 86400, spill_path: Optional[str] = None,
+                 minute_retention: int = 24 * 60, hour_retention: int = 30 * 24, max_spill_queue: int = 50000):
+        self.records = deque(maxlen=capacity)
+        self.spill_path = spill_path
+        self.retention = {'minute': minute_retention, 'hour': hour_retention}
+        self.rollups: Dict[str, Dict[int, Rollup]] = {name: {} for name in RESOLUTIONS}
+        self._oldest = {name: None for name in RESOLUTIONS}
+        self._newest = {name: None for name in RESOLUTIONS}
+        self._lock = threading.Lock()
+        self.spill_stats = {'queued': 0, 'written': 0, 'dropped': 0}
+        self._spill_file = open(spill_path, 'a') if spill_path else None
+        self._spill_queue = queue.Queue(maxsize=max_spill_queue)
+        self._spill_thread = None
+        if self._spill_file:
+            self._spill_thread = threading.Thread(target=self._spill_loop, daemon=True)
+            self._spill_thread.start()
+
+    def record(self, label: Optional[str], probs: Optional[dict], hr: Optional[float] = None,
+               ts: Optional[float] = None):
+        """Add one prediction. Safe to call from any thread."""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self._spill_thread and len(self.records) == self.records.maxlen:
+                self._spill(self.records[0])
+            self.records.append({'ts': ts, 'label': label, 'probs': probs, 'hr': hr})
+            for name, width in RESOLUTIONS.items():
+                key = int(ts // width)
+                buckets = self.rollups[name]
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = Rollup()
+                    self._expire(name, key)
+                    if self._newest[name] is None or key > self._newest[name]:
+                        self._newest[name] = key
+                bucket.add(label, probs, hr)
+
+    def _spill(self, rec: dict):
+        try:
+            self._spill_queue.put_nowait(rec)
+            self.spill_stats['queued'] += 1
+        except queue.Full:
+            self.spill_stats['dropped'] += 1
+
+    def _spill_loop(self):
+        """Writer thread: append evicted records to the spill file in batches until the None sentinel."""
+        while True:
+            batch = [self._spill_queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._spill_queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [json.dumps(rec) + "\n" for rec in batch if rec is not None]
+            try:
+                self._spill_file.writelines(lines)
+                self._spill_file.flush()
+                self.spill_stats['written'] += len(lines)
+            except (OSError, ValueError) as e:  # ValueError: file already closed
+                self.spill_stats['dropped'] += len(lines)
+                print(f"History: spill write failed: {e}")
+            if None in batch:
+                return
+
+    def _expire(self, name: str, newest: int):
+        buckets = self.rollups[name]
+        cutoff = newest - self.retention[name]
+        oldest = self._oldest[name]
+        if oldest is None:
+            self._oldest[name] = newest
+            return
+        if cutoff - oldest > len(buckets):  # Long idle gap: sweep the dict instead of every key
+            for key in [k for k in buckets if k <= cutoff]:
+                del buckets[key]
+            oldest = cutoff + 1
+        while oldest <= cutoff:
+            buckets.pop(oldest, None)
+            oldest += 1
+        self._oldest[name] = oldest
+
+    def query(self, start: float, end: float, resolution: str = 'auto') -> dict:
+        """Per-bucket summaries and an overall summary for [start, end] (unix seconds)."""
+        if resolution == 'auto':
+            resolution = 'minute' if end - start <= 3 * 3600 else 'hour'
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)} or auto")
+        width = RESOLUTIONS[resolution]
+        total = Rollup()
+        out = []
+        end = min(end, time.time())
+        with self._lock:
+            buckets = self.rollups[resolution]
+            oldest, newest = self._oldest[resolution], self._newest[resolution]
+            keys = ()
+            if oldest is not None:  # Only retained keys, however wide the requested range
+                keys = range(max(int(start // width), oldest), min(int(end // width), newest) + 1)
+            for key in keys:
+                bucket = buckets.get(key)
+                if bucket is None:
+                    continue
+                total.merge(bucket)
+                out.append({'start': key * width, **bucket.summary()})
+        return {'resolution': resolution, 'buckets': out, 'total': total.summary()}
+
+    def recent(self, since: float) -> list:
+        """Raw records with ts >= since that are still in memory."""
+        with self._lock:
+            out = []
+            for rec in reversed(self.records):
+                if rec['ts'] < since:
+                    break
+                out.append(rec)
+        out.reverse()
+        return out
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued spill records and stop the writer thread, waiting at most about 2 * timeout."""
+        if self._spill_thread:
+            try:
+                self._spill_queue.put(None, timeout=timeout)
+            except queue.Full:
+                print("History: spill queue still full at close; writer is stalled")
+            self._spill_thread.join(timeout=timeout)
+            if self._spill_thread.is_alive():
+                # Closing under a writer that may still call writelines would lose its batch
+                print(f"History: spill writer still busy after {timeout}s; leaving the file open")
+                return
+            self._spill_thread = None
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
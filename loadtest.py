@@ -0,0 +1,390 @@
+"""
+Load test for backend.py streaming endpoints
+
+Starts the backend on the synthetic EEG/PPG source (EEG_SOURCE=synthetic, no
+headset needed), or targets a running one with --url. Then it ramps up
+simulated SSE / WebSocket clients until a latency SLO breaks. At each step
+every client records:
+  - lag: receive time minus the payload timestamp where one exists
+    (/unified_stream, /subscribe, /ws). Otherwise it is how late each event
+    came relative to the endpoint's interval (/stream).
+  - drops: events missing from the expected cadence (gaps longer than 1.5x
+    the interval).
+The server's CPU and RSS come from /proc (Linux). So do the load generator's
+own CPU and event-loop lag, so a saturated client is not mistaken for a slow
+server.
+
+Each run is appended to loadtest_results.jsonl with the git commit, so
+capacity can be compared between versions (--compare prints the change
+against the last run with the same mix, SLO and ramp).
+
+Usage:
+    python loadtest.py --clients 1 10 50 100 200
+    python loadtest.py --url http://localhost:8000 --clients 10 20 --mix /stream:1 --compare
+    python loadtest.py --mix /stream:1 "/ws?fields=label,probs:1"
+The default mix is SSE only; WebSocket (/ws) clients need the `websockets` package.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RAW_PATHS = ('/raw_eeg',)  # Sent as fast as possible; no cadence, so no lag / drop SLO
+
+
+@dataclass
+class ClientStats:
+    """What one simulated client saw during the measurement window"""
+    path: str
+    events: int = 0
+    drops: int = 0
+    lags_ms: List[float] = field(default_factory=list)
+    error: Optional[str] = None
+    last_arrival: Optional[float] = None
+
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    """['/stream:2', '/ws?fields=label:1'] -> {'/stream': 2.0, '/ws?fields=label': 1.0}"""
+    mix = {}
+    for item in items:
+        path, _, weight = item.rpartition(':')
+        if not path or not weight.replace('.', '', 1).isdigit():
+            path, weight = item, '1'
+        mix[path] = float(weight)
+    return mix
+
+
+def assign_paths(mix: Dict[str, float], n: int) -> List[str]:
+    """n client paths split across the mix by weight (largest remainders)."""
+    total = sum(mix.values())
+    exact = {p: n * w / total for p, w in mix.items()}
+    counts = {p: int(v) for p, v in exact.items()}
+    for p in sorted(exact, key=lambda p: exact[p] - counts[p], reverse=True)[:n - sum(counts.values())]:
+        counts[p] += 1
+    return [p for p, c in counts.items() for _ in range(c)]
+
+
+# -----------------------
+# Clients
+# -----------------------
+def _record(stats: ClientStats, text: str, interval: Optional[float], measuring: asyncio.Event):
+    now = time.time()
+    if not measuring.is_set():
+        stats.last_arrival = now
+        return
+    stats.events += 1
+    ts = None
+    try:
+        ts = json.loads(text).get('timestamp')
+    except (ValueError, AttributeError):
+        pass
+    if stats.last_arrival is not None and interval:
+        gap = now - stats.last_arrival
+        stats.drops += max(0, int(round(gap / interval)) - 1) if gap > 1.5 * interval else 0
+        if ts is None:
+            stats.lags_ms.append(max(0.0, gap - interval) * 1e3)
+    if ts is not None:
+        stats.lags_ms.append(now * 1e3 - ts)
+    stats.last_arrival = now
+
+
+async def sse_client(base: str, path: str, interval: Optional[float], stats: ClientStats,
+                     measuring: asyncio.Event):
+    """Minimal HTTP/1.1 SSE reader on raw asyncio streams (cheap enough for thousands of clients)."""
+    url = urlsplit(base)
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80, limit=2 ** 22)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        status = await reader.readline()
+        if b' 200 ' not in status:
+            raise RuntimeError(status.decode().strip())
+        while await reader.readline() not in (b'\r\n', b''):  # Headers
+            pass
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise RuntimeError('server closed the stream')
+            if line.startswith(b'data:'):
+                _record(stats, line[5:].decode().strip(), interval, measuring)
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        stats.error = str(e) or type(e).__name__
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def ws_client(base: str, path: str, interval: Optional[float], stats: ClientStats,
+                    measuring: asyncio.Event):
+    import websockets  # Checked up front in main()
+    try:
+        async with websockets.connect(base.replace('http', 'ws', 1) + path, max_size=None) as ws:
+            async for text in ws:
+                _record(stats, text, interval, measuring)
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        stats.error = str(e) or type(e).__name__
+
+
+async def loop_lag_monitor(lags: List[float], period: float = 0.05):
+    """How late the load generator's own event loop wakes up."""
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append((time.perf_counter() - t0 - period) * 1e3)
+
+
+# -----------------------
+# Process metrics (Linux /proc)
+# -----------------------
+def proc_cpu_seconds(pid) -> Optional[float]:
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def proc_rss_mb(pid) -> Optional[float]:
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# -----------------------
+# Server
+# -----------------------
+def start_server(port: int, workdir: str) -> subprocess.Popen:
+    env = dict(os.environ, EEG_SOURCE='synthetic')
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'backend:app', '--app-dir', ROOT,
+                             '--port', str(port), '--log-level', 'warning'],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base: str, timeout: float, proc: Optional[subprocess.Popen]):
+    """Block until /health reports a live detector."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(base + '/health', timeout=2) as r:
+                detector = json.load(r)['detector']
+        except Exception:
+            detector = None
+        if detector and detector['state'] == 'live':
+            return
+        if detector and detector['state'] == 'unavailable':
+            raise RuntimeError(f"Backend detector unavailable: {detector.get('reason')}")
+        time.sleep(0.5)
+    raise RuntimeError(f"Backend not ready after {timeout:.0f}s")
+
+
+# -----------------------
+# Ramp
+# -----------------------
+def summarize(clients: List[ClientStats], seconds: float) -> dict:
+    timed = [c for c in clients if c.path.split('?')[0] not in RAW_PATHS]
+    lags = np.concatenate([c.lags_ms for c in timed if c.lags_ms]) if any(c.lags_ms for c in timed) else np.zeros(0)
+    events = sum(c.events for c in timed)
+    drops = sum(c.drops for c in timed)
+    per_path = {}
+    for c in clients:
+        p = per_path.setdefault(c.path, {'clients': 0, 'events': 0, 'errors': 0, 'lags': []})
+        p['clients'] += 1
+        p['events'] += c.events
+        p['errors'] += c.error is not None
+        p['lags'].extend(c.lags_ms)
+    for p in per_path.values():
+        lag = p.pop('lags')
+        p['events_per_client_sec'] = p['events'] / max(1, p['clients']) / seconds
+        p['lag_p95_ms'] = float(np.percentile(lag, 95)) if lag else None
+    return {
+        'lag_p50_ms': float(np.percentile(lags, 50)) if len(lags) else None,
+        'lag_p95_ms': float(np.percentile(lags, 95)) if len(lags) else None,
+        'lag_p99_ms': float(np.percentile(lags, 99)) if len(lags) else None,
+        'drop_rate': drops / max(1, drops + events),
+        'errors': sum(c.error is not None for c in clients),
+        'error_samples': sorted({c.error for c in clients if c.error})[:3],
+        'per_path': per_path,
+    }
+
+
+async def run_step(base: str, paths: List[str], args, pid: Optional[int]) -> dict:
+    measuring = asyncio.Event()
+    clients = [ClientStats(p) for p in paths]
+    tasks = []
+    for i, c in enumerate(clients):
+        interval = None if c.path.split('?')[0] in RAW_PATHS else args.interval
+        client = ws_client if c.path.startswith('/ws') else sse_client
+        tasks.append(asyncio.create_task(client(base, c.path, interval, c, measuring)))
+        if args.connect_rate and (i + 1) % args.connect_rate == 0:
+            await asyncio.sleep(1.0)  # Stagger connects: connect_rate per second
+    loop_lags: List[float] = []
+    monitor = asyncio.create_task(loop_lag_monitor(loop_lags))
+    await asyncio.sleep(args.warmup)
+
+    measuring.set()
+    cpu0, t0, own0 = proc_cpu_seconds(pid) if pid else None, time.perf_counter(), time.process_time()
+    await asyncio.sleep(args.step_sec)
+    wall = time.perf_counter() - t0
+    cpu1 = proc_cpu_seconds(pid) if pid else None
+    own_cpu = time.process_time() - own0
+    rss = proc_rss_mb(pid) if pid else None
+
+    for t in tasks + [monitor]:
+        t.cancel()
+    await asyncio.gather(*tasks, monitor, return_exceptions=True)
+    result = summarize(clients, wall)
+    result.update({
+        'clients': len(clients),
+        'server_cpu': (cpu1 - cpu0) / wall if cpu0 is not None and cpu1 is not None else None,
+        'server_rss_mb': rss,
+        'loadgen_cpu': own_cpu / wall,
+        'loadgen_loop_lag_p95_ms': float(np.percentile(loop_lags, 95)) if loop_lags else None,
+    })
+    return result
+
+
+def slo_broken(step: dict, args) -> Optional[str]:
+    if step['errors']:
+        return f"{step['errors']} client error(s): {step['error_samples']}"
+    if step['lag_p95_ms'] is not None and step['lag_p95_ms'] > args.slo_p95_ms:
+        return f"p95 lag {step['lag_p95_ms']:.0f} ms > {args.slo_p95_ms:.0f} ms"
+    if step['drop_rate'] > args.slo_drop_rate:
+        return f"drop rate {step['drop_rate']:.1%} > {args.slo_drop_rate:.1%}"
+    return None
+
+
+def _fmt(v, spec):
+    return format(v, spec) if v is not None else '-'
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare_with_previous(out_path: str, run: dict):
+    previous = None
+    try:
+        with open(out_path, 'r') as f:
+            for line in f:
+                rec = json.loads(line)
+                if all(rec.get(k) == run[k] for k in ('mix', 'slo', 'ramp', 'step_sec')):
+                    previous = rec
+    except (OSError, ValueError):
+        pass
+    if previous is None:
+        print("[INFO] No earlier run with the same mix, SLO and ramp to compare against")
+        return
+    before, now = previous['max_clients'], run['max_clients']
+    change = (now - before) / before if before else 0.0
+    flag = "[WARN] Capacity regression" if now < before else "[INFO] Capacity"
+    print(f"{flag}: {before} clients ({previous.get('git')}) -> {now} clients ({run.get('git')}), {change:+.0%}")
+
+
+async def ramp(base: str, mix: Dict[str, float], args, pid: Optional[int]) -> dict:
+    steps = []
+    max_clients = 0
+    broken = None
+    print(f"{'clients':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'drops':>7s} {'errors':>6s} "
+          f"{'srv CPU':>8s} {'srv RSS':>8s} {'gen CPU':>8s} {'gen lag':>8s}")
+    for n in args.clients:
+        step = await run_step(base, assign_paths(mix, n), args, pid)
+        steps.append(step)
+        print(f"{n:7d} {_fmt(step['lag_p50_ms'], '8.0f')} {_fmt(step['lag_p95_ms'], '8.0f')} "
+              f"{_fmt(step['lag_p99_ms'], '8.0f')} {step['drop_rate']:7.1%} {step['errors']:6d} "
+              f"{_fmt(step['server_cpu'], '8.0%')} {_fmt(step['server_rss_mb'], '7.0f')}M "
+              f"{step['loadgen_cpu']:8.0%} {_fmt(step['loadgen_loop_lag_p95_ms'], '6.0f')}ms")
+        broken = slo_broken(step, args)
+        if broken:
+            print(f"[INFO] SLO broken at {n} clients: {broken}")
+            break
+        max_clients = n
+        if step['loadgen_loop_lag_p95_ms'] and step['loadgen_loop_lag_p95_ms'] > args.slo_p95_ms / 2:
+            print("[WARN] The load generator itself is saturated; results past this point measure the client")
+        await asyncio.sleep(args.cooldown)
+    return {'steps': steps, 'max_clients': max_clients, 'broken_by': broken}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp simulated SSE/WS clients against backend.py until a latency SLO breaks")
+    parser.add_argument('--url', default=None, help='Test a running backend instead of starting one')
+    parser.add_argument('--server-pid', type=int, default=None, help='PID of the --url server for CPU/RSS')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workdir', default=os.path.join(ROOT, 'eeg'),
+                        help='Backend working directory (model, scaler, label_map)')
+    # SSE only by default: /ws clients need the optional websockets package
+    parser.add_argument('--mix', nargs='+', default=['/stream:1', '/unified_stream:1', '/subscribe?fields=label,probs:1'],
+                        help='path[:weight] per endpoint; queries allowed, e.g. "/ws?fields=label,probs:2"')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 5, 10, 25, 50, 100, 200, 400])
+    parser.add_argument('--interval', type=float, default=1.0, help='Expected seconds between events')
+    parser.add_argument('--step-sec', type=float, default=15.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--cooldown', type=float, default=1.0)
+    parser.add_argument('--connect-rate', type=int, default=200, help='New connections per second (0 = all at once)')
+    parser.add_argument('--slo-p95-ms', type=float, default=500.0)
+    parser.add_argument('--slo-drop-rate', type=float, default=0.01)
+    parser.add_argument('--ready-timeout', type=float, default=90.0)
+    parser.add_argument('--out', default=os.path.join(ROOT, 'loadtest_results.jsonl'))
+    parser.add_argument('--compare', action='store_true', help='Compare capacity with the previous saved run')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if any(p.startswith('/ws') for p in mix) and importlib.util.find_spec('websockets') is None:
+        raise SystemExit("[ERROR] /ws clients need the websockets package (pip install websockets)")
+    proc = None
+    if args.url:
+        base, pid = args.url.rstrip('/'), args.server_pid
+    else:
+        base = f"http://127.0.0.1:{args.port}"
+        proc = start_server(args.port, args.workdir)
+        pid = proc.pid
+    try:
+        wait_ready(base, args.ready_timeout, proc)
+        print(f"[INFO] Backend ready at {base}; mix {mix}; SLO p95 lag {args.slo_p95_ms:.0f} ms, "
+              f"drops {args.slo_drop_rate:.1%}")
+        result = asyncio.run(ramp(base, mix, args, pid))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    run = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'git': git_revision(), 'cpus': os.cpu_count(),
+           'mix': mix, 'slo': {'p95_ms': args.slo_p95_ms, 'drop_rate': args.slo_drop_rate},
+           'ramp': args.clients, 'step_sec': args.step_sec, 'server': 'external' if args.url else 'synthetic', **result}
+    if args.compare:
+        compare_with_previous(args.out, run)
+    with open(args.out, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    print(f"[INFO] Max clients within SLO: {result['max_clients']}; results appended to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
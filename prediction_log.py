@@ -0,0 +1,168 @@
+"""
+Durable prediction log with batched background writes
+
+Producers (the stream hub, alarm callbacks) only enqueue a tuple; a single
+writer thread drains the queue and commits batches to SQLite in WAL mode.
+The queue is bounded, so a stalled disk drops records (counted in `stats`)
+instead of growing memory or blocking the hot path.
+
+Run this module directly to benchmark enqueue latency and write throughput:
+    python prediction_log.py --records 200000
+"""
+
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (ts REAL NOT NULL, label TEXT, probs TEXT, hr REAL);
+CREATE TABLE IF NOT EXISTS alarms (ts REAL NOT NULL, alarm_on INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts);
+"""
+
+
+class PredictionSink:
+    """Queue-backed SQLite writer for predictions and alarm transitions"""
+
+    def __init__(self, path: str = 'predictions.sqlite', flush_interval: float = 1.0,
+                 max_batch: int = 1000, max_queue: int = 50000):
+        self.path = path
+        self.flush_interval = float(flush_interval)
+        self.max_batch = int(max_batch)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self.stats = {'enqueued': 0, 'dropped': 0, 'written': 0, 'batches': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    # ---------- Producers (hot path) ----------
+    def log_prediction(self, label: Optional[str], probs: Optional[dict], hr: Optional[float] = None):
+        """Matches the StreamHub recorder signature."""
+        self._put(('p', time.time(), label, probs, hr))
+
+    def log_alarm(self, alarm_on: bool):
+        """Matches the SmartAlarm alarm_callback signature."""
+        self._put(('a', time.time(), bool(alarm_on)))
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            self.stats['enqueued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    # ---------- Writer thread ----------
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    # When closing, drain what is queued without waiting out the interval
+                    remaining = 0 if self._stop_event.is_set() else deadline - time.monotonic()
+                    try:
+                        if remaining <= 0:
+                            batch.append(self._queue.get_nowait())
+                        else:
+                            batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        preds, alarms = [], []
+        for item in batch:
+            if item[0] == 'p':
+                _, ts, label, probs, hr = item
+                preds.append((ts, label, json.dumps(probs) if probs is not None else None, hr))
+            else:
+                _, ts, alarm_on = item
+                alarms.append((ts, int(alarm_on)))
+        try:
+            with conn:
+                if preds:
+                    conn.executemany('INSERT INTO predictions VALUES (?, ?, ?, ?)', preds)
+                if alarms:
+                    conn.executemany('INSERT INTO alarms VALUES (?, ?)', alarms)
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            print(f"PredictionSink: write failed ({len(batch)} records lost): {e}")
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued records and stop the writer thread."""
+        self._stop_event.set()
+        self._thread.join(timeout=timeout)
+
+
+# -----------------------
+# Benchmark
+# -----------------------
+def _percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6
+    return f"p50={pick(0.50):.1f}us p99={pick(0.99):.1f}us max={samples[-1] * 1e6:.1f}us"
+
+
+def benchmark(records: int, flush_interval: float):
+    probs = {'focused': 0.73, 'unfocused': 0.27}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Synchronous baseline: one committed insert per prediction
+        conn = sqlite3.connect(os.path.join(tmp, 'sync.sqlite'))
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        n_sync = min(records, 5000)
+        lat = []
+        for _ in range(n_sync):
+            t0 = time.perf_counter()
+            with conn:
+                conn.execute('INSERT INTO predictions VALUES (?, ?, ?, ?)',
+                             (time.time(), 'focused', json.dumps(probs), 71.0))
+            lat.append(time.perf_counter() - t0)
+        conn.close()
+        print(f"sync insert   ({n_sync} records): {_percentiles(lat)}")
+
+        sink = PredictionSink(os.path.join(tmp, 'async.sqlite'), flush_interval=flush_interval,
+                              max_queue=records + 1)
+        lat = []
+        t_start = time.perf_counter()
+        for _ in range(records):
+            t0 = time.perf_counter()
+            sink.log_prediction('focused', probs, 71.0)
+            lat.append(time.perf_counter() - t0)
+        sink.close(timeout=120)
+        elapsed = time.perf_counter() - t_start
+        print(f"async enqueue ({records} records): {_percentiles(lat)}")
+        print(f"async written {sink.stats['written']} in {sink.stats['batches']} batches, "
+              f"{sink.stats['written'] / elapsed:,.0f} records/s end-to-end, dropped={sink.stats['dropped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched prediction log")
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    args = parser.parse_args()
+    benchmark(args.records, args.flush_interval)
+
+
+if __name__ == '__main__':
+    main()
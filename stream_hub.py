@@ -0,0 +1,240 @@
+"""
+Shared subscription hub for backend streams
+
+Clients subscribe with a field selection and an update rate. Once per tick the
+hub gathers only the fields that some due subscriber asked for, builds one
+projection per distinct selection and serializes it once; every subscriber
+with the same selection receives the same JSON text.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from signal_processing import filter_eeg_signal, extract_band_powers  # eeg/ is on sys.path (backend.py)
+
+
+FIELDS = ('label', 'probs', 'eeg', 'ppg', 'hr', 'spectrum')
+MAX_EVERY = 60  # Longest tick decimation we keep PPG history for
+
+
+@dataclass(frozen=True)
+class Selection:
+    """What a subscriber wants: fields, tick decimation and sample decimation"""
+    fields: Tuple[str, ...] = ('label', 'probs', 'eeg', 'ppg')
+    every: int = 1  # Deliver every N-th tick
+    decimate: int = 1  # Keep every N-th EEG/PPG sample
+
+
+def parse_selection(fields: Optional[str] = None, rate: Optional[float] = None,
+                    every: Optional[int] = None, decimate: int = 1,
+                    tick_hz: float = 1.0) -> Selection:
+    """Build a Selection from query parameters. Raises ValueError on bad input."""
+    if fields:
+        names = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in names if f not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)} (valid: {', '.join(FIELDS)})")
+        chosen = tuple(f for f in FIELDS if f in names)  # Canonical order so equal selections share
+    else:
+        chosen = Selection.fields
+
+    if every is None:
+        every = 1 if not rate else max(1, int(round(tick_hz / float(rate))))
+    every = int(every)
+    decimate = int(decimate)
+    if every < 1 or every > MAX_EVERY:
+        raise ValueError(f"every must be in [1, {MAX_EVERY}]")
+    if decimate < 1:
+        raise ValueError("decimate must be >= 1")
+    return Selection(fields=chosen, every=every, decimate=decimate)
+
+
+class StreamHub:
+    """Computes each distinct projection once per tick and fans it out"""
+
+    def __init__(self, detector, ppg_inlet=None, ppg_fs: Optional[int] = None, tick_hz: float = 1.0,
+                 spectrogram=None):
+        self.detector = detector
+        self.spectrogram = spectrogram  # RollingSpectrogram; 'spectrum' is then read, not recomputed
+        self.recorders = []  # callback(label, probs, hr) run every tick, e.g. PredictionHistory.record
+        self.ppg_inlet = ppg_inlet
+        self.ppg_fs = ppg_fs
+        self.tick_hz = float(tick_hz)
+
+        self.tick = 0
+        self._subscribers: Dict[Selection, int] = {}
+        self._frames: Dict[Selection, Tuple[int, str]] = {}
+        self._ppg_ticks = deque(maxlen=MAX_EVERY)  # One list of PPG samples per tick
+        self._ticked: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'ticks': 0, 'inferences': 0, 'projections': 0, 'bytes_serialized': 0, 'recorder_errors': 0}
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        """Start the tick loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._ticked = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def add_recorder(self, callback):
+        """Record every tick's prediction; the hub then infers even with no subscribers."""
+        self.recorders.append(callback)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ---------- Subscription ----------
+    async def subscribe(self, selection: Selection):
+        """Async generator yielding serialized projections for `selection`."""
+        self.start()
+        self._subscribers[selection] = self._subscribers.get(selection, 0) + 1
+        last = self.tick
+        try:
+            while True:
+                event = self._ticked
+                await event.wait()
+                frame = self._frames.get(selection)
+                if frame is None or frame[0] <= last:
+                    continue
+                last = frame[0]
+                yield frame[1]
+        finally:
+            self._subscribers[selection] -= 1
+            if self._subscribers[selection] <= 0:
+                del self._subscribers[selection]
+                self._frames.pop(selection, None)
+
+    def subscriber_counts(self) -> dict:
+        return {','.join(s.fields) + f"@every={s.every},decimate={s.decimate}": n
+                for s, n in self._subscribers.items()}
+
+    # ---------- Tick loop ----------
+    async def _run(self):
+        period = 1.0 / self.tick_hz
+        next_t = time.perf_counter()
+        while True:
+            next_t += period
+            await asyncio.sleep(max(0.0, next_t - time.perf_counter()))
+            self.tick += 1
+            try:
+                await self._build_frames()
+            except Exception as e:
+                print(f"Hub: tick error: {e}")
+            old, self._ticked = self._ticked, asyncio.Event()
+            old.set()
+
+    async def _build_frames(self):
+        self.stats['ticks'] += 1
+        active = list(self._subscribers)
+        if self.recorders or any('ppg' in s.fields or 'hr' in s.fields for s in active):
+            self._drain_ppg()
+        due = [s for s in active if self.tick % s.every == 0]
+        if not (due or self.recorders) or not self.detector.available:
+            return
+        needed = set()
+        for s in due:
+            needed.update(s.fields)
+        if self.recorders:
+            needed.update(('label', 'probs'))
+
+        label, probs = None, None
+        if 'label' in needed or 'probs' in needed:
+            # Model forward pass off the event loop, so other streams keep flowing meanwhile
+            label, probs = await asyncio.to_thread(self.detector.infer_latest, verbose=False)
+            self.stats['inferences'] += 1
+            if label is not None:
+                hr = self._latest_ppg()
+                for callback in self.recorders:
+                    try:
+                        callback(label, probs, hr)
+                    except Exception as e:  # One bad recorder must not cost every subscriber its frame
+                        self.stats['recorder_errors'] += 1
+                        print(f"Hub: recorder error: {e}")
+
+        fs = int(self.detector.fs or 0)
+        eeg = None
+        recompute_spectrum = 'spectrum' in needed and self.spectrogram is None
+        if 'eeg' in needed or recompute_spectrum:
+            span = max(int(fs * s.every / self.tick_hz) for s in due)
+            if recompute_spectrum:
+                span = max(span, int(self.detector.win_samps or 0))
+            eeg = self._eeg_tail(span)
+
+        spectrum = None
+        if 'spectrum' in needed:
+            if self.spectrogram is not None:
+                bands = self.spectrogram.latest_bands
+                spectrum = bands.tolist() if bands is not None else None
+            elif eeg is not None and len(eeg) >= (self.detector.win_samps or 1):
+                win = eeg[-self.detector.win_samps:]
+                spectrum = extract_band_powers(filter_eeg_signal(win, fs), fs).tolist()
+
+        now_ms = int(time.time() * 1000)
+        for s in due:
+            if s not in self._subscribers:  # Left while inference ran
+                continue
+            payload = {'timestamp': now_ms}
+            if 'label' in s.fields:
+                payload['label'] = label
+            if 'probs' in s.fields:
+                payload['probs'] = probs
+            if 'eeg' in s.fields:
+                n = int(fs * s.every / self.tick_hz)
+                payload['eeg'] = eeg[-n:][::s.decimate].tolist() if eeg is not None and n > 0 else []
+            if 'ppg' in s.fields:
+                payload['ppg'] = self._ppg_tail(s.every)[::s.decimate]
+            if 'hr' in s.fields:
+                payload['hr'] = self._latest_ppg()
+            if 'spectrum' in s.fields:
+                payload['spectrum'] = spectrum
+            if 'eeg' in s.fields or 'ppg' in s.fields:
+                payload['fs'] = {
+                    'eeg': fs / s.decimate if fs else None,
+                    'ppg': self.ppg_fs / s.decimate if self.ppg_fs else None,
+                }
+            text = json.dumps(payload)
+            self._frames[s] = (self.tick, text)
+            self.stats['projections'] += 1
+            self.stats['bytes_serialized'] += len(text)
+
+    # ---------- Sources ----------
+    def _eeg_tail(self, n: int) -> Optional[np.ndarray]:
+        if n <= 0:
+            return None
+        with self.detector._lock:
+            if not self.detector.buf:
+                return None
+            buf = self.detector.buf
+            tail = list(islice(buf, max(0, len(buf) - n), None))
+        return np.vstack(tail)
+
+    def _drain_ppg(self):
+        samples = []
+        if self.ppg_inlet is not None:
+            while True:
+                chunk, _ = self.ppg_inlet.pull_chunk(timeout=0.0, max_samples=256)
+                if not chunk:
+                    break
+                samples.extend(float(s[0]) for s in chunk)
+        self._ppg_ticks.append(samples)
+
+    def _ppg_tail(self, ticks: int) -> list:
+        out = []
+        for samples in list(self._ppg_ticks)[-ticks:]:
+            out.extend(samples)
+        return out
+
+    def _latest_ppg(self) -> Optional[float]:
+        for samples in reversed(self._ppg_ticks):
+            if samples:
+                return samples[-1]
+        return None